@@ -0,0 +1,213 @@
+# bench_hot_paths.py – ops/sec and peak memory of the review hot paths
+#
+# Runs offline: Anvil, its tables and components are replaced by the
+# stand-ins in offline_anvil / offline_tables, payloads come from
+# lease_payloads.
+#
+#   python bench/bench_hot_paths.py                          # default shape
+#   python bench/bench_hot_paths.py --rows 2000 --tables 6 --only render
+#   python bench/bench_hot_paths.py --sweep rows=10,100,1000,10000
+#   python bench/bench_hot_paths.py --json before.json
+#   python bench/bench_hot_paths.py --compare before.json    # after a change
+#
+# One "op" is one call of the benchmarked function on the whole payload
+# (e.g. dig over every configured path).  Peak memory is the tracemalloc
+# peak of a single op.  --sweep re-runs the suite for each value of one
+# shape parameter and marks steps where the cost grows much faster than
+# the input (scaling cliffs).
+
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import offline_anvil                                               # noqa: E402
+from lease_payloads import seed_tables, scalar_paths               # noqa: E402
+
+SHAPE_KEYS = ("depth", "fields", "tables", "rows", "cols")
+CLIFF_FACTOR = 1.5      # cost growth / input growth above this is flagged
+WINDOWS = 3             # timing windows per benchmark (the best one counts)
+
+
+# ---------------------------------------------------------------------------
+# Measuring
+# ---------------------------------------------------------------------------
+
+def measure(fn, min_time, windows=WINDOWS):
+  """(ops/sec, peak bytes of one op) for *fn* – the best of *windows* timing
+    windows sharing *min_time*, so one noisy stretch does not skew it."""
+  fn()                                  # warm caches / lazy imports
+  best = 0.0
+  for _ in range(windows):
+    ops, start = 0, time.perf_counter()
+    while True:
+      fn()
+      ops += 1
+      elapsed = time.perf_counter() - start
+      if elapsed >= min_time / windows:
+        break
+    best = max(best, ops / elapsed)
+  tracemalloc.start()
+  tracemalloc.reset_peak()
+  fn()
+  peak = tracemalloc.get_traced_memory()[1]
+  tracemalloc.stop()
+  return best, peak
+
+
+# ---------------------------------------------------------------------------
+# The suite
+# ---------------------------------------------------------------------------
+
+def build_suite(app, shape):
+  """[(name, fn)] for one payload shape (tables are reset and re-seeded)."""
+  offline_anvil.reset_tables()
+  item = seed_tables(app, docs=1, shape=shape)
+
+  renderer = app.module("MainReviewForm.json_renderer")
+  table_html = app.module("table_html")
+  config = app.module("ConfigService")
+  anvil = sys.modules["anvil"]
+
+  bundle = config.get_full_schema_bundle("base_lease")
+  paths = [tuple(p.split(".")) for p in scalar_paths(item)]
+  _, tables = renderer.collect_fields_by_type(item)
+  all_rows = [r for _, rows in tables for r in rows]
+  models = [(path, table_html.measure_table(rows)) for path, rows in tables]
+
+  # "the browser": extractTable answers with the cells the table was built from
+  cells = {path: model.cells for path, model in models}
+  root_paths = {}
+  offline_anvil.on_js("registerJsonTable",
+                      lambda root, path, columns: root_paths.__setitem__(
+                        root.owner.root_id, path))
+  offline_anvil.on_js("extractTable", lambda root_id: cells.get(root_paths.get(root_id)))
+
+  rendered = anvil.ColumnPanel()
+  renderer.render_json(item, rendered, schema_bundle=bundle)
+  extracted = renderer.extract_edited_data(rendered)
+
+  def render_tables():
+    container = anvil.ColumnPanel()
+    for path, model in models:
+      renderer._render_table(path, model, container)
+
+  def config_cold():
+    config.drop_local_cache("base_lease")
+    config.get_full_schema_bundle("base_lease")
+
+  return [
+    ("dig",                    lambda: [renderer.dig(item, p) for p in paths]),
+    ("flatten_dict",           lambda: [table_html.flatten_dict(r) for r in all_rows]),
+    ("collect_fields_by_type", lambda: renderer.collect_fields_by_type(item)),
+    ("unflatten",              lambda: renderer.unflatten(extracted)),
+    ("extract_edited_data",    lambda: renderer.extract_edited_data(rendered)),
+    ("_render_table",          render_tables),
+    ("render_json",            lambda: renderer.render_json(item, anvil.ColumnPanel(),
+                                                            schema_bundle=bundle)),
+    ("config bundle (cached)", lambda: config.get_full_schema_bundle("base_lease")),
+    ("config bundle (cold)",   config_cold),
+  ]
+
+
+def run_suite(app, shape, min_time, only=None):
+  results = {}
+  for name, fn in build_suite(app, shape):
+    if only and not any(o in name for o in only):
+      continue
+    ops, peak = measure(fn, min_time)
+    results[name] = {"ops_per_s": ops, "peak_bytes": peak}
+  return results
+
+
+# ---------------------------------------------------------------------------
+# Reporting
+# ---------------------------------------------------------------------------
+
+def _fmt_bytes(n):
+  for unit in ("B", "KiB", "MiB"):
+    if n < 1024 or unit == "MiB":
+      return f"{n:.0f} {unit}" if unit == "B" else f"{n:.1f} {unit}"
+    n /= 1024
+
+
+def print_results(results, baseline=None):
+  print(f"{'benchmark':<24} {'ops/s':>12} {'ms/op':>10} {'peak mem':>11}"
+        + ("  vs baseline" if baseline else ""))
+  for name, r in results.items():
+    line = (f"{name:<24} {r['ops_per_s']:>12,.1f} {1000 / r['ops_per_s']:>10.3f} "
+            f"{_fmt_bytes(r['peak_bytes']):>11}")
+    base = (baseline or {}).get(name)
+    if base:
+      change = (r["ops_per_s"] / base["ops_per_s"] - 1) * 100
+      line += f"  {change:+7.1f}% ops/s"
+    print(line)
+
+
+def print_sweep(key, values, runs):
+  names = list(runs[0])
+  print(f"\nms/op by {key} (⚠ = cost grew more than {CLIFF_FACTOR}× faster than {key})")
+  print(f"{'benchmark':<24}" + "".join(f"{v:>12}" for v in values))
+  for name in names:
+    cells, prev = [], None
+    for value, run in zip(values, runs):
+      ms = 1000 / run[name]["ops_per_s"]
+      mark = ""
+      if prev is not None and prev[0] and value != prev[0]:
+        growth = (ms / prev[1]) / (value / prev[0])
+        mark = "⚠" if growth > CLIFF_FACTOR else ""
+      cells.append(f"{ms:>11.3f}{mark or ' '}")
+      prev = (value, ms)
+    print(f"{name:<24}" + "".join(cells))
+
+
+def main(argv=None):
+  ap = argparse.ArgumentParser(description="Offline micro-benchmarks of the review hot paths")
+  ap.add_argument("--depth", type=int, default=3, help="nesting levels of the scalars")
+  ap.add_argument("--fields", type=int, default=40, help="scalar fields per payload")
+  ap.add_argument("--tables", type=int, default=3, help="tables per payload")
+  ap.add_argument("--rows", type=int, default=50, help="rows per table")
+  ap.add_argument("--cols", type=int, default=8, help="generated columns per table row")
+  ap.add_argument("--min-time", type=float, default=1.0, help="seconds per benchmark")
+  ap.add_argument("--only", action="append", help="run benchmarks whose name contains this")
+  ap.add_argument("--sweep", help="KEY=V1,V2,... – re-run for each value of one shape key")
+  ap.add_argument("--json", help="write the results to this file")
+  ap.add_argument("--compare", help="results file (--json) to compare against")
+  args = ap.parse_args(argv)
+
+  app = offline_anvil.load_app()
+  shape = {k: getattr(args, k) for k in SHAPE_KEYS}
+
+  if args.sweep:
+    key, _, raw = args.sweep.partition("=")
+    if key not in SHAPE_KEYS or not raw:
+      ap.error(f"--sweep needs KEY=V1,V2,... with KEY one of {', '.join(SHAPE_KEYS)}")
+    values = [int(v) for v in raw.split(",")]
+    runs = []
+    for value in values:
+      print(f"{key}={value} …", file=sys.stderr)
+      runs.append(run_suite(app, dict(shape, **{key: value}), args.min_time, args.only))
+    print_sweep(key, values, runs)
+    results = {"sweep": {"key": key, "values": values, "runs": runs}, "shape": shape}
+  else:
+    print("shape: " + " ".join(f"{k}={v}" for k, v in shape.items()))
+    runs = run_suite(app, shape, args.min_time, args.only)
+    baseline = None
+    if args.compare:
+      with open(args.compare, encoding="utf-8") as f:
+        baseline = json.load(f).get("results")
+    print_results(runs, baseline)
+    results = {"shape": shape, "results": runs}
+
+  if args.json:
+    with open(args.json, "w", encoding="utf-8") as f:
+      json.dump(results, f, indent=2)
+  return 0
+
+
+if __name__ == "__main__":
+  sys.exit(main())
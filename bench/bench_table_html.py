@@ -0,0 +1,82 @@
+# bench_table_html.py – timing for the table HTML builder
+#
+# Runs offline (no Anvil needed):
+#
+#   python bench/bench_table_html.py                 # 10k rows, default shape
+#   python bench/bench_table_html.py --rows 50000 --max-ms 2500
+#
+# --max-ms makes the script exit non-zero if the full (non-virtual) build is
+# slower than the given budget, so it can guard against regressions.
+
+import argparse
+import importlib.util
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_table_html():
+  """Import client_code/table_html.py without importing the Anvil app package."""
+  path = os.path.join(ROOT, "client_code", "table_html.py")
+  spec = importlib.util.spec_from_file_location("table_html", path)
+  module = importlib.util.module_from_spec(spec)
+  spec.loader.exec_module(module)
+  return module
+
+
+def synthetic_rows(n_rows, n_cols=8, seed=7):
+  """Tract-like rows: short strings, numbers, a nested dict and some long text."""
+  rng = random.Random(seed)
+  rows = []
+  for i in range(n_rows):
+    row = {f"col_{c}": rng.choice(["", "N/A", f"value {i}-{c}", rng.randint(0, 10**6)])
+           for c in range(n_cols)}
+    row["location"] = {"section": str(rng.randint(1, 36)), "township": f"{rng.randint(1, 40)}N",
+                       "range": f"{rng.randint(1, 40)}W"}
+    row["description"] = ("Lot 3 & the S/2 <NE/4> \"more or less\" " * rng.randint(1, 4)
+                          if i % 5 == 0 else "SE/4")
+    rows.append(row)
+  return rows
+
+
+def best_of(fn, repeat):
+  best = None
+  for _ in range(repeat):
+    t0 = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - t0
+    best = elapsed if best is None else min(best, elapsed)
+  return best
+
+
+def main(argv=None):
+  ap = argparse.ArgumentParser(description=__doc__)
+  ap.add_argument("--rows", type=int, default=10_000)
+  ap.add_argument("--cols", type=int, default=8)
+  ap.add_argument("--repeat", type=int, default=5)
+  ap.add_argument("--max-ms", type=float, default=None,
+                  help="fail if the full build takes longer than this")
+  args = ap.parse_args(argv)
+
+  table_html = load_table_html()
+  rows = synthetic_rows(args.rows, args.cols)
+
+  full = best_of(lambda: table_html.build_table(rows), args.repeat)
+  virtual = best_of(lambda: table_html.build_table(rows, virtual=True), args.repeat)
+  frag = table_html.build_table(rows)
+
+  print(f"rows={args.rows} cols={len(frag.columns)} html={len(frag.html) / 1e6:.1f} MB")
+  print(f"build_table          {full * 1000:8.1f} ms  ({args.rows / full:,.0f} rows/s)")
+  print(f"build_table virtual  {virtual * 1000:8.1f} ms  ({args.rows / virtual:,.0f} rows/s)")
+
+  if args.max_ms is not None and full * 1000 > args.max_ms:
+    print(f"FAIL: build_table took {full * 1000:.1f} ms > budget {args.max_ms:.1f} ms")
+    return 1
+  return 0
+
+
+if __name__ == "__main__":
+  sys.exit(main())
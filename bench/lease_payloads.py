@@ -0,0 +1,108 @@
+# lease_payloads.py – synthetic extraction results shaped like lease payloads
+#
+#   item = lease_payload(depth=3, fields=40, tables=3, rows=50)
+#   result_json = {"output": [item]}
+#   spec = schema_spec(item)             # for SetupConfig.seed_schema_config
+#   seed_tables(app, docs=200, shape=dict(depth=3, fields=40, tables=3, rows=50))
+#
+# Scalars are spread over nested dicts up to *depth* levels below the item
+# (the way `document_details.primary_term.unit` is), tables are lists of
+# tract-like rows (bench_table_html.synthetic_rows) hung at varying depths.
+
+import random
+
+from bench_table_html import synthetic_rows
+
+
+GROUPS = ["Document Info", "Legal Description", "Lease Info", "Analysis"]
+
+_WORDS = ["lessor", "lessee", "royalty", "primary", "term", "acreage", "tract",
+          "bonus", "shut_in", "pooling", "depth", "assignment", "surface", "notice"]
+
+
+def _value(rng, i):
+  kind = i % 6
+  if kind == 0:
+    return rng.randint(0, 10**6)
+  if kind == 1:
+    return rng.choice(["1/8", "3/16", "1/4", "0.1875"])
+  if kind == 2:
+    return None
+  if kind == 3:
+    return ("Paid up lease covering the lands described herein, "
+            "together with all rights incident thereto. " * rng.randint(1, 6)).strip()
+  return f"value {i}"
+
+
+def lease_payload(depth=3, fields=40, tables=3, rows=50, cols=8, seed=7):
+  """One payload item: *fields* scalars nested up to *depth* levels, plus
+    *tables* tables of *rows* rows (about *cols* + 4 flattened columns)."""
+  rng = random.Random(seed)
+  item = {"run_config": {"model": "extractor-v2", "temperature": 0, "pages": 12}}
+  for i in range(fields):
+    level = i % max(1, depth)
+    node = item
+    for d in range(level):
+      node = node.setdefault(f"{_WORDS[(i + d) % len(_WORDS)]}_group_{d}", {})
+    node[f"{_WORDS[i % len(_WORDS)]}_{i}"] = _value(rng, i)
+  for t in range(tables):
+    node = item
+    for d in range(t % max(1, depth)):
+      node = node.setdefault(f"schedule_{d}", {})
+    node[f"table_{t}"] = synthetic_rows(rows, cols, seed=seed + t)
+  return item
+
+
+def scalar_paths(value, parent_key=""):
+  """Dotted paths of every scalar below dicts (tables are skipped)."""
+  out = []
+  for k, v in value.items():
+    key = f"{parent_key}.{k}" if parent_key else k
+    if isinstance(v, dict):
+      out.extend(scalar_paths(v, key))
+    elif not isinstance(v, list):
+      out.append(key)
+  return out
+
+
+def schema_spec(item, name="base_lease"):
+  """seed_schema_config spec configuring every scalar of *item*: spread over
+    GROUPS, long-text fields as TextArea, run_config excluded."""
+  fields = []
+  for i, path in enumerate(scalar_paths(item)):
+    excluded = path.startswith("run_config")
+    fields.append({
+      "path":         path,
+      "widget_type":  "TextArea" if i % 6 == 3 else "TextBox",
+      "layout_group": None if excluded else GROUPS[i % len(GROUPS)],
+      "excluded":     excluded,
+    })
+  return {
+    "name":      name,
+    "structure": {"layout": [{"title": g, "style": "two-column"} for g in GROUPS]},
+    "fields":    fields,
+  }
+
+
+def doc_id(i):
+  return f"LEASE-{i:05d}"
+
+
+def seed_tables(app, docs=100, shape=None, schema="base_lease"):
+  """Fill the offline tables: the schema config (through SetupConfig) and
+    *docs* documents sharing one payload *shape* (lease_payload kwargs).
+    Returns the payload item the documents were generated from."""
+  import offline_tables
+  shape = dict(shape or {})
+  item = lease_payload(**shape)
+  app.module("SetupConfig").seed_schema_config(schema_spec(item, schema))
+
+  offline_tables.app_tables.documents.create_index("doc_id")
+  offline_tables.app_tables.review_views.create_index("doc_id")
+  offline_tables.app_tables.schema.create_index("name")
+  offline_tables.app_tables.documents.add_rows([
+    {"doc_id": doc_id(i), "result_json": {"output": [item]}, "flags": {},
+     "version": 0}
+    for i in range(docs)
+  ])
+  return item
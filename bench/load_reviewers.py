@@ -0,0 +1,330 @@
+# load_reviewers.py – many reviewers at once against the server modules
+#
+# Replays reviewer sessions the way ReviewForm runs them – bootstrap_review
+# once, then open (get_documents with the view + server table HTML,
+# revalidating cached copies by etag), prefetch the next documents, edit,
+# save a patch (save_document_patch, merging or reloading on conflict),
+# next – from a thread pool against ReviewService running on the offline
+# table stand-in (offline_tables).  Reports per callable the p50 / p95 / p99
+# latency and throughput, the save outcomes, plus the rows that were fought
+# over: lock waits of overlapping saves, and reads that hit a row while a
+# save held it.
+#
+#   python bench/load_reviewers.py                           # 50 reviewers, 20 s
+#   python bench/load_reviewers.py --reviewers 200 --rows 500 --hot-share 0.5
+#   python bench/load_reviewers.py --db-latency-ms 5 --json run.json
+#
+# Threads, not processes: the tables live in this process.  Python work is
+# serialized by the GIL, so --db-latency-ms (a sleep per table call, like a
+# database round trip) is what lets requests actually overlap; without it
+# the numbers show the CPU cost of each callable under queueing.
+
+import argparse
+from collections import OrderedDict
+import html
+import json
+import math
+import os
+import random
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import offline_anvil                                               # noqa: E402
+import offline_tables                                              # noqa: E402
+from lease_payloads import seed_tables, doc_id                     # noqa: E402
+
+CALLABLES = ("bootstrap_review", "get_documents", "get_documents (prefetch)",
+             "save_document_patch")
+SCHEMA = "base_lease"
+
+# ReviewForm's defaults
+DOC_PAGE_SIZE = 50
+DOC_CACHE_SIZE = 20
+PREFETCH_COUNT = 3
+VIEW = {"project": SCHEMA, "prune": True, "view": True, "fragments": True}
+
+
+# ---------------------------------------------------------------------------
+# Recording
+# ---------------------------------------------------------------------------
+
+class Recorder:
+  """Latency samples per callable (plus whole sessions), thread-safe."""
+
+  def __init__(self):
+    self._guard = threading.Lock()
+    self.samples = {}       # name -> [ms, ...]
+    self.errors = {}        # name -> {error type: count}
+    self.saves = {}         # save_document_patch status -> count
+
+  def call(self, name, *args, label=None, **kwargs):
+    label = label or name
+    start = time.perf_counter()
+    try:
+      return offline_anvil.call(name, *args, **kwargs)
+    except Exception as e:
+      with self._guard:
+        by_type = self.errors.setdefault(label, {})
+        by_type[type(e).__name__] = by_type.get(type(e).__name__, 0) + 1
+      return None
+    finally:
+      self.add(label, (time.perf_counter() - start) * 1000)
+
+  def saved(self, status):
+    with self._guard:
+      self.saves[status] = self.saves.get(status, 0) + 1
+
+  def add(self, name, ms):
+    with self._guard:
+      self.samples.setdefault(name, []).append(ms)
+
+
+def percentile(ordered, pct):
+  """Nearest-rank percentile of an ascending list."""
+  if not ordered:
+    return None
+  rank = max(1, math.ceil(pct / 100 * len(ordered)))
+  return ordered[rank - 1]
+
+
+def summarize(recorder, wall_s):
+  out = {}
+  for name, samples in recorder.samples.items():
+    ordered = sorted(samples)
+    out[name] = {
+      "calls":        len(ordered),
+      "errors":       sum(recorder.errors.get(name, {}).values()),
+      "throughput_s": len(ordered) / wall_s,
+      "p50_ms":       percentile(ordered, 50),
+      "p95_ms":       percentile(ordered, 95),
+      "p99_ms":       percentile(ordered, 99),
+      "max_ms":       ordered[-1],
+    }
+  return out
+
+
+# ---------------------------------------------------------------------------
+# Sessions
+# ---------------------------------------------------------------------------
+
+class Client:
+  """One reviewer's browser: ReviewForm's document LRU (payloads + etags)."""
+
+  def __init__(self, recorder):
+    self.recorder = recorder
+    self.docs = OrderedDict()     # doc_id -> payload, most recent last
+    self.stale = set()            # held, but must be revalidated
+
+  def put(self, d, doc):
+    self.docs[d] = doc
+    self.docs.move_to_end(d)
+    self.stale.discard(d)
+    while len(self.docs) > DOC_CACHE_SIZE:
+      self.stale.discard(self.docs.popitem(last=False)[0])
+
+  def merge(self, d, resp):
+    if resp.get("not_modified"):
+      if d not in self.docs:
+        return None
+      self.stale.discard(d)
+      return self.docs[d]
+    self.put(d, resp)
+    return resp
+
+  def known_etags(self, ids):
+    return {d: self.docs[d]["etag"] for d in ids if d in self.docs}
+
+  def open(self, d):
+    """load_document: a fresh cached copy, else get_documents (by etag)."""
+    if d in self.docs and d not in self.stale:
+      self.docs.move_to_end(d)
+      return self.docs[d]
+    docs = self.recorder.call("get_documents", [d], known_etags=self.known_etags([d]), **VIEW)
+    doc = self.merge(d, docs[d]) if docs and d in docs else None
+    if doc is None and docs and d in docs:
+      docs = self.recorder.call("get_documents", [d], **VIEW)
+      doc = self.merge(d, docs[d]) if docs and d in docs else None
+    return doc
+
+  def prefetch(self, ids):
+    wanted = [d for d in ids if d not in self.docs or d in self.stale]
+    if not wanted:
+      return
+    docs = self.recorder.call("get_documents", wanted, known_etags=self.known_etags(wanted),
+                              label="get_documents (prefetch)", **VIEW)
+    for d in wanted:
+      if docs and d in docs:
+        self.merge(d, docs[d])
+
+  def invalidate(self, d):
+    if d in self.docs:
+      self.stale.add(d)
+
+
+def _cell_text(table, row, col):
+  """What the browser shows in one cell: from "cells" (virtual tables) or
+    read back from the fragment's markup."""
+  if table.get("cells") is not None:
+    return table["cells"][row][col]
+  at = f'data-row="{row}" data-col="{col}"'
+  m = (re.search(rf'<input type="text" value="([^"]*)" {at}/>', table["html"])
+       or re.search(rf"<textarea {at}>(.*?)</textarea>", table["html"], re.S))
+  return html.unescape(m.group(1)) if m else ""
+
+
+def _patch(view, rng, cells):
+  """ReviewForm's save patch for a few edited scalars and table cells."""
+  scalars = view["scalars"]
+  ops = [{"path": p.split("."), "old": scalars[p], "value": f"edited {rng.randint(0, 10**6)}"}
+         for p in rng.sample(sorted(scalars), min(len(scalars), 3))]
+  tables = [t for t in view["tables"] if t["rows"]]
+  for _ in range(cells if tables else 0):
+    t = rng.choice(tables)
+    row, col = rng.randrange(t["rows"]), rng.randrange(len(t["columns"]))
+    ops.append({"path": t["path"].split(".") + [row, t["columns"][col]],
+                "old": _cell_text(t, row, col),
+                "value": f"corrected {rng.randint(0, 10**6)}"})
+  return ops
+
+
+def reviewer(n, args, recorder, deadline):
+  """One reviewer: bootstrap, then open → prefetch → think → save → next,
+    until *deadline*."""
+  rng = random.Random(args.seed * 1000 + n)
+  time.sleep(rng.uniform(0, args.ramp_s))
+  client, sessions = Client(recorder), 0
+  first = doc_id(rng.randrange(args.docs))
+  boot = recorder.call("bootstrap_review", first, SCHEMA, page_size=DOC_PAGE_SIZE,
+                       schema_etag=None, **dict(VIEW, project=True))
+  if boot and boot["document"]:
+    client.put(first, boot["document"])
+  while time.perf_counter() < deadline:
+    if rng.random() < args.hot_share:
+      i = rng.randrange(args.hot_docs)
+    else:
+      i = rng.randrange(args.docs)
+    start = time.perf_counter()
+
+    # open, then warm the cache with the next documents in picker order
+    doc = client.open(doc_id(i))
+    if doc is None or not doc.get("view"):
+      continue
+    client.prefetch([doc_id(j) for j in range(i + 1, min(i + 1 + PREFETCH_COUNT, args.docs))])
+
+    # edit
+    time.sleep(rng.uniform(0, args.think_ms) / 1000)
+    ops = _patch(doc["view"], rng, args.edit_cells)
+
+    # save the patch; on conflict the reviewer reloads (and edits again)
+    result = recorder.call("save_document_patch", doc_id(i), ops, doc["version"])
+    client.invalidate(doc_id(i))
+    if result:
+      recorder.saved(result["status"])
+      if result["status"] == "conflict":
+        client.open(doc_id(i))
+    recorder.add("session", (time.perf_counter() - start) * 1000)
+    sessions += 1
+  return sessions
+
+
+# ---------------------------------------------------------------------------
+# Reporting
+# ---------------------------------------------------------------------------
+
+def _row_label(table, row_id):
+  """"documents:LEASE-00003" for rows with a doc_id, else "table:<row id>"."""
+  row = getattr(offline_tables.app_tables, table).row(row_id)
+  key = row._data.get("doc_id") if row is not None else None
+  return f"{table}:{key if key is not None else row_id}"
+
+
+def print_report(summary, recorder, hot_rows, wall_s, args):
+  print(f"{args.reviewers} reviewers, {wall_s:.1f} s, {args.docs} docs "
+        f"({args.hot_docs} hot, {args.hot_share:.0%} of opens), "
+        f"db latency {args.db_latency_ms} ms")
+  print(f"\n{'callable':<24} {'calls':>7} {'errors':>6} {'per s':>8} "
+        f"{'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+  for name in CALLABLES + ("session",):
+    s = summary.get(name)
+    if not s:
+      continue
+    print(f"{name:<24} {s['calls']:>7} {s['errors']:>6} {s['throughput_s']:>8.1f} "
+          f"{s['p50_ms']:>9.2f} {s['p95_ms']:>9.2f} {s['p99_ms']:>9.2f} {s['max_ms']:>9.2f}")
+
+  saves = " ".join(f"{k} {v}" for k, v in sorted(recorder.saves.items()))
+  print(f"\nsaves: {saves or 'none'}")
+
+  c = offline_tables.contention
+  print(f"\ntransaction conflicts: {c.conflicts} (retried {c.retries})")
+  print(f"\n{'hot row':<28} {'reads':>7} {'writes':>7} {'reads@write':>11} "
+        f"{'lock waits':>10} {'wait ms':>9} {'max wait':>9}")
+  for table, row_id, r in hot_rows:
+    print(f"{_row_label(table, row_id):<28} {r['reads']:>7} {r['writes']:>7} "
+          f"{r['reads_during_write']:>11} {r['lock_waits']:>10} "
+          f"{r['lock_wait_ms']:>9.1f} {r['max_wait_ms']:>9.1f}")
+
+
+def main(argv=None):
+  ap = argparse.ArgumentParser(description="Concurrent reviewer load test (offline)")
+  ap.add_argument("--reviewers", type=int, default=50, help="concurrent reviewers (threads)")
+  ap.add_argument("--duration", type=float, default=20.0, help="seconds of load")
+  ap.add_argument("--ramp-s", type=float, default=2.0, help="reviewer start-up spread")
+  ap.add_argument("--think-ms", type=float, default=200.0, help="max edit time per document")
+  ap.add_argument("--docs", type=int, default=500, help="documents in the table")
+  ap.add_argument("--hot-docs", type=int, default=5, help="documents everyone works on")
+  ap.add_argument("--hot-share", type=float, default=0.2, help="share of opens on hot docs")
+  ap.add_argument("--edit-cells", type=int, default=5, help="table cells edited per save")
+  ap.add_argument("--fields", type=int, default=40)
+  ap.add_argument("--depth", type=int, default=3)
+  ap.add_argument("--tables", type=int, default=3)
+  ap.add_argument("--rows", type=int, default=200, help="rows per table (corrected_json size)")
+  ap.add_argument("--db-latency-ms", type=float, default=2.0,
+                  help="simulated round trip per table call")
+  ap.add_argument("--top", type=int, default=10, help="hot rows to list")
+  ap.add_argument("--seed", type=int, default=7)
+  ap.add_argument("--json", help="write the results to this file")
+  args = ap.parse_args(argv)
+  args.hot_docs = max(1, min(args.hot_docs, args.docs))
+
+  app = offline_anvil.load_app()
+  offline_anvil.reset_tables()
+  shape = dict(depth=args.depth, fields=args.fields, tables=args.tables, rows=args.rows)
+  seed_tables(app, docs=args.docs, shape=shape, schema=SCHEMA)
+  app.module("ReviewService")                      # registers the callables
+  offline_tables.app_tables.set_latency(args.db_latency_ms)
+  offline_tables.contention.reset()
+
+  recorder = Recorder()
+  start = time.perf_counter()
+  deadline = start + args.duration
+  with ThreadPoolExecutor(max_workers=args.reviewers) as pool:
+    sessions = sum(pool.map(lambda n: reviewer(n, args, recorder, deadline),
+                            range(args.reviewers)))
+  wall_s = time.perf_counter() - start
+
+  summary = summarize(recorder, wall_s)
+  hot_rows = [r for r in offline_tables.contention.hot_rows(args.top)
+              if r[2]["writes"] or r[2]["reads_during_write"]]
+  print_report(summary, recorder, hot_rows, wall_s, args)
+  print(f"\n{sessions} sessions completed")
+  for name, errors in recorder.errors.items():
+    print(f"errors in {name}: {errors}")
+
+  if args.json:
+    with open(args.json, "w", encoding="utf-8") as f:
+      json.dump({"args": vars(args), "wall_s": wall_s, "sessions": sessions,
+                 "callables": summary, "errors": recorder.errors,
+                 "saves": recorder.saves,
+                 "conflicts": offline_tables.contention.conflicts,
+                 "hot_rows": [{"row": _row_label(t, rid), **r} for t, rid, r in hot_rows]},
+                f, indent=2)
+  return 0
+
+
+if __name__ == "__main__":
+  sys.exit(main())
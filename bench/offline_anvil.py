@@ -0,0 +1,401 @@
+# offline_anvil.py – run the app's modules without Anvil
+#
+# install() puts stand-ins for `anvil`, `anvil.server`, `anvil.js`,
+# `anvil.tables` and `anvil.tables.query` into sys.modules, declares the
+# tables from anvil.yaml (offline_tables) and generates the forms'
+# `_anvil_designer` modules.  load_app() then imports the app package:
+#
+#   from offline_anvil import install, load_app
+#   install()
+#   app = load_app()
+#   renderer = app.module("MainReviewForm.json_renderer")
+#   config = app.module("ConfigService")
+#
+# The components only keep their properties and children; nothing is drawn.
+# JavaScript calls go to handlers registered with on_js() (unhandled ones
+# return None), so a benchmark decides what "the browser" answers.
+
+import importlib
+import importlib.util
+import os
+import sys
+import tempfile
+import types
+
+import offline_tables
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_PACKAGE = "M3_App_3"
+
+
+# ---------------------------------------------------------------------------
+# Components (anvil)
+# ---------------------------------------------------------------------------
+
+class Component:
+  def __init__(self, **properties):
+    self.parent = None
+    self.tag = None
+    self.role = None
+    self.visible = True
+    self._children = []
+    self._handlers = {}
+    for name, value in properties.items():
+      setattr(self, name, value)
+
+  def init_components(self, **properties):
+    # forms call this instead of the template's __init__
+    if "_children" not in self.__dict__:
+      Component.__init__(self)
+    for name, value in properties.items():
+      setattr(self, name, value)
+
+  def add_component(self, component, **layout):
+    component.parent = self
+    self._children.append(component)
+
+  def get_components(self):
+    return list(self._children)
+
+  def clear(self):
+    for child in self._children:
+      child.parent = None
+    self._children = []
+
+  def remove_from_parent(self):
+    if self.parent is not None:
+      self.parent._children.remove(self)
+      self.parent = None
+
+  def set_event_handler(self, event, handler):
+    self._handlers[event] = handler
+
+  def add_event_handler(self, event, handler):
+    self._handlers[event] = handler
+
+  def raise_event(self, event, **event_args):
+    handler = self._handlers.get(event)
+    if handler is not None:
+      return handler(sender=self, event_name=event, **event_args)
+
+
+class ColumnPanel(Component):
+  pass
+
+
+class FlowPanel(Component):
+  pass
+
+
+class LinearPanel(Component):
+  pass
+
+
+class GridPanel(Component):
+  pass
+
+
+class HtmlTemplate(Component):
+  def __init__(self, html="", **properties):
+    super().__init__(html=html, **properties)
+
+
+class Label(Component):
+  def __init__(self, text="", **properties):
+    super().__init__(text=text, **properties)
+
+
+class Link(Label):
+  pass
+
+
+class Button(Label):
+  pass
+
+
+class TextBox(Component):
+  def __init__(self, text="", **properties):
+    super().__init__(text=text, **properties)
+
+
+class TextArea(TextBox):
+  pass
+
+
+class DropDown(Component):
+  def __init__(self, items=(), selected_value=None, **properties):
+    super().__init__(items=list(items), selected_value=selected_value, **properties)
+
+
+class Spacer(Component):
+  pass
+
+
+class Timer(Component):
+  pass
+
+
+class Media:
+  def __init__(self, content_type, content, name=None):
+    self.content_type = content_type
+    self.name = name
+    self._content = content
+
+  def get_bytes(self):
+    return self._content
+
+  @property
+  def length(self):
+    return len(self._content)
+
+  def get_url(self, is_download=True):
+    return f"offline://media/{id(self):x}/{self.name or 'blob'}"
+
+
+class BlobMedia(Media):
+  pass
+
+
+class TempFile:
+  """anvil.media.TempFile: the media's bytes in a temp file for the block."""
+
+  def __init__(self, media):
+    self._media = media
+    self._path = None
+
+  def __enter__(self):
+    fd, self._path = tempfile.mkstemp()
+    with os.fdopen(fd, "wb") as f:
+      f.write(self._media.get_bytes())
+    return self._path
+
+  def __exit__(self, *exc):
+    os.remove(self._path)
+    return False
+
+
+def alert(content, **kwargs):
+  return True
+
+
+def confirm(content, **kwargs):
+  return True
+
+
+class Notification:
+  def __init__(self, message, **kwargs):
+    self.message = message
+
+  def show(self):
+    return self
+
+  def hide(self):
+    pass
+
+
+_COMPONENTS = [Component, ColumnPanel, FlowPanel, LinearPanel, GridPanel, HtmlTemplate,
+               Label, Link, Button, TextBox, TextArea, DropDown, Spacer, Timer,
+               Media, BlobMedia, Notification, alert, confirm]
+
+
+# ---------------------------------------------------------------------------
+# anvil.js
+# ---------------------------------------------------------------------------
+
+_js_handlers = {}
+
+
+def on_js(name, handler):
+  """Answer anvil.js.call_js(name, ...) with handler(*args)."""
+  _js_handlers[name] = handler
+
+
+class _Window:
+  """anvil.js.window: eval() of the app's helper JS defines its globals."""
+
+  def eval(self, source):
+    import re
+    for name in re.findall(r"(?:window\.(\w+)\s*=|function\s+(\w+)\s*\()", source):
+      setattr(self, name[0] or name[1], True)
+
+
+class _DomNode:
+  def __init__(self, owner, selector=None):
+    self.owner = owner
+    self.selector = selector
+
+  def querySelector(self, selector):
+    return _DomNode(self.owner, selector)
+
+  def querySelectorAll(self, selector):
+    return []
+
+
+def _call_js(name, *args):
+  handler = _js_handlers.get(name)
+  return handler(*args) if handler is not None else None
+
+
+# ---------------------------------------------------------------------------
+# anvil.server
+# ---------------------------------------------------------------------------
+
+_callables = {}
+
+
+def _register(fn=None, *args, **kwargs):
+  """@callable / @callable("name") / @background_task – registers by name."""
+  if callable(fn):
+    _callables[fn.__name__] = fn
+    return fn
+  name = fn
+
+  def wrap(f):
+    _callables[name or f.__name__] = f
+    return f
+  return wrap
+
+
+def _call(name, *args, **kwargs):
+  return _callables[name](*args, **kwargs)
+
+
+def call(name, *args, **kwargs):
+  """Call a registered server function by name, like anvil.server.call."""
+  return _call(name, *args, **kwargs)
+
+
+class _Task:
+  def __init__(self, result=None, error=None):
+    self._result = result
+    self._error = error
+
+  def is_completed(self):
+    return True
+
+  def get_state(self):
+    return _server.task_state
+
+  def get_return_value(self):
+    if self._error is not None:
+      raise self._error
+    return self._result
+
+  def get_error(self):
+    return self._error
+
+
+def _launch_background_task(name, *args, **kwargs):
+  """Runs the task to completion in the calling thread."""
+  try:
+    return _Task(result=_call(name, *args, **kwargs))
+  except Exception as e:
+    return _Task(error=e)
+
+
+# ---------------------------------------------------------------------------
+# Installing
+# ---------------------------------------------------------------------------
+
+def _module(name, **attrs):
+  mod = types.ModuleType(name)
+  mod.__dict__.update(attrs)
+  sys.modules[name] = mod
+  return mod
+
+
+_server = None
+
+
+def install():
+  """Put the anvil stand-ins into sys.modules (idempotent)."""
+  global _server
+  if "anvil" in sys.modules and getattr(sys.modules["anvil"], "__offline__", False):
+    return
+  anvil = _module("anvil", __offline__=True,
+                  **{getattr(c, "__name__"): c for c in _COMPONENTS})
+  _server = anvil.server = _module(
+    "anvil.server", callable=_register, background_task=_register, call=_call,
+    call_s=_call, launch_background_task=_launch_background_task, task_state={},
+    session={}, NoServerFunctionError=KeyError, PermissionDenied=PermissionError,
+    context=types.SimpleNamespace(client=types.SimpleNamespace(type="server_module")),
+  )
+  anvil.media = _module("anvil.media", TempFile=TempFile)
+  anvil.js = _module("anvil.js", window=_Window(), call_js=_call_js,
+                     get_dom_node=lambda component: _DomNode(component))
+  anvil.tables = _module(
+    "anvil.tables", app_tables=offline_tables.app_tables,
+    in_transaction=offline_tables.in_transaction, order_by=offline_tables.order_by,
+    batch_update=offline_tables.batch_update, batch_delete=offline_tables.batch_delete,
+    TransactionConflict=offline_tables.TransactionConflict,
+    TableError=offline_tables.TableError,
+  )
+  anvil.tables.query = _module(
+    "anvil.tables.query",
+    **{n: getattr(offline_tables.query, n) for n in dir(offline_tables.query)
+       if not n.startswith("_")}
+  )
+  define_tables()
+
+
+def reset_tables():
+  """Drop every table and row, then declare the anvil.yaml tables again."""
+  offline_tables.app_tables.reset()
+  offline_tables.contention.reset()
+  define_tables()
+
+
+def define_tables():
+  """Declare every table of anvil.yaml's db_schema (with its columns)."""
+  try:
+    import yaml
+  except ImportError:
+    return                      # tables then accept any column
+  with open(os.path.join(ROOT, "anvil.yaml"), encoding="utf-8") as f:
+    schema = yaml.safe_load(f).get("db_schema") or {}
+  for name, table in schema.items():
+    offline_tables.app_tables.define(name, [c["name"] for c in table.get("columns", [])])
+
+
+# ---------------------------------------------------------------------------
+# The app package
+# ---------------------------------------------------------------------------
+
+class App:
+  def __init__(self, package):
+    self.package = package
+
+  def module(self, dotted):
+    """Import one app module: "ConfigService", "MainReviewForm.json_renderer"."""
+    return importlib.import_module(f"{APP_PACKAGE}.{dotted}")
+
+  @property
+  def callables(self):
+    return _callables
+
+
+def _designer_modules():
+  """Fake `<Form>._anvil_designer` modules for every form in client_code."""
+  client = os.path.join(ROOT, "client_code")
+  for folder, _, files in os.walk(client):
+    if "form_template.yaml" not in files:
+      continue
+    form = os.path.basename(folder)
+    dotted = os.path.relpath(folder, client).replace(os.sep, ".")
+    template = type(f"{form}Template", (ColumnPanel,), {})
+    _module(f"{APP_PACKAGE}.{dotted}._anvil_designer", **{template.__name__: template})
+
+
+def load_app():
+  """Import the app package (server_code + client_code) under APP_PACKAGE."""
+  install()
+  if APP_PACKAGE in sys.modules:
+    return App(sys.modules[APP_PACKAGE])
+  spec = importlib.util.spec_from_file_location(
+    APP_PACKAGE, os.path.join(ROOT, "__init__.py"), submodule_search_locations=[ROOT]
+  )
+  package = importlib.util.module_from_spec(spec)
+  sys.modules[APP_PACKAGE] = package
+  spec.loader.exec_module(package)
+  _designer_modules()
+  return App(package)
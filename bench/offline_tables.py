@@ -0,0 +1,536 @@
+# offline_tables.py – in-memory stand-in for anvil.tables / app_tables
+#
+# Enough of the Data Tables API for the server modules to run unchanged on a
+# laptop: search / get / add_row / add_rows, fetch_only, order_by, the
+# query operators the app uses, batch_update / batch_delete and
+# in_transaction with conflict retries.
+#
+# It models the costs that matter when comparing changes:
+#   * simpleObject values (dicts / lists) are stored as JSON text, so every
+#     write serializes and every read parses – like a real round trip
+#   * writes take a per-row lock; inside in_transaction the locks are held
+#     until commit (a conflict after LOCK_TIMEOUT_S rolls back and retries);
+#     reads never wait
+#   * every read and write is counted per row, together with lock waits and
+#     reads that hit a row another thread holds for writing (see contention)
+#
+# Latency to the database is not modelled unless set (app_tables.set_latency).
+
+import functools
+import itertools
+import json
+import threading
+import time
+
+
+LOCK_TIMEOUT_S = 2.0        # wait for a row lock before the tx counts as conflicting
+TX_RETRIES = 5              # attempts per in_transaction call (Anvil retries too)
+
+
+class TransactionConflict(Exception):
+  """A transaction could not lock a row held by another one."""
+
+
+class TableError(Exception):
+  pass
+
+
+# ---------------------------------------------------------------------------
+# Query operators (anvil.tables.query)
+# ---------------------------------------------------------------------------
+
+class _FetchOnly:
+  def __init__(self, *columns, **links):
+    self.columns = columns
+    self.links = links
+
+
+class _OrderBy:
+  def __init__(self, column, ascending=True):
+    self.column = column
+    self.ascending = ascending
+
+
+class _Condition:
+  def __init__(self, test):
+    self.test = test
+
+  def matches(self, value):
+    return self.test(value)
+
+
+def _like_test(pattern, fold):
+  import re
+  regex = "".join(".*" if ch == "%" else "." if ch == "_" else re.escape(ch)
+                  for ch in pattern)
+  compiled = re.compile(f"^{regex}$", re.S | (re.I if fold else 0))
+  return lambda v: isinstance(v, str) and compiled.match(v) is not None
+
+
+def _compare(op):
+  def make(bound):
+    return _Condition(lambda v: v is not None and op(v, bound))
+  return make
+
+
+def _matches(value, expected):
+  if isinstance(expected, _Condition):
+    return expected.matches(value)
+  if isinstance(expected, list) and all(isinstance(e, Row) for e in expected):
+    # link_multiple: every listed row must be linked
+    linked = value or []
+    return all(any(e is r for r in linked) for e in expected)
+  return value == expected
+
+
+class _QueryModule:
+  """Attributes of the anvil.tables.query stand-in."""
+
+  fetch_only = _FetchOnly
+
+  @staticmethod
+  def any_of(*values):
+    return _Condition(lambda v: any(_matches(v, e) for e in values))
+
+  @staticmethod
+  def all_of(*values):
+    return _Condition(lambda v: all(_matches(v, e) for e in values))
+
+  @staticmethod
+  def none_of(*values):
+    return _Condition(lambda v: not any(_matches(v, e) for e in values))
+
+  @staticmethod
+  def not_(value):
+    return _Condition(lambda v: not _matches(v, value))
+
+  @staticmethod
+  def like(pattern):
+    return _Condition(_like_test(pattern, fold=False))
+
+  @staticmethod
+  def ilike(pattern):
+    return _Condition(_like_test(pattern, fold=True))
+
+  greater_than = staticmethod(_compare(lambda v, b: v > b))
+  less_than = staticmethod(_compare(lambda v, b: v < b))
+  greater_than_or_equal_to = staticmethod(_compare(lambda v, b: v >= b))
+  less_than_or_equal_to = staticmethod(_compare(lambda v, b: v <= b))
+
+
+# ---------------------------------------------------------------------------
+# Contention bookkeeping
+# ---------------------------------------------------------------------------
+
+class Contention:
+  """Per-row access counters, keyed by (table, row id).
+
+    reads count column reads; reads_during_write those made while another
+    thread held the row's write lock; lock_wait_ms sums the time writers
+    waited for it.
+    """
+
+  def __init__(self):
+    self._guard = threading.Lock()
+    self.reset()
+
+  def reset(self):
+    with self._guard:
+      self._rows = {}
+      self.conflicts = 0
+      self.retries = 0
+
+  def _entry(self, key):
+    entry = self._rows.get(key)
+    if entry is None:
+      entry = self._rows[key] = {"reads": 0, "writes": 0, "reads_during_write": 0,
+                                 "lock_waits": 0, "lock_wait_ms": 0.0, "max_wait_ms": 0.0}
+    return entry
+
+  def read(self, key, contended):
+    with self._guard:
+      entry = self._entry(key)
+      entry["reads"] += 1
+      if contended:
+        entry["reads_during_write"] += 1
+
+  def write(self, key, waited_ms):
+    with self._guard:
+      entry = self._entry(key)
+      entry["writes"] += 1
+      if waited_ms >= 0.05:
+        entry["lock_waits"] += 1
+        entry["lock_wait_ms"] += waited_ms
+        entry["max_wait_ms"] = max(entry["max_wait_ms"], waited_ms)
+
+  def conflict(self, retried):
+    with self._guard:
+      self.conflicts += 1
+      self.retries += 1 if retried else 0
+
+  def hot_rows(self, n=10, key="lock_wait_ms"):
+    """The *n* rows with the highest *key*, as [(table, row_id, counters)]."""
+    with self._guard:
+      items = [(t, rid, dict(c)) for (t, rid), c in self._rows.items()]
+    items.sort(key=lambda item: (item[2][key], item[2]["writes"]), reverse=True)
+    return items[:n]
+
+
+contention = Contention()
+
+
+# ---------------------------------------------------------------------------
+# Transactions
+# ---------------------------------------------------------------------------
+
+_local = threading.local()
+
+
+class _Transaction:
+  def __init__(self):
+    self.locked = []        # rows whose write lock this tx holds
+    self.undo = []          # callables restoring the pre-tx state, newest last
+
+  def lock(self, row):
+    if row._owner is self:
+      return 0.0
+    start = time.perf_counter()
+    if not row._lock.acquire(timeout=LOCK_TIMEOUT_S):
+      raise TransactionConflict(f"{row._table.name} row {row._id} is locked")
+    row._owner = self
+    self.locked.append(row)
+    snapshot = dict(row._data)
+    self.undo.append(lambda: row._restore(snapshot))
+    return (time.perf_counter() - start) * 1000
+
+  def release(self):
+    for row in reversed(self.locked):
+      row._owner = None
+      row._lock.release()
+    self.locked = []
+
+
+def _current_tx():
+  return getattr(_local, "tx", None)
+
+
+def in_transaction(fn=None, *, relaxed=False):
+  """Run *fn* holding the write locks of every row it writes until it returns;
+    on a conflict or an exception its writes are rolled back (conflicts are
+    retried up to TX_RETRIES times)."""
+  if fn is None:
+    return lambda f: in_transaction(f, relaxed=relaxed)
+
+  @functools.wraps(fn)
+  def wrapper(*args, **kwargs):
+    if _current_tx() is not None:           # nested: join the outer tx
+      return fn(*args, **kwargs)
+    for attempt in range(TX_RETRIES):
+      tx = _local.tx = _Transaction()
+      try:
+        result = fn(*args, **kwargs)
+      except TransactionConflict:
+        _rollback(tx)
+        contention.conflict(retried=attempt + 1 < TX_RETRIES)
+        if attempt + 1 == TX_RETRIES:
+          raise
+        time.sleep(0.001 * (attempt + 1))
+        continue
+      except BaseException:
+        _rollback(tx)
+        raise
+      finally:
+        _local.tx = None
+        tx.release()
+      return result
+
+  return wrapper
+
+
+def _rollback(tx):
+  for undo in reversed(tx.undo):
+    undo()
+  tx.undo = []
+
+
+class _Batch:
+  """`with tables.batch_update:` / `with tables.batch_delete:` – no-ops here."""
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exc):
+    return False
+
+
+batch_update = _Batch()
+batch_delete = _Batch()
+
+
+def order_by(column, ascending=True):
+  return _OrderBy(column, ascending)
+
+
+# ---------------------------------------------------------------------------
+# Rows and tables
+# ---------------------------------------------------------------------------
+
+def _encode(value):
+  """Store simpleObject values as JSON text (links / media stay objects)."""
+  if isinstance(value, dict) or (isinstance(value, list)
+                                 and not any(isinstance(v, Row) for v in value)):
+    return _Json(json.dumps(value, separators=(",", ":")))
+  return value
+
+
+def _decode(value):
+  return json.loads(value.text) if isinstance(value, _Json) else value
+
+
+class _Json:
+  __slots__ = ("text",)
+
+  def __init__(self, text):
+    self.text = text
+
+  def __eq__(self, other):
+    return isinstance(other, _Json) and other.text == self.text
+
+  def __hash__(self):
+    return hash(self.text)
+
+
+class Row:
+  def __init__(self, table, row_id, values):
+    self._table = table
+    self._id = row_id
+    self._data = {k: _encode(v) for k, v in values.items()}
+    self._lock = threading.Lock()
+    self._owner = None            # _Transaction (or "autocommit") holding the lock
+    self._deleted = False
+
+  # reads -------------------------------------------------------------------
+
+  def __getitem__(self, column):
+    owner = self._owner
+    contention.read((self._table.name, self._id),
+                    owner is not None and owner is not _current_tx())
+    if (self._table.strict and column not in self._data
+        and column not in self._table.columns):
+      raise KeyError(f"No such column '{column}' in table '{self._table.name}'")
+    return _decode(self._data.get(column))
+
+  def get(self, column, default=None):
+    value = self[column]
+    return default if value is None else value
+
+  def get_id(self):
+    return f"[{self._table.table_id},{self._id}]"
+
+  def __iter__(self):
+    return iter([(k, self[k]) for k in self._table.columns])
+
+  def __repr__(self):
+    return f"<Row {self._table.name}:{self._id}>"
+
+  # writes ------------------------------------------------------------------
+
+  def __setitem__(self, column, value):
+    self.update(**{column: value})
+
+  def update(self, **values):
+    self._table._tick()
+    encoded = {k: _encode(v) for k, v in values.items()}
+    tx = _current_tx()
+    if tx is not None:
+      waited = tx.lock(self)
+      self._apply(encoded)
+    else:
+      start = time.perf_counter()
+      self._lock.acquire()
+      waited = (time.perf_counter() - start) * 1000
+      self._owner = "autocommit"
+      try:
+        self._apply(encoded)
+      finally:
+        self._owner = None
+        self._lock.release()
+    contention.write((self._table.name, self._id), waited)
+
+  def _apply(self, encoded):
+    self._table._reindex(self, encoded)
+    self._data.update(encoded)
+    self._table.columns.update(encoded)
+
+  def _restore(self, snapshot):
+    self._table._reindex(self, snapshot)
+    self._data = snapshot
+
+  def delete(self):
+    tx = _current_tx()
+    if tx is not None:
+      tx.lock(self)
+      tx.undo.append(lambda: self._table._insert(self))
+    self._table._remove(self)
+
+
+class Table:
+  _ids = itertools.count(1000)
+
+  def __init__(self, name):
+    self.name = name
+    self.table_id = next(Table._ids)
+    self.columns = set()
+    self.strict = False         # unknown columns raise once the table is defined
+    self.latency_ms = 0.0       # simulated round-trip time per table call
+    self._rows = {}
+    self._next_id = itertools.count(1)
+    self._indexes = {}          # column -> {value: {row_id: row}}
+    self._guard = threading.RLock()
+
+  def _tick(self):
+    if self.latency_ms:
+      time.sleep(self.latency_ms / 1000)
+
+  # indexes -----------------------------------------------------------------
+
+  def create_index(self, column):
+    """Look up rows by equality on *column* without a full scan."""
+    with self._guard:
+      index = self._indexes[column] = {}
+      for row in self._rows.values():
+        index.setdefault(row._data.get(column), {})[row._id] = row
+
+  def _reindex(self, row, values):
+    with self._guard:
+      for column, index in self._indexes.items():
+        if column in values and not row._deleted:
+          old = row._data.get(column)
+          index.get(old, {}).pop(row._id, None)
+          index.setdefault(values[column], {})[row._id] = row
+
+  def _candidates(self, criteria):
+    """Rows to test: an index bucket when a criterion allows, else all rows."""
+    for column, expected in criteria.items():
+      index = self._indexes.get(column)
+      if index is None:
+        continue
+      if isinstance(expected, (str, int, float, bool)) or expected is None:
+        return list(index.get(expected, {}).values())
+    return list(self._rows.values())
+
+  # writes ------------------------------------------------------------------
+
+  def _insert(self, row):
+    with self._guard:
+      row._deleted = False
+      self._rows[row._id] = row
+      for column, index in self._indexes.items():
+        index.setdefault(row._data.get(column), {})[row._id] = row
+
+  def _remove(self, row):
+    with self._guard:
+      self._rows.pop(row._id, None)
+      for column, index in self._indexes.items():
+        index.get(row._data.get(column), {}).pop(row._id, None)
+      row._deleted = True
+
+  def add_row(self, **values):
+    self._tick()
+    with self._guard:
+      row = Row(self, next(self._next_id), values)
+      self.columns.update(values)
+    self._insert(row)
+    tx = _current_tx()
+    if tx is not None:
+      tx.undo.append(lambda: self._remove(row))
+    contention.write((self.name, row._id), 0.0)
+    return row
+
+  def add_rows(self, rows):
+    return [self.add_row(**values) for values in rows]
+
+  def delete_all_rows(self):
+    with self._guard:
+      for row in list(self._rows.values()):
+        self._remove(row)
+
+  # reads -------------------------------------------------------------------
+
+  def search(self, *args, **criteria):
+    self._tick()
+    ordering = [a for a in args if isinstance(a, _OrderBy)]
+    with self._guard:
+      candidates = self._candidates(criteria)
+    found = []
+    for row in candidates:
+      if all(_matches(_decode(row._data.get(c)), e) for c, e in criteria.items()):
+        found.append(row)
+    for order in reversed(ordering):
+      found.sort(key=lambda r, c=order.column: (r._data.get(c) is not None,
+                                                r._data.get(c) if r._data.get(c) is not None else ""),
+                 reverse=not order.ascending)
+    if not ordering:
+      found.sort(key=lambda r: r._id)
+    return found
+
+  def get(self, *args, **criteria):
+    rows = self.search(*args, **criteria)
+    if len(rows) > 1:
+      raise TableError(f"More than one row matched this query in '{self.name}'")
+    return rows[0] if rows else None
+
+  def get_by_id(self, row_id):
+    self._tick()
+    for row in self._rows.values():
+      if row.get_id() == row_id:
+        return row
+    return None
+
+  def row(self, row_id):
+    """Row by its numeric id (as in contention keys), or None."""
+    return self._rows.get(row_id)
+
+  def list_columns(self):
+    return [{"name": c} for c in sorted(self.columns)]
+
+  def __len__(self):
+    return len(self._rows)
+
+
+class AppTables:
+  """`app_tables`: any attribute is a (lazily created) table."""
+
+  def __init__(self):
+    self._tables = {}
+    self._latency_ms = 0.0
+
+  def __getattr__(self, name):
+    if name.startswith("_"):
+      raise AttributeError(name)
+    tables = self.__dict__["_tables"]
+    if name not in tables:
+      table = tables[name] = Table(name)
+      table.latency_ms = self._latency_ms
+    return tables[name]
+
+  def reset(self):
+    """Forget every table (and its rows)."""
+    self._tables.clear()
+
+  def set_latency(self, ms):
+    """Simulated round-trip time of every table call, for all tables."""
+    self._latency_ms = ms
+    for table in self._tables.values():
+      table.latency_ms = ms
+
+  def define(self, name, columns):
+    """Declare a table's columns: unset ones read as None, unknown ones raise."""
+    table = getattr(self, name)
+    table.columns.update(columns)
+    table.strict = True
+    return table
+
+
+app_tables = AppTables()
+query = _QueryModule
@@ -4,10 +4,23 @@ import anvil.server
 import anvil.js                     # NEW – lets us run JS from Python
 from ..MainReviewForm import json_renderer   # NEW – for the helper JS
 
+# Source of the per-panel root element ids ("json-table-1", "json-table-2", …)
+_panel_count = 0
+
+
+def _next_root_id():
+  global _panel_count
+  _panel_count += 1
+  return f"json-table-{_panel_count}"
+
+
 class HtmlTablePanel(HtmlTablePanelTemplate):
   def __init__(self, **properties):
     self.init_components(**properties)
     self._html = ""
+    self.root_id    = _next_root_id()   # id of this panel's root element
+    self.table_path = None              # JSON path of the table shown
+    self.columns    = []                # flattened column keys (data-col order)
 
   @property
   def html(self):
@@ -28,18 +41,41 @@ class HtmlTablePanel(HtmlTablePanelTemplate):
     if not hasattr(anvil.js.window, "openTablePopout"):
       anvil.js.window.eval(json_renderer.get_table_data_js())
 
+  def show_table(self, path, fragment):
+    """Show a table_html.TableFragment and register it with the JS side.
+
+      The markup is wrapped in this panel's own root element so extraction
+      and dirty tracking only ever look inside it.
+      """
+    self.table_path = path
+    self.columns = fragment.columns
+    self.html = f'<div id="{self.root_id}" data-json-table>{fragment.html}</div>'
+    root = anvil.js.get_dom_node(self).querySelector(f"#{self.root_id}")
+    anvil.js.call_js("registerJsonTable", root, path, self.columns)
+
+  def mount_virtual_table(self, rows, row_height):
+    """Hand the table's cell values to the browser-side virtual renderer.
+
+      rows: list of rows, each a list of cell strings in `columns` order.
+      The <tbody> of our HTML is then painted on scroll from that array.
+      """
+    anvil.js.call_js("mountVirtualTable", self.root_id, rows, row_height)
+
   def get_table_data(self):
-    # Ensure JS is loaded
-    self._ensure_popout_js_loaded()
+    """Return {table_path: [{column: value, …}, …]} for every row."""
+    rows = anvil.js.call_js("extractTable", self.root_id) or []
+    cols = self.columns
+    return {
+      self.table_path: [{c: v for c, v in zip(cols, row or [])} for row in rows]
+    }
+
+  def get_dirty_cells(self):
+    """[(row_idx, column, old, new)] for cells edited since the last commit."""
+    return [
+      (int(r), self.columns[int(c)], old, new)
+      for r, c, old, new in anvil.js.call_js("getDirtyCells", self.root_id) or []
+    ]
 
-    nested = anvil.js.call_js("getTableData")  # {"tracts":[…], "parties":[…]}
-    flat = {}
-
-    # turn it into  {"table_tracts_0_description": "...", ...}
-    for tbl, rows in (nested or {}).items():
-      if rows:
-        for idx, row in enumerate(rows):
-          if row:
-            for col, val in row.items():
-              flat[f"table_{tbl}_{idx}_{col}"] = val
-    return flat
\ No newline at end of file
+  def commit_edits(self):
+    """Make the current cell values the baseline (after a successful save)."""
+    anvil.js.call_js("commitTableEdits", self.root_id)
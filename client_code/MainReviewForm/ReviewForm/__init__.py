@@ -4,6 +4,22 @@ from ._anvil_designer import ReviewFormTemplate
 from anvil import *
 import anvil.server
 from .. import json_renderer
+from .. import doc_cache
+from .. import schema_store
+from .. import perf
+
+
+DOC_PAGE_SIZE      = 50     # doc_ids per picker page
+SEARCH_DEBOUNCE_S  = 0.3    # typeahead pause before querying the server
+DOC_CACHE_SIZE     = 20     # documents kept in the client-side LRU
+PREFETCH_COUNT     = 3      # docs after the open one to load in the background
+PREFETCH_DELAY_S   = 0.5    # let the current render settle before prefetching
+LAZY_SECTIONS      = True   # build section widgets only when first expanded
+HTML_SCALARS       = False  # one HTML template per section instead of widgets
+PROJECT_PAYLOAD    = True   # server sends only the schema's part of result_json
+PRUNE_UNUSED       = True   # …and leaves out subtrees the renderer never shows
+REVIEW_VIEWS       = True   # …or sends the server-built view (values + tables)
+SERVER_TABLE_HTML  = True   # …with each table's HTML rendered (and cached) server-side
 
 
 class ReviewForm(ReviewFormTemplate):
@@ -26,49 +42,124 @@ class ReviewForm(ReviewFormTemplate):
     self.json_container.width   = "1400px"
     self.json_container.wrap_on = "never"
 
-    # ── build the dropdown ────────────────────────────────────────────────
-    try:
-      items = anvil.server.call('get_document_dropdown_items')  # [(label, value), …]
-      # prepend a blank choice so nothing is selected by default
-      items_with_blank = [("-- Select a document --", None)] + items
-      self.doc_dropdown.items = items_with_blank
-
-      # pre-select if __init__ was given a doc_id
-      if doc_id:
-        self.doc_dropdown.selected_value = doc_id
-      else:
-        self.doc_dropdown.selected_value = None
+    # ── client-side caches ────────────────────────────────────────────────
+    self._doc_cache     = doc_cache.DocumentCache(DOC_CACHE_SIZE)
+    self._schema_bundle = None
+    self._doc_version   = 0       # `version` of the open doc (optimistic lock)
+    self._tracker       = None    # json_renderer.EditTracker of the open doc
 
+    # ── document picker state (paginated) ─────────────────────────────────
+    self._doc_ids     = []      # doc_ids loaded so far, in server order
+    self._doc_cursor  = None    # next_cursor for "Load more" (None = done)
+    self._doc_prefix  = ""      # current typeahead prefix
+
+    # ── one round-trip: first picker page + document + schema bundle ──────
+    #    a bundle kept in localStorage from an earlier session only needs
+    #    its etag checked – the server answers "not modified" if unchanged
+    stored = schema_store.load(self.schema_name)
+    try:
+      boot = anvil.server.call('bootstrap_review', self.doc_id, self.schema_name,
+                               page_size=DOC_PAGE_SIZE,
+                               project=PROJECT_PAYLOAD, prune=PRUNE_UNUSED,
+                               view=REVIEW_VIEWS, fragments=SERVER_TABLE_HTML,
+                               schema_etag=stored["etag"] if stored else None)
     except Exception as e:
-      alert(f"Error loading document list: {e}")
+      alert(f"Error loading review data: {e}")
+      return
 
-    # load the initial document (if any)
-    if self.doc_dropdown.selected_value:
-      self.load_document(self.doc_dropdown.selected_value)
+    self._schema_bundle = schema_store.resolve(boot["schema_bundle"], stored)
+    self._apply_doc_page(boot["documents"])
 
-    self.doc_dropdown.set_event_handler("change", self.doc_dropdown_change)
-    if self.doc_id:
-      self.load_document(self.doc_id)
+    # render the initial document (if any) – exactly once
+    doc = boot["document"]
+    if doc:
+      self._doc_cache.put(doc["doc_id"], doc)
+      self.render_document(doc)
+      self.prefetch_timer.interval = PREFETCH_DELAY_S
+    elif self.doc_id:
+      alert(f"Document with id '{self.doc_id}' not found.")
 
   # ──────────────────────────────────────────────────────────────────────
   #  Document loader
   # ──────────────────────────────────────────────────────────────────────
   def load_document(self, doc_id):
-    """Fetch the doc, pick the (hard-coded) schema, render the UI."""
-    try:
-      pdf_url, result_json, flags = anvil.server.call('get_document', doc_id)
-    except Exception as e:
-      alert(f"Error loading document: {e}")
-      return
+    """Fetch the doc (cache first), pick the (hard-coded) schema, render the UI.
 
+    `doc_id` only becomes the open document once it has rendered; if loading
+    fails the picker goes back to the document still open.
+    """
+    doc = self._doc_cache.get(doc_id)
+    if doc is None:
+      try:
+        doc = self._fetch_document(doc_id)
+      except Exception as e:
+        alert(f"Error loading document: {e}")
+        doc = None
+      else:
+        if doc is None:
+          alert(f"Document with id '{doc_id}' not found.")
+
+    if doc is None or not self.render_document(doc):
+      self.doc_dropdown.selected_value = self.doc_id
+      return False
+    self.doc_id = doc_id
+    self.doc_dropdown.selected_value = doc_id
+
+    # warm the cache for the documents the reviewer is likely to open next
+    self.prefetch_timer.interval = PREFETCH_DELAY_S
+    return True
+
+  def reload_document(self):
+    """Drop the cached copy of the open doc and render its current version."""
+    self._doc_cache.invalidate(self.doc_id)
+    self.load_document(self.doc_id)
+
+  def _fetch_document(self, doc_id):
+    """Fetch one doc, revalidating a stale cached copy by etag if we have one."""
+    known = self._doc_cache.known_etags([doc_id])
+    resp = anvil.server.call('get_documents', [doc_id], known_etags=known,
+                             **self._projection()).get(doc_id)
+    if resp is None:
+      return None
+    doc = self._doc_cache.merge(doc_id, resp)
+    if doc is None:
+      # not-modified for an entry evicted meanwhile – ask for the full payload
+      resp = anvil.server.call('get_documents', [doc_id],
+                               **self._projection()).get(doc_id)
+      doc = self._doc_cache.merge(doc_id, resp) if resp else None
+    return doc
+
+  def _projection(self):
+    """get_documents kwargs selecting the projected payload (if enabled)."""
+    if not PROJECT_PAYLOAD:
+      return {}
+    return {"project": self.schema_name, "prune": PRUNE_UNUSED,
+            "view": REVIEW_VIEWS, "fragments": SERVER_TABLE_HTML}
+
+  def render_document(self, doc):
+    """Render a payload dict from ReviewService.get_documents.
+
+    Returns True once the document is on screen (and editable).
+    """
     # 1️⃣  show PDF
-    self.pdf_frame.url = pdf_url or "about:blank"
+    self.pdf_frame.url = doc["pdf_url"] or "about:blank"
 
     # 2️⃣  clear any previous components
     self.json_container.clear()
 
-    # 3️⃣  extract the payload JSON we care about
-    if (
+    # 3️⃣  extract the payload JSON we care about – the reviewer's working
+    #     copy if the doc was saved before, else the raw extraction output
+    self._doc_version = doc.get("version") or 0
+    self._tracker = None
+    result_json = doc["result_json"]
+    view = doc.get("view")                    # server-built review view
+    if view:
+      payload = None                          # not needed – see render_json
+    elif isinstance(doc.get("payload"), dict):
+      payload = doc["payload"]                # already projected server-side
+    elif isinstance(doc.get("corrected_json"), dict) and doc["corrected_json"]:
+      payload = doc["corrected_json"]
+    elif (
       isinstance(result_json, dict)
       and isinstance(result_json.get("output"), list)
       and result_json["output"]
@@ -76,41 +167,183 @@ class ReviewForm(ReviewFormTemplate):
       payload = result_json["output"][0]
     else:
       alert("No data found in JSON output.")
-      return
+      return False
 
-    #    fetch structure + field configs in one call
-    try:
-      schema_bundle = anvil.server.call('get_full_schema_bundle', self.schema_name)
-    except Exception as e:
-      alert(f"Could not load schema bundle '{self.schema_name}': {e}")
-      return
+    # 4️⃣  structure + field configs (fetched once per form, in one call)
+    schema_bundle = self._get_schema_bundle()
+    if schema_bundle is None:
+      return False
 
     # 5️⃣  render JSON using the layout-aware renderer
-    #
-    #    NOTE: render_json() now expects the extra kw-arg `schema_bundle`;
-    #    that function must be updated in json_renderer.py accordingly.
-    #
-    json_renderer.render_json(
+    #    the returned tracker records edits – saves send only those
+    self._tracker = json_renderer.render_json(
       payload,
       self.json_container,
-      schema_bundle=schema_bundle      # ← new
+      schema_bundle=schema_bundle,
+      lazy=LAZY_SECTIONS,
+      html_scalars=HTML_SCALARS,
+      view=view
     )
+    return True
+
+  def _get_schema_bundle(self):
+    """Return the schema bundle, fetching it on first use only."""
+    if self._schema_bundle is None:
+      stored = schema_store.load(self.schema_name)
+      try:
+        resp = anvil.server.call('get_full_schema_bundle', self.schema_name,
+                                 if_none_match=stored["etag"] if stored else None)
+        self._schema_bundle = schema_store.resolve(resp, stored)
+        if self._schema_bundle is None:
+          resp = anvil.server.call('get_full_schema_bundle', self.schema_name)
+          self._schema_bundle = schema_store.resolve(resp, None)
+      except Exception as e:
+        alert(f"Could not load schema bundle '{self.schema_name}': {e}")
+    return self._schema_bundle
+
+  # ──────────────────────────────────────────────────────────────────────
+  #  Prefetch + next / previous navigation
+  # ──────────────────────────────────────────────────────────────────────
+  def prefetch_timer_tick(self, **event_args):
+    """Background-load the next PREFETCH_COUNT docs into the cache."""
+    self.prefetch_timer.interval = 0
+    perf.flush()          # idle moment – report client timings in batches
+    if self.doc_id not in self._doc_ids:
+      return
+    start = self._doc_ids.index(self.doc_id) + 1
+    wanted = [d for d in self._doc_ids[start:start + PREFETCH_COUNT]
+              if d not in self._doc_cache]
+    if not wanted:
+      return
+    try:
+      # call_s: no spinner – the reviewer should not notice this happening
+      docs = anvil.server.call_s('get_documents', wanted,
+                                 known_etags=self._doc_cache.known_etags(wanted),
+                                 **self._projection())
+    except Exception:
+      return        # prefetch is best-effort; load_document will retry
+    for d in wanted:
+      if d in docs:
+        self._doc_cache.merge(d, docs[d])
+
+  def _neighbour_id(self, step):
+    """doc_id *step* places away from the open doc in the picker order."""
+    if self.doc_id not in self._doc_ids:
+      return self._doc_ids[0] if step > 0 and self._doc_ids else None
+    idx = self._doc_ids.index(self.doc_id) + step
+    if idx >= len(self._doc_ids) and self._doc_cursor is not None:
+      self._load_doc_page(append=True)
+    if 0 <= idx < len(self._doc_ids):
+      return self._doc_ids[idx]
+    return None
+
+  def _open_neighbour(self, step):
+    new_id = self._neighbour_id(step)
+    if new_id:
+      self.load_document(new_id)
+
+  def prev_btn_click(self, **event_args):
+    """Open the previous document in the picker order."""
+    self._open_neighbour(-1)
+
+  def next_btn_click(self, **event_args):
+    """Open the next document in the picker order."""
+    self._open_neighbour(1)
 
   # ──────────────────────────────────────────────────────────────────────
   #  Save button
   # ──────────────────────────────────────────────────────────────────────
   def save_btn_click(self, **event_args):
-    """Collect edited fields and save back to the DB."""
+    """Send only the edited fields (a patch against the loaded version)."""
+    if self._tracker is None:
+      return
     try:
-      edited_json = json_renderer.get_final_json(self.json_container)
-      anvil.server.call('save_document_update', self.doc_id, edited_json)
+      ops = self._tracker.build_patch()
+      if not ops:
+        alert("No changes to save.", title="Nothing to Save")
+        return
+
+      result = anvil.server.call('save_document_patch', self.doc_id, ops,
+                                 self._doc_version)
+      if result["status"] == "conflict":
+        fields = ", ".join(".".join(str(p) for p in path) for path in result["conflicts"])
+        if confirm(f"Another reviewer changed these fields since you opened the "
+                   f"document: {fields}. Reload it to see their edits? Your "
+                   f"unsaved changes will be lost.", title="Save Conflict"):
+          self.reload_document()
+        else:
+          # a later save must not be checked against the cached old version
+          self._doc_cache.invalidate(self.doc_id)
+        return
+
+      self._doc_version = result["version"]
+      self._tracker.commit()
+      self._doc_cache.invalidate(self.doc_id)
       alert("Changes saved successfully.", title="Success")
     except Exception as e:
       alert(f"Error saving changes: {e}", title="Save Failed")
 
+  # ──────────────────────────────────────────────────────────────────────
+  #  Document picker (typeahead + "Load more")
+  # ──────────────────────────────────────────────────────────────────────
+  def _load_doc_page(self, append=False):
+    """Fetch one page of doc_ids for the current prefix into the dropdown."""
+    try:
+      page = anvil.server.call(
+        'list_documents',
+        prefix=self._doc_prefix,
+        cursor=self._doc_cursor if append else None,
+        page_size=DOC_PAGE_SIZE
+      )
+    except Exception as e:
+      alert(f"Error loading document list: {e}")
+      return
+    self._apply_doc_page(page, append)
+
+  def _apply_doc_page(self, page, append=False):
+    """Merge a `list_documents` page into the picker."""
+    self._doc_ids = (self._doc_ids if append else []) + page["items"]
+    self._doc_cursor = page["next_cursor"]
+    self._refresh_doc_dropdown()
+
+  def _refresh_doc_dropdown(self):
+    """Rebuild dropdown items, keeping the open document selectable."""
+    ids = list(self._doc_ids)
+    # the current doc may not be on the loaded page(s) – keep it visible
+    if self.doc_id and self.doc_id not in ids:
+      ids.insert(0, self.doc_id)
+
+    # prepend a blank choice so nothing is selected by default
+    self.doc_dropdown.items = [("-- Select a document --", None)] + [(d, d) for d in ids]
+    self.doc_dropdown.selected_value = self.doc_id
+    self.load_more_btn.visible = self._doc_cursor is not None
+
+  def doc_search_change(self, **event_args):
+    """Debounce typeahead: (re)start the timer on every keystroke."""
+    self.search_timer.interval = 0
+    self.search_timer.interval = SEARCH_DEBOUNCE_S
+
+  def doc_search_pressed_enter(self, **event_args):
+    """Search immediately when the reviewer presses Enter."""
+    self.search_timer.interval = 0
+    self.search_timer_tick()
+
+  def search_timer_tick(self, **event_args):
+    """Run the prefix search once typing has paused."""
+    self.search_timer.interval = 0
+    prefix = (self.doc_search.text or "").strip()
+    if prefix == self._doc_prefix and self._doc_ids:
+      return
+    self._doc_prefix = prefix
+    self._load_doc_page()
+
+  def load_more_btn_click(self, **event_args):
+    """Append the next page of doc_ids to the dropdown."""
+    if self._doc_cursor is not None:
+      self._load_doc_page(append=True)
+
   def doc_dropdown_change(self, **event_args):
     """Reload the viewer when the user picks a different document."""
     new_id = self.doc_dropdown.selected_value
     if new_id and new_id != getattr(self, "doc_id", None):
-      self.doc_id = new_id
       self.load_document(new_id)
@@ -0,0 +1,74 @@
+# doc_cache.py – bounded client-side LRU cache for document payloads
+
+"""Keeps the most recently used document payloads (as returned by
+ReviewService.get_documents) in browser memory so next/previous navigation can
+render without a server round-trip.
+
+Invalidated entries are kept (marked stale) so their `etag` can be sent back
+to the server, which answers "not modified" if nothing changed.
+"""
+
+
+class DocumentCache:
+  """Tiny LRU keyed by doc_id.
+
+    Relies on dict insertion order: the first key is the least recently used.
+    """
+
+  def __init__(self, max_entries=20):
+    self.max_entries = max_entries
+    self._entries = {}
+    self._stale = set()
+
+  def __contains__(self, doc_id):
+    """True only for fresh (usable without revalidation) entries."""
+    return doc_id in self._entries and doc_id not in self._stale
+
+  def __len__(self):
+    return len(self._entries)
+
+  def get(self, doc_id):
+    """Return the fresh payload (marking it most recently used) or None."""
+    if doc_id not in self:
+      return None
+    doc = self._entries.pop(doc_id)
+    self._entries[doc_id] = doc
+    return doc
+
+  def put(self, doc_id, doc):
+    """Store *doc*, evicting the least recently used entries if full."""
+    self._entries.pop(doc_id, None)
+    self._stale.discard(doc_id)
+    self._entries[doc_id] = doc
+    while len(self._entries) > self.max_entries:
+      evicted = next(iter(self._entries))
+      del self._entries[evicted]
+      self._stale.discard(evicted)
+
+  def invalidate(self, doc_id):
+    """Require revalidation with the server before *doc_id* is reused."""
+    if doc_id in self._entries:
+      self._stale.add(doc_id)
+
+  def known_etags(self, doc_ids):
+    """{doc_id: etag} for the given ids we hold (fresh or stale)."""
+    return {d: self._entries[d].get("etag") for d in doc_ids
+            if d in self._entries and self._entries[d].get("etag")}
+
+  def merge(self, doc_id, doc):
+    """Store a server response, resolving a not-modified marker.
+
+      Returns the usable payload, or None if the marker refers to an entry
+      we no longer hold.
+      """
+    if doc.get("not_modified"):
+      cached = self._entries.get(doc_id)
+      if cached is None or cached.get("etag") != doc.get("etag"):
+        return None
+      doc = cached
+    self.put(doc_id, doc)
+    return doc
+
+  def clear(self):
+    self._entries = {}
+    self._stale = set()
@@ -7,7 +7,12 @@ supplied so old documents still display.
 """
 
 from anvil import *
+import anvil.js
+import anvil.server
 from ..HtmlTablePanel import HtmlTablePanel
+from .. import table_html
+from . import perf
+from ..table_html import flatten_dict
 from collections import defaultdict
 
 # ──────────────────────────────────────────────────────────────────────────────
@@ -17,33 +22,43 @@ from collections import defaultdict
 # ─────────────────────────────────────────────────────────────────────────────
 # Smart pop-up editor for long text fields
 # ─────────────────────────────────────────────────────────────────────────────
-def _install_popout_editor(widget):
-  """When *widget* (TextArea/TextBox) gains focus, open a big
-    floating editor IF the content is long enough to warrant it.
-    Only shows popout for content > 100 chars OR content with line breaks."""
+# One editor serves every field: the browser keeps a single overlay (see
+# openPopout in get_table_data_js) and all widgets share the same focus
+# handler, so nothing is allocated per widget or per focus.
+_popout_target = None     # widget whose text the open editor will replace
 
-  def _open_editor(**evt):
-    current_text = widget.text or ""
 
-    # Only show popout if content is long or has line breaks
-    if len(current_text) <= 100 and '\n' not in current_text:
-      return  # Let the field behave normally for short content
+def _open_popout(sender, **event_args):
+  """Shared `focus` handler: pop the editor out for long/multi-line text."""
+  global _popout_target
+  current_text = sender.text or ""
 
-    # build a large TextArea pre-filled with the current text
-    big = TextArea(text=current_text, width="100%", height="400px")
+  # Only show popout if content is long or has line breaks
+  if len(current_text) <= 100 and '\n' not in current_text:
+    return  # Let the field behave normally for short content
 
-    # show it in an Anvil alert dialog
-    ok = alert(big,
-               large=True,
-               title="Edit Long Text",
-               buttons=[("Save", True), ("Cancel", False)])
+  _ensure_js_loaded()
+  _popout_target = sender
+  anvil.js.call_js("openPopout", current_text, _popout_commit)
 
-    # if user clicked Save, commit changes
-    if ok:
-      widget.text = big.text
 
-  # bind to focus event
-  widget.set_event_handler("focus", _open_editor)
+def _popout_commit(text):
+  """Save callback of the browser-side editor."""
+  global _popout_target
+  widget, _popout_target = _popout_target, None
+  if widget is None:
+    return
+  # programmatic edits raise no `change` event, so raise it ourselves for
+  # the EditTracker
+  widget.text = text
+  widget.raise_event("change")
+
+
+def _install_popout_editor(widget):
+  """When *widget* (TextArea/TextBox) gains focus, open the shared
+    floating editor IF the content is long enough to warrant it.
+    Only shows popout for content > 100 chars OR content with line breaks."""
+  widget.set_event_handler("focus", _open_popout)
 
 
 def dig(data, path_parts):
@@ -64,130 +79,384 @@ def prettify(path):
   """Human-friendly label from a JSON path (use last segment)."""
   return path.split(".")[-1].replace("_", " ").title()
 
+# ──────────────────────────────────────────────────────────────────────────────
+#  Dirty tracking
+# ──────────────────────────────────────────────────────────────────────────────
+
+class EditTracker:
+  """Changed-set registry for one rendered document.
+
+    Scalar widgets report `change` events here; table inputs are tracked in
+    the browser per table panel (see getDirtyCells).  Saving then reads only what was
+    touched instead of walking every component and scanning every table.
+    """
+
+  def __init__(self):
+    self._widgets  = {}       # path -> TextBox/TextArea
+    self._original = {}       # path -> text as rendered
+    self._dirty    = set()    # paths whose widget fired `change`
+    self._tables   = []       # HtmlTablePanels of this document
+    self._sections = []       # HtmlFieldsPanels (html_scalars mode)
+    if hasattr(anvil.js.window, "pruneJsonTables"):
+      anvil.js.call_js("pruneJsonTables")
+
+  def register_field(self, path, widget):
+    self._widgets[path] = widget
+    self._original[path] = widget.text
+    # one bound method for every widget – no per-widget closure
+    widget.set_event_handler("change", self._on_change)
+
+  def register_table(self, panel):
+    self._tables.append(panel)
+
+  def register_field_section(self, panel):
+    self._sections.append(panel)
+
+  def _on_change(self, sender, **event_args):
+    self._dirty.add(str(sender.tag)[6:])
+
+  def changed_scalars(self):
+    """{path: (old_text, new_text)} for edited scalar fields only."""
+    out = {}
+    for path in self._dirty:
+      new = self._widgets[path].text
+      if new != self._original[path]:
+        out[path] = (self._original[path], new)
+    for panel in self._sections:
+      for path, old, new in panel.get_dirty_fields():
+        out[path] = (old, new)
+    return out
+
+  def changed_table_cells(self):
+    """[(table_path, row_idx, col, old, new)] for edited table cells only."""
+    cells = []
+    for panel in self._tables:
+      cells.extend((panel.table_path,) + cell for cell in panel.get_dirty_cells())
+    return cells
+
+  @perf.timed("build_patch")
+  def build_patch(self):
+    """Ops for ReviewService.save_document_patch:
+
+      [{"path": ["document_details", "royalty"], "old": "1/8", "value": "3/16"},
+       {"path": ["tracts", 3, "description"], "old": "...", "value": "..."}]
+      """
+    ops = [{"path": path.split('.'), "old": old, "value": new}
+           for path, (old, new) in sorted(self.changed_scalars().items())]
+    ops += [{"path": tbl.split('.') + [idx, col], "old": old, "value": new}
+            for tbl, idx, col, old, new in self.changed_table_cells()]
+    return ops
+
+  def commit(self):
+    """Call after a successful save: current values become the baseline."""
+    for path in self._dirty:
+      self._original[path] = self._widgets[path].text
+    self._dirty = set()
+    for panel in self._tables + self._sections:
+      panel.commit_edits()
+
 # ──────────────────────────────────────────────────────────────────────────────
 #  Public entry
 # ──────────────────────────────────────────────────────────────────────────────
 
-def render_json(payload, container, *, schema_bundle=None):
+@perf.timed("render_json")
+def render_json(payload, container, *, schema_bundle=None, lazy=False,
+                html_scalars=False, view=None):
   """Render *payload* into *container*.
 
     If *schema_bundle* (from ConfigService.get_full_schema_bundle) is provided
     scalars are grouped and laid out per schema; otherwise we dump everything.
+
+    lazy=True starts every layout section and table collapsed (header only)
+    and builds its widgets the first time the reviewer expands it.
+
+    html_scalars=True renders each section's scalars as ONE HtmlFieldsPanel
+    of plain inputs instead of Label/TextBox/Spacer components per field.
+
+    view: a server-built review view (ReviewViews.build_review_view) – with a
+    schema bundle, field values and tables are taken from it as resolved /
+    measured, so *payload* is not traversed at all (it may be None).
+
+    Returns the EditTracker recording which fields the reviewer changes.
     """
+  tracker = EditTracker()
   if schema_bundle:
-    _render_with_schema(payload, container, schema_bundle)
+    _render_with_schema(payload, container, schema_bundle, tracker, lazy,
+                        html_scalars, view)
   else:
-    _legacy_render(payload, container)
+    _legacy_render(payload, container, tracker=tracker)
+  return tracker
 
 # ──────────────────────────────────────────────────────────────────────────────
-#  Schema-aware renderer
+#  Render plans – everything that depends only on the schema bundle
 # ──────────────────────────────────────────────────────────────────────────────
 
-def _render_with_schema(payload, container, bundle):
-  layout_spec = bundle.get("structure", {}).get("layout", [])
-  field_cfgs  = bundle.get("fields", [])
+class FieldSpec:
+  """One configured scalar field, resolved ahead of rendering."""
 
-  # 1️⃣ Index configs & gather scalar values
-  cfg_by_path = {c["path"]: c for c in field_cfgs if not c.get("excluded")}
-  scalar_values = {p: dig(payload, p.split(".")) for p in cfg_by_path}
+  def __init__(self, cfg):
+    self.path       = cfg["path"]
+    self.parts      = tuple(self.path.split("."))
+    self.multiline  = cfg["widget_type"] == "TextArea"
+    self.widget_cls = TextArea if self.multiline else TextBox
+    self.label      = f"{cfg.get('label_override') or prettify(self.path)}:"
+    self.tag        = f"field_{self.path}"
+    self.group      = cfg.get("layout_group") or "_misc"
 
-  # 2️⃣ Group fields by layout_group
-  grouped = defaultdict(list)
-  for path, val in scalar_values.items():
-    grouped[cfg_by_path[path].get("layout_group") or "_misc"].append(
-      (path, val, cfg_by_path[path])
-    )
-  for g in grouped:
-    grouped[g].sort(key=lambda t: t[0])
-
-    # 3️⃣ Render sections top-to-bottom
-  rendered = set()
-  for section in layout_spec:
-    title = section["title"]
-    style = section.get("style", "two-column")
-    fields = grouped.get(title, [])
-    if not fields:
-      continue
-
-      # Section header
-    container.add_component(Label(text=title, bold=True, font_size=18))
-    container.add_component(Spacer(height=4))
-
-    # Layout container
-    panel = ColumnPanel() if style == "full-width" else FlowPanel()
-    # Layout container
-    if style == "two-column":
-      panel = FlowPanel()
-      panel.role = "json-two-col"
-
-      # build bricks once
-      for path, val, cfg in fields:
-        rendered.add(path)
-
-        brick = ColumnPanel(width="260px")
-        brick.role = "json-two-col-brick"
-        panel.add_component(brick)
-
-        label_txt = cfg.get("label_override") or prettify(path)
-        brick.add_component(Label(text=f"{label_txt}:", bold=True))
-
-        widget_cls = TextArea if cfg["widget_type"] == "TextArea" else TextBox
-        w = widget_cls(text="" if val is None else str(val), width="100%")
-        w.tag = f"field_{path}"
-        w.role = "expand-on-focus"
-        _install_popout_editor(w)             # ← add this
-        brick.add_component(w)
-
-      container.add_component(panel)      # ← add the panel once
-      container.add_component(Spacer(height=12))
-      continue     # 🚀 skip the generic loop below for this section
-    else:
-      panel = ColumnPanel()
-      container.add_component(panel)      # ← add the panel!
-    # Fields
-    for path, val, cfg in fields:
-      rendered.add(path)
-      label_txt = cfg.get("label_override") or prettify(path)
-      panel.add_component(Label(text=f"{label_txt}:", bold=True))
-
-      widget_cls = TextArea if cfg["widget_type"] == "TextArea" else TextBox
-      w = widget_cls(text="" if val is None else str(val), width="100%")
-      w.tag = f"field_{path}"
-      w.role = "expand-on-focus"
-      _install_popout_editor(w)             # ← add this
-      panel.add_component(w)
+
+class SectionPlan:
+  """A `layout` section with its (path-ordered) fields."""
+
+  def __init__(self, title, style, fields):
+    self.title  = title
+    self.style  = style
+    self.fields = fields
+
+
+class RenderPlan:
+  """Compiled form of a schema bundle: ordered sections + the misc bucket.
+
+    Built once per schema version (see get_render_plan); rendering a document
+    then only walks the plan and digs values out of the payload.
+    """
+
+  def __init__(self, bundle):
+    layout_spec = bundle.get("structure", {}).get("layout", [])
+    field_cfgs  = bundle.get("fields", [])
+
+    # 1️⃣ Index configs (one spec per path)
+    cfg_by_path = {c["path"]: c for c in field_cfgs if not c.get("excluded")}
+    self.fields = [FieldSpec(c) for c in cfg_by_path.values()]
+
+    # 2️⃣ Group fields by layout_group
+    grouped = defaultdict(list)
+    for spec in self.fields:
+      grouped[spec.group].append(spec)
+    for g in grouped:
+      grouped[g].sort(key=lambda f: f.path)
+
+    # 3️⃣ Sections top-to-bottom (empty ones are skipped)
+    self.sections = []
+    placed = set()
+    for section in layout_spec:
+      fields = grouped.get(section["title"], [])
+      if not fields:
+        continue
+      self.sections.append(
+        SectionPlan(section["title"], section.get("style", "two-column"), fields)
+      )
+      placed.update(f.path for f in fields)
+
+    # 4️⃣ Misc bucket for fields whose group has no layout section
+    self.misc = [f for f in self.fields if f.path not in placed]
+
+
+_PLAN_CACHE_SIZE = 8
+_plan_cache = {}          # bundle etag -> RenderPlan (insertion-ordered LRU)
+
+
+def get_render_plan(bundle):
+  """Return the cached RenderPlan for *bundle*, compiling it on first use."""
+  key = bundle.get("etag")
+  if key is None:
+    return RenderPlan(bundle)      # unversioned bundle – nothing to key on
+  plan = _plan_cache.pop(key, None) or RenderPlan(bundle)
+  _plan_cache[key] = plan
+  while len(_plan_cache) > _PLAN_CACHE_SIZE:
+    del _plan_cache[next(iter(_plan_cache))]
+  return plan
+
+# ──────────────────────────────────────────────────────────────────────────────
+#  Schema-aware renderer
+# ──────────────────────────────────────────────────────────────────────────────
+
+class FieldValues:
+  """Where configured field values come from: dug out of the payload, or
+    read from a review view's pre-resolved `scalars` ({path: text})."""
+
+  def __init__(self, payload=None, scalars=None):
+    self._payload = payload
+    self._scalars = scalars
+
+  def text(self, spec):
+    if self._scalars is not None:
+      return self._scalars.get(spec.path, "")
+    val = dig(self._payload, spec.parts)
+    return "" if val is None else str(val)
+
+
+def _field_widget(spec, values, tracker):
+  """TextBox/TextArea for *spec*, filled from *values* and tracked."""
+  w = spec.widget_cls(text=values.text(spec), width="100%")
+  w.tag = spec.tag
+  w.role = "expand-on-focus"
+  _install_popout_editor(w)
+  tracker.register_field(spec.path, w)
+  return w
+
+
+def _fill_section(section, parent, values, tracker, html_scalars=False):
+  """Build the label/widget pairs of one plan section into *parent*."""
+  if html_scalars:
+    panel = HtmlFieldsPanel(section, values)
+    tracker.register_field_section(panel)
+    parent.add_component(panel)
+  elif section.style == "two-column":
+    panel = FlowPanel()
+    panel.role = "json-two-col"
+    parent.add_component(panel)
+
+    for spec in section.fields:
+      brick = ColumnPanel(width="260px")
+      brick.role = "json-two-col-brick"
+      panel.add_component(brick)
+      brick.add_component(Label(text=spec.label, bold=True))
+      brick.add_component(_field_widget(spec, values, tracker))
+  else:
+    panel = ColumnPanel()
+    parent.add_component(panel)
+
+    for spec in section.fields:
+      panel.add_component(Label(text=spec.label, bold=True))
+      panel.add_component(_field_widget(spec, values, tracker))
       panel.add_component(Spacer(height=4, width=12))
 
-    container.add_component(Spacer(height=12))
 
-    # 4️⃣ Misc group for unrendered scalars
-  misc_paths = [p for p in cfg_by_path if p not in rendered]
-  if misc_paths:
-    container.add_component(Label(text="Misc", bold=True, font_size=18))
-    misc_panel = ColumnPanel()
-    container.add_component(misc_panel)
-    for path in misc_paths:
-      cfg = cfg_by_path[path]
-      label_txt = cfg.get("label_override") or prettify(path)
-      misc_panel.add_component(Label(text=f"{label_txt}:", bold=True))
-      widget_cls = TextArea if cfg["widget_type"] == "TextArea" else TextBox
-      v = scalar_values[path]
-      w = widget_cls(text="" if v is None else str(v), width="100%")
-      w.tag = f"field_{path}"
-      w.role = "expand-on-focus"
-      _install_popout_editor(w)             # ← add this
-      misc_panel.add_component(w)
-      misc_panel.add_component(Spacer(height=4))
+def _section_fallback(section, values):
+  """Values of a never-built section, as its widgets would have held them."""
+  def pending():
+    return {spec.path: values.text(spec) for spec in section.fields}
+  return pending
+
+
+def _render_with_schema(payload, container, bundle, tracker, lazy=False,
+                        html_scalars=False, view=None):
+  plan = get_render_plan(bundle)
+  values = FieldValues(scalars=view["scalars"]) if view else FieldValues(payload)
+  sections = list(plan.sections)
+  if plan.misc:
+    # Misc group for scalars without a layout section
+    sections.append(SectionPlan("Misc", "full-width", plan.misc))
+
+  # Render sections top-to-bottom
+  for section in sections:
+    if lazy:
+      container.add_component(LazySection(
+        section.title,
+        build=lambda body, section=section: _fill_section(
+          section, body, values, tracker, html_scalars),
+        fallback=_section_fallback(section, values),
+      ))
+    else:
+      container.add_component(Label(text=section.title, bold=True, font_size=18))
+      container.add_component(Spacer(height=4))
+      _fill_section(section, container, values, tracker, html_scalars)
     container.add_component(Spacer(height=12))
 
-    # 5️⃣ Render all tables/lists
-  _render_tables(payload, container)
+  # Render all tables/lists
+  if view:
+    cells = _TableCells(view.get("doc_id"), bundle.get("schema"))
+    _render_view_tables(view["tables"], container, tracker, lazy, cells)
+  else:
+    _render_tables(payload, container, tracker, lazy)
+
+# ──────────────────────────────────────────────────────────────────────────────
+#  Lightweight scalar rendering – one HTML template per section
+# ──────────────────────────────────────────────────────────────────────────────
+
+_fields_count = 0
+
+
+def _fields_html(root_id, section, values):
+  """Markup for one section: a label + plain <input>/<textarea> per field."""
+  esc = table_html.escape
+  html = [f'<div id="{root_id}" data-json-fields class="json-fields json-fields-{esc(section.style)}">']
+  for spec in section.fields:
+    text = esc(values.text(spec))
+    attrs = f'data-field="{esc(spec.path)}"'
+    html.append(f'<div class="json-field"><label>{esc(spec.label)}</label>')
+    if spec.multiline:
+      html.append(f'<textarea {attrs}>{text}</textarea></div>')
+    else:
+      html.append(f'<input type="text" value="{text}" {attrs}/></div>')
+  html.append('</div>')
+  return "".join(html)
+
+
+class HtmlFieldsPanel(HtmlTemplate):
+  """A section's scalar fields as plain inputs in a single HtmlTemplate.
+
+    Values are read back in one JS call per section (readFields); edits are
+    tracked in the browser by the same delegated listener as table cells.
+    """
+
+  def __init__(self, section, values, **properties):
+    global _fields_count
+    _fields_count += 1
+    self.root_id = f"json-fields-{_fields_count}"
+    super().__init__(html=_fields_html(self.root_id, section, values), **properties)
+
+    _ensure_js_loaded()
+    root = anvil.js.get_dom_node(self).querySelector(f"#{self.root_id}")
+    anvil.js.call_js("registerFieldSection", root)
+
+  def get_field_values(self):
+    """{path: value} for every field of the section (one JS call)."""
+    return {path: value for path, value in anvil.js.call_js("readFields", self.root_id) or []}
+
+  def get_dirty_fields(self):
+    """[(path, old, new)] for fields edited since the last commit."""
+    return [tuple(c) for c in anvil.js.call_js("getDirtyFields", self.root_id) or []]
+
+  def commit_edits(self):
+    anvil.js.call_js("commitFields", self.root_id)
+
+
+def _ensure_js_loaded():
+  """Load the table/field helper JS once per page."""
+  if not hasattr(anvil.js.window, "openTablePopout"):
+    anvil.js.window.eval(get_table_data_js())
+
+# ──────────────────────────────────────────────────────────────────────────────
+#  Lazy (collapsed until opened) sections
+# ──────────────────────────────────────────────────────────────────────────────
+
+class LazySection(ColumnPanel):
+  """Collapsible section whose body is built the first time it is expanded.
+
+    Until then get_pending_values() supplies the section's values straight
+    from the payload, so a full extract still sees sections never opened.
+    """
+
+  def __init__(self, title, build, fallback, **properties):
+    super().__init__(**properties)
+    self._title    = title
+    self._build    = build
+    self._fallback = fallback
+    self._built    = False
+
+    self.header = Link(text=f"▸ {title}", bold=True, font_size=18)
+    self.header.set_event_handler("click", self._toggle)
+    self.body = ColumnPanel(visible=False)
+    self.add_component(self.header)
+    self.add_component(self.body)
+
+  def _toggle(self, **event_args):
+    if not self._built:
+      self._built = True
+      self._build(self.body)
+    self.body.visible = not self.body.visible
+    self.header.text = f"{'▾' if self.body.visible else '▸'} {self._title}"
+
+  def get_pending_values(self):
+    """{path: value} for a section not built yet, {} once it is."""
+    return {} if self._built else self._fallback()
 
 # ──────────────────────────────────────────────────────────────────────────────
 #  Legacy renderer (kept so old docs still work)
 # ──────────────────────────────────────────────────────────────────────────────
 
-def _legacy_render(value, container, label=None, _level=0):
+def _legacy_render(value, container, label=None, _level=0, tracker=None):
   """Former recursive renderer – used when no schema info is available."""
   if isinstance(value, (str, int, float, bool)) or value is None:
     if label:
@@ -198,6 +467,8 @@ def _legacy_render(value, container, label=None, _level=0):
     w.tag = f"field_{label}"
     w.role = "expand-on-focus"
     _install_popout_editor(w)             # ← add this
+    if tracker and label:
+      tracker.register_field(label, w)
     container.add_component(w)
     container.add_component(Spacer(height=5))
     return
@@ -205,19 +476,19 @@ def _legacy_render(value, container, label=None, _level=0):
   if isinstance(value, dict):
     scalars, tables = collect_fields_by_type(value)
     for p, v in scalars:
-      _legacy_render(v, container, label=p, _level=_level+1)
+      _legacy_render(v, container, label=p, _level=_level+1, tracker=tracker)
     if tables:
       container.add_component(Spacer(height=20))
       for p, v in tables:
-        _legacy_render(v, container, label=p, _level=_level+1)
+        _legacy_render(v, container, label=p, _level=_level+1, tracker=tracker)
     return
 
   if isinstance(value, list):
     if value and isinstance(value[0], dict):
-      _render_table(label, value, container)
+      _render_table(label, table_html.measure_table(value), container, tracker)
     else:
       for item in value:
-        _legacy_render(item, container, _level=_level+1)
+        _legacy_render(item, container, _level=_level+1, tracker=tracker)
     return
 
   container.add_component(Label(text=f"(Unrenderable: {repr(value)})"))
@@ -226,88 +497,120 @@ def _legacy_render(value, container, label=None, _level=0):
 #  Table helpers (HTML-table rendering)
 # ──────────────────────────────────────────────────────────────────────────────
 
-def _render_tables(payload, container):
+# Tables with more rows than this render only the rows in the viewport
+VIRTUAL_ROW_THRESHOLD   = table_html.VIRTUAL_ROW_THRESHOLD
+# Fixed row heights (px) used by the virtual table to position rows:
+# one-line <input> cells / rows containing a <textarea>
+VIRTUAL_ROW_HEIGHT      = 43
+VIRTUAL_ROW_HEIGHT_TALL = 78
+
+
+def _render_tables(payload, container, tracker=None, lazy=False):
   _, tables = collect_fields_by_type(payload)
+  _render_table_list(
+    [(path, len(rows), lambda rows=rows: table_html.measure_table(rows)) for path, rows in tables],
+    container, tracker, lazy,
+  )
+
+
+def _render_view_tables(view_tables, container, tracker=None, lazy=False, cells=None):
+  """Tables of a review view – already flattened and measured server-side,
+    and usually already rendered too ("html", see TableFragments)."""
+  _render_table_list(
+    [(t["path"], t["rows"] if "rows" in t else len(t["cells"]), lambda t=t: _view_table(t))
+     for t in view_tables],
+    container, tracker, lazy, cells,
+  )
+
+
+class _TableCells:
+  """Cells of a document's server-rendered tables, fetched from the server
+    (once, for all tables) only when a table never built must be extracted."""
+
+  def __init__(self, doc_id, schema_name):
+    self._doc_id = doc_id
+    self._schema_name = schema_name
+    self._cells = None
+
+  def get(self, path):
+    if self._cells is None:
+      self._cells = anvil.server.call('get_table_cells', self._doc_id, self._schema_name)
+    return self._cells[path]
+
+
+def _view_table(t):
+  """TableModel for a view table, or its ready-made TableFragment."""
+  if t.get("html") is not None:
+    return table_html.TableFragment(t["html"], t["columns"], t.get("cells"), t["tall"], t["rows"])
+  return table_html.TableModel.from_dict(t)
+
+
+def _render_table_list(tables, container, tracker, lazy, cells=None):
+  """tables: [(path, row_count, measure)] – measure() returns the
+    TableModel (or an already rendered TableFragment); *cells* supplies the
+    cells of fragments sent without them (_TableCells)."""
   if not tables:
     return
   container.add_component(Spacer(height=20))
-  for path, rows in tables:
-    _render_table(path, rows, container)
+  for path, n_rows, measure in tables:
+    if lazy:
+      container.add_component(LazySection(
+        f"{_table_title(path)}: {n_rows} rows",
+        build=lambda body, path=path, measure=measure: _render_table(
+          path, measure(), body, tracker, show_title=False),
+        fallback=_table_fallback(path, measure, cells),
+      ))
+      container.add_component(Spacer(height=10))
+    else:
+      _render_table(path, measure(), container, tracker)
 
 
-def _render_table(label, rows, container):
-  """Render a list-of-dict rows as an HTML table inside *container*."""
-  flat = [flatten_dict(r) for r in rows]
-  keys = sorted({k for r in flat for k in r})
-  if not keys:
-    return
+def _table_title(label):
+  return label.replace('_',' ').replace('.', ' > ').title() if label else "Table"
 
-    # ─── column widths ────────────────────────────────────────────────────
-  col_w = {}
-  for k in keys:
-    w = max(len(k)*10, 120)
-    for r in flat:
-      t = str(r.get(k, ""))
-      w = max(w, 280 if len(t) > 80 or "\n" in t else min(len(t)*8+20, 200))
-    col_w[k] = w
-  total = sum(col_w.values()) + 50
-  min_w = "100%" if len(keys) <= 3 else f"{total}px"
-  layout = "auto" if len(keys) <= 3 else "fixed"
-
-  # ─── stylesheet & skeleton ────────────────────────────────────────────
-  html = [
-    "<style>",
-    ".json-table-container{width:100%;overflow-x:auto;overflow-y:auto;"
-    "border:1px solid #ddd;border-radius:4px;background:#faf9fa;"
-    "margin-bottom:10px;max-height:400px;}",
-    f".json-table{{width:100%;min-width:{min_w};border-collapse:collapse;table-layout:{layout};}}",
-    ".json-table th{background:#f5f5f5;font-weight:bold;position:sticky;top:0;padding:8px;border:1px solid #ddd;text-align:center;}",
-    ".json-table td{padding:8px;border:1px solid #ddd;text-align:center;}",
-  ]
-  for idx, k in enumerate(keys):
-    html.append(
-      f".json-table th:nth-child({idx+1}),.json-table td:nth-child({idx+1}){{{{width:{col_w[k]}px;min-width:{col_w[k]}px;}}}}"
-    )
-  html += [
-    ".json-table tr:nth-child(even){background:#f9f9f9;}",
-    ".json-table input[type='text'],.json-table textarea{width:calc(100% - 8px);border:1px solid #e0e0e0;background:white;font-family:inherit;font-size:inherit;padding:4px;margin:0;text-align:left;}",
-    ".json-table textarea{height:60px;resize:vertical;}",
-    # ADD: Click handler for popout editor on table fields
-    ".json-table input[type='text']:focus,.json-table textarea:focus{outline:2px solid #4285f4;outline-offset:1px;}",
-    "</style>",
-    "<div class='json-table-container'><table class='json-table'>",
-    "<thead><tr>",
-  ]
-
-  # header row
-  for k in keys:
-    html.append(f"<th>{k.replace('_',' ').title()}</th>")
-  html.append("</tr></thead><tbody>")
-
-  # data rows
-  for i, row in enumerate(flat):
-    html.append("<tr>")
-    for k in keys:
-      cell = str(row.get(k, ""))
-      esc = (cell.replace("&", "&amp;").replace("<", "&lt;")
-        .replace(">", "&gt;").replace("\"", "&quot;"))
-
-      # ADD: onclick handler for popout editor
-      if len(cell) > 80 or "\n" in cell:
-        inp = f"<textarea data-tag='table_{label}_{i}_{k}' onclick='openTablePopout(this)'>{esc}</textarea>"
-      else:
-        inp = f"<input type='text' value='{esc}' data-tag='table_{label}_{i}_{k}' onclick='openTablePopout(this)'/>"
-      html.append(f"<td>{inp}</td>")
-    html.append("</tr>")
-  html.append("</tbody></table></div>")
+
+def _table_fallback(path, measure, cells=None):
+  """Rows of a never-built table, as its cells would have held them."""
+  def values():
+    model = measure()
+    if model is None:
+      return {}
+    rows = model.cells
+    if rows is None:
+      # fragments only ship cells when virtual – ask the server for them
+      rows = cells.get(path)
+    return {str(path): [dict(zip(model.columns, row)) for row in rows]}
+  return values
+
+
+def _render_table(label, model, container, tracker=None, show_title=True):
+  """Render a measured table_html.TableModel inside *container*.
+
+    A TableFragment (server-rendered markup) is shown as it is.
+    """
+  if model is None:
+    return
+  # long tables are virtualized: the browser keeps the cell values in a JS
+  # array and only paints the rows in view
+  if isinstance(model, table_html.TableFragment):
+    frag = model
+  else:
+    frag = table_html.render_table(model, virtual=len(model.cells) > VIRTUAL_ROW_THRESHOLD)
+  virtual = frag.rows > VIRTUAL_ROW_THRESHOLD
 
   # insert into Anvil
   tbl_panel = HtmlTablePanel()
-  tbl_panel.html = "".join(html)
+  tbl_panel.show_table(str(label), frag)
+  if virtual:
+    tbl_panel.mount_virtual_table(
+      frag.cells, VIRTUAL_ROW_HEIGHT_TALL if frag.tall else VIRTUAL_ROW_HEIGHT
+    )
+  if tracker:
+    tracker.register_table(tbl_panel)
 
-  title = label.replace('_',' ').replace('.', ' > ').title() if label else "Table"
-  container.add_component(Label(text=f"{title}: {len(rows)} rows", bold=True))
-  container.add_component(Spacer(height=5))
+  if show_title:
+    container.add_component(Label(text=f"{_table_title(label)}: {frag.rows} rows", bold=True))
+    container.add_component(Spacer(height=5))
   container.add_component(tbl_panel)
   container.add_component(Spacer(height=10))
 
@@ -315,17 +618,6 @@ def _render_table(label, rows, container):
 #  Shared helper utilities (unchanged from original version)
 # ──────────────────────────────────────────────────────────────────────────────
 
-def flatten_dict(d, parent_key='', sep='_'):
-  items = []
-  for k, v in d.items():
-    new_key = f"{parent_key}{sep}{k}" if parent_key else k
-    if isinstance(v, dict):
-      items.extend(flatten_dict(v, new_key, sep=sep).items())
-    else:
-      items.append((new_key, v))
-  return dict(items)
-
-
 def collect_fields_by_type(value, parent_key='', scalar_fields=None, table_fields=None):
   if scalar_fields is None:
     scalar_fields = []
@@ -345,36 +637,33 @@ def collect_fields_by_type(value, parent_key='', scalar_fields=None, table_field
 
 
 def extract_edited_data(container):
-  """Walk the rendered form and pull out edited scalar & table values."""
-  scalars, tables = {}, {}
+  """Walk the rendered form and pull out edited scalar & table values.
+
+    Tables come back as {table_path: [row_dict, ...]} from each panel.
+    """
+  scalars = {}
 
   def walk(c):
     if hasattr(c, 'get_table_data'):
-      for tag_str, val in c.get_table_data().items():
-        if tag_str.startswith('table_'):
-          _tag_table_to_dict(tag_str, val, tables)
+      scalars.update(c.get_table_data())
+
+    if hasattr(c, 'get_field_values'):
+      scalars.update(c.get_field_values())
+
+    # lazy sections never opened: fall back to the original payload
+    if hasattr(c, 'get_pending_values'):
+      scalars.update(c.get_pending_values())
 
     if hasattr(c, 'tag') and hasattr(c, 'text'):
       tag = str(c.tag) if c.tag is not None else ""
       if tag.startswith('field_'):
         scalars[tag[6:]] = c.text
-      elif tag.startswith('table_'):
-        _tag_table_to_dict(tag, c.text, tables)
 
     if hasattr(c, 'get_components'):
       for child in c.get_components():
         walk(child)
 
-  def _tag_table_to_dict(tag_str, value, dest):
-    _, tbl, idx_str, key = tag_str.split('_', 3)
-    idx = int(idx_str)
-    dest.setdefault(tbl, {}).setdefault(idx, {})[key] = value
-
   walk(container)
-
-  for t_name, rows in tables.items():
-    scalars[t_name] = [rows[i] for i in sorted(rows)]
-
   return scalars
 
 
@@ -396,33 +685,205 @@ def get_final_json(container):
 
 def get_table_data_js():
   return """
-    function getTableData() {
-      const data = {};
-      document.querySelectorAll('input[data-tag], textarea[data-tag]').forEach(el => {
-        const tag = el.getAttribute('data-tag');
-        const value = el.value;
-        if (tag.startsWith('table_')) {
-          const parts = tag.split('_');
-          const tbl  = parts[1];
-          const idx  = parseInt(parts[2]);
-          const key  = parts.slice(3).join('_');
-          if (!data[tbl]) data[tbl] = [];
-          if (!data[tbl][idx]) data[tbl][idx] = {};
-          data[tbl][idx][key] = value;
+    // ── Table registry ──────────────────────────────────────────────────
+    // Every HtmlTablePanel registers its root element here under its own
+    // id.  Cells carry data-row / data-col (column index), so extraction
+    // is a small scan of one root – never a page-wide querySelectorAll.
+    window.__jsonTables = window.__jsonTables || {};
+
+    function registerJsonTable(root, path, columns) {
+      window.__jsonTables[root.id] = {
+        root: root, path: path, columns: columns,
+        dirty: new Map(),         // "row:col" -> input element (edited cells)
+        rows: null                // virtual tables: backing array of values
+      };
+    }
+
+    // A new document is being rendered: forget tables / field sections no
+    // longer on the page
+    function pruneJsonTables() {
+      [window.__jsonTables, window.__jsonFields || {}].forEach(registry => {
+        Object.keys(registry).forEach(id => {
+          if (!registry[id].root.isConnected) delete registry[id];
+        });
+      });
+    }
+
+    // Scalar sections rendered as plain HTML (HtmlFieldsPanel)
+    window.__jsonFields = window.__jsonFields || {};
+
+    function registerFieldSection(root) {
+      window.__jsonFields[root.id] = { root: root, dirty: new Map() };
+    }
+
+    // [[path, value], ...] for every field of one section
+    function readFields(rootId) {
+      const f = window.__jsonFields[rootId];
+      if (!f) return [];
+      return Array.from(f.root.querySelectorAll('[data-field]'),
+                        el => [el.getAttribute('data-field'), el.value]);
+    }
+
+    // [[path, originalValue, value], ...] for edited fields of one section
+    function getDirtyFields(rootId) {
+      const f = window.__jsonFields[rootId];
+      const out = [];
+      if (!f) return out;
+      f.dirty.forEach((el, path) => {
+        if (el.value !== el.defaultValue) out.push([path, el.defaultValue, el.value]);
+      });
+      return out;
+    }
+
+    function commitFields(rootId) {
+      const f = window.__jsonFields[rootId];
+      if (!f) return;
+      f.dirty.forEach(el => { el.defaultValue = el.value; });
+      f.dirty.clear();
+    }
+
+    // Dirty tracking: one delegated listener for the whole page
+    document.addEventListener('input', function(e) {
+      const el = e.target;
+      if (el && el.hasAttribute && el.hasAttribute('data-field')) {
+        const root = el.closest('[data-json-fields]');
+        const f = root && window.__jsonFields[root.id];
+        if (f) f.dirty.set(el.getAttribute('data-field'), el);
+        return;
+      }
+      if (!el || !el.hasAttribute || !el.hasAttribute('data-row')) return;
+      const root = el.closest('[data-json-table]');
+      const t = root && window.__jsonTables[root.id];
+      if (!t) return;
+      const r = Number(el.getAttribute('data-row'));
+      const c = Number(el.getAttribute('data-col'));
+      if (t.rows) t.rows[r][c] = el.value;      // virtual: write back
+      t.dirty.set(r + ':' + c, el);
+    });
+
+    // [[row, col, originalValue, value], ...] for the table's edited cells
+    function getDirtyCells(rootId) {
+      const t = window.__jsonTables[rootId];
+      const out = [];
+      if (!t) return out;
+      t.dirty.forEach((el, key) => {
+        const [r, c] = key.split(':').map(Number);
+        const value = t.rows ? t.rows[r][c] : el.value;
+        const orig = t.rows ? t.original[r][c] : el.defaultValue;
+        if (value !== orig) out.push([r, c, orig, value]);
+      });
+      return out;
+    }
+
+    // After a successful save the current values become the baseline
+    function commitTableEdits(rootId) {
+      const t = window.__jsonTables[rootId];
+      if (!t) return;
+      t.dirty.forEach((el, key) => {
+        if (t.rows) {
+          const [r, c] = key.split(':').map(Number);
+          t.original[r][c] = t.rows[r][c];
+        } else {
+          el.defaultValue = el.value;
         }
       });
-      return data;
+      t.dirty.clear();
     }
-    
-    // NEW: Popout editor for table fields
-    function openTablePopout(element) {
-      const currentText = element.value;
-      
-      // Only show popout if content is long or has line breaks
-      if (currentText.length <= 100 && !currentText.includes('\\n')) {
-        return; // Let the field behave normally for short content
+
+    // All rows of one table as arrays of values in column order
+    function extractTable(rootId) {
+      const t = window.__jsonTables[rootId];
+      if (!t) return [];
+      if (t.rows) return t.rows;                // virtual: off-screen rows too
+      const rows = [];
+      t.root.querySelectorAll('[data-row]').forEach(el => {
+        const r = Number(el.getAttribute('data-row'));
+        const c = Number(el.getAttribute('data-col'));
+        if (!rows[r]) rows[r] = new Array(t.columns.length).fill('');
+        rows[r][c] = el.value;
+      });
+      return rows;
+    }
+
+    // ── Virtualized tables ──────────────────────────────────────────────
+    // Only the rows inside the scroll viewport (plus VT_OVERSCAN) exist in
+    // the DOM; every value lives in t.rows and edits are written back there.
+    const VT_OVERSCAN = 10;
+
+    function vtEscape(s) {
+      return String(s).replace(/&/g, '&amp;').replace(/</g, '&lt;')
+        .replace(/>/g, '&gt;').replace(/"/g, '&quot;').replace(/'/g, '&#39;');
+    }
+
+    function vtPaint(t) {
+      const h = t.box.clientHeight || 400;
+      const top = t.box.scrollTop;
+      const first = Math.max(0, Math.floor(top / t.rowHeight) - VT_OVERSCAN);
+      const last = Math.min(t.rows.length, Math.ceil((top + h) / t.rowHeight) + VT_OVERSCAN);
+      if (first === t.first && last === t.last) return;
+      t.first = first;
+      t.last = last;
+
+      // keep the caret in the cell being edited across repaints
+      const active = document.activeElement;
+      const keep = active && t.box.contains(active) && active.hasAttribute('data-row')
+        ? [active.getAttribute('data-row'), active.getAttribute('data-col')] : null;
+
+      const span = t.columns.length;
+      const spacer = px => `<tr class="vt-spacer" style="height:${px}px"><td colspan="${span}" style="padding:0;border:none"></td></tr>`;
+      const html = [spacer(first * t.rowHeight)];
+      for (let r = first; r < last; r++) {
+        html.push(`<tr style="height:${t.rowHeight}px">`);
+        t.rows[r].forEach((v, c) => {
+          const attrs = `data-row="${r}" data-col="${c}"`;
+          html.push(v.length > 80 || v.includes('\\n')
+            ? `<td><textarea ${attrs}>${vtEscape(v)}</textarea></td>`
+            : `<td><input type="text" value="${vtEscape(v)}" ${attrs}/></td>`);
+        });
+        html.push('</tr>');
       }
-      
+      html.push(spacer((t.rows.length - last) * t.rowHeight));
+      t.tbody.innerHTML = html.join('');
+
+      if (keep) {
+        const el = t.tbody.querySelector(`[data-row="${keep[0]}"][data-col="${keep[1]}"]`);
+        if (el) el.focus();
+      }
+    }
+
+    // Force a repaint of the current window (after an off-DOM edit)
+    function vtRepaint(t) {
+      t.first = t.last = -1;
+      vtPaint(t);
+    }
+
+    function mountVirtualTable(rootId, rows, rowHeight) {
+      const t = window.__jsonTables[rootId];
+      t.box = t.root.querySelector('.json-table-container');
+      t.tbody = t.box.querySelector('tbody');
+      t.rows = rows;
+      t.original = rows.map(r => r.slice());
+      t.rowHeight = rowHeight;
+      t.first = t.last = -1;
+      t.pending = false;
+
+      t.box.addEventListener('scroll', () => {
+        if (t.pending) return;
+        t.pending = true;
+        requestAnimationFrame(() => { t.pending = false; vtPaint(t); });
+      });
+      vtPaint(t);
+    }
+
+    // ── Shared pop-out editor ───────────────────────────────────────────
+    // ONE overlay for the whole page, built on first use and then only
+    // shown / hidden.  Its Escape listener is registered once, so nothing
+    // accumulates over a review session.
+    window.__popout = window.__popout || null;
+
+    function popoutEditor() {
+      if (window.__popout) return window.__popout;
+
       // Create a modal overlay
       const overlay = document.createElement('div');
       overlay.style.cssText = `
@@ -433,11 +894,11 @@ def get_table_data_js():
         height: 100%;
         background: rgba(0,0,0,0.5);
         z-index: 9999;
-        display: flex;
+        display: none;
         align-items: center;
         justify-content: center;
       `;
-      
+
       // Create the modal content
       const modal = document.createElement('div');
       modal.style.cssText = `
@@ -449,10 +910,9 @@ def get_table_data_js():
         max-height: 80%;
         box-shadow: 0 4px 20px rgba(0,0,0,0.3);
       `;
-      
+
       // Create the textarea
       const textarea = document.createElement('textarea');
-      textarea.value = currentText;
       textarea.style.cssText = `
         width: 100%;
         height: 400px;
@@ -464,11 +924,11 @@ def get_table_data_js():
         font-size: 14px;
         resize: vertical;
       `;
-      
+
       // Create buttons
       const buttonContainer = document.createElement('div');
       buttonContainer.style.cssText = 'text-align: right;';
-      
+
       const saveBtn = document.createElement('button');
       saveBtn.textContent = 'Save';
       saveBtn.style.cssText = `
@@ -480,7 +940,7 @@ def get_table_data_js():
         border-radius: 4px;
         cursor: pointer;
       `;
-      
+
       const cancelBtn = document.createElement('button');
       cancelBtn.textContent = 'Cancel';
       cancelBtn.style.cssText = `
@@ -491,42 +951,88 @@ def get_table_data_js():
         border-radius: 4px;
         cursor: pointer;
       `;
-      
-      // Add event listeners
+
+      const p = { overlay: overlay, textarea: textarea, onSave: null };
+
       saveBtn.onclick = () => {
-        element.value = textarea.value;
-        document.body.removeChild(overlay);
-      };
-      
-      cancelBtn.onclick = () => {
-        document.body.removeChild(overlay);
+        const onSave = p.onSave;
+        closePopout();
+        if (onSave) onSave(textarea.value);
       };
-      
+      cancelBtn.onclick = closePopout;
+
       // Close on overlay click
       overlay.onclick = (e) => {
-        if (e.target === overlay) {
-          document.body.removeChild(overlay);
-        }
+        if (e.target === overlay) closePopout();
       };
-      
-      // Close on Escape key
+
+      // Close on Escape key – registered once, only acts while open
       document.addEventListener('keydown', function(e) {
-        if (e.key === 'Escape') {
-          document.body.removeChild(overlay);
-        }
-      }, { once: true });
-      
+        if (e.key === 'Escape' && overlay.style.display !== 'none') closePopout();
+      });
+
       // Assemble the modal
       buttonContainer.appendChild(cancelBtn);
       buttonContainer.appendChild(saveBtn);
       modal.appendChild(textarea);
       modal.appendChild(buttonContainer);
       overlay.appendChild(modal);
-      
-      // Show the modal
       document.body.appendChild(overlay);
-      
-      // Focus the textarea
-      setTimeout(() => textarea.focus(), 100);
+
+      window.__popout = p;
+      return p;
+    }
+
+    // Show the shared editor with *text*; onSave(newText) runs on Save
+    function openPopout(text, onSave) {
+      const p = popoutEditor();
+      p.textarea.value = text;
+      p.onSave = onSave;
+      p.overlay.style.display = 'flex';
+      setTimeout(() => p.textarea.focus(), 100);
     }
+
+    function closePopout() {
+      const p = window.__popout;
+      if (!p) return;
+      p.overlay.style.display = 'none';
+      p.onSave = null;                 // drop the reference to the field
+    }
+
+    // Pop-out for an HTML table cell / scalar input
+    function openTablePopout(element) {
+      const currentText = element.value;
+
+      // Only show popout if content is long or has line breaks
+      if (currentText.length <= 100 && !currentText.includes('\\n')) {
+        return; // Let the field behave normally for short content
+      }
+
+      // a virtual table may repaint the cell away while the editor is open,
+      // so remember where the value lives rather than just the element
+      const root = element.closest('[data-json-table]');
+      const t = root && window.__jsonTables[root.id];
+      const r = Number(element.getAttribute('data-row'));
+      const c = Number(element.getAttribute('data-col'));
+
+      openPopout(currentText, value => {
+        if (element.isConnected) {
+          element.value = value;
+          // let the dirty-tracking / virtual-table listeners see the edit
+          element.dispatchEvent(new Event('input', { bubbles: true }));
+        } else if (t && t.rows) {
+          t.rows[r][c] = value;
+          t.dirty.set(r + ':' + c, element);
+          vtRepaint(t);
+        }
+      });
+    }
+
+    // One delegated listener opens the pop-out for every table cell and
+    // HTML scalar field on the page
+    document.addEventListener('click', function(e) {
+      const el = e.target;
+      if (!el || !el.hasAttribute) return;
+      if (el.hasAttribute('data-field') || el.hasAttribute('data-row')) openTablePopout(el);
+    });
     """
\ No newline at end of file
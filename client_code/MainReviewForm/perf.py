@@ -0,0 +1,53 @@
+# perf.py – browser-side timings, reported to the server in batches
+
+"""Times client-side work (rendering, building save patches) and sends the
+samples to Metrics.report_client_metrics in batches, so slow document opens
+can be split into server time and browser time.
+
+    @perf.timed("render_json")
+    def render_json(...): ...
+
+Samples are buffered; flush() sends them (without a spinner) and is called
+from idle moments such as the ReviewForm prefetch timer.
+"""
+
+import time
+import anvil.server
+
+BATCH_SIZE = 20         # flush() is a no-op below this many samples…
+BUFFER_MAX = 200        # …and the oldest samples are dropped above this
+
+_samples = []
+
+
+def record(name, ms):
+  _samples.append({"name": name, "ms": round(ms, 1)})
+  if len(_samples) > BUFFER_MAX:
+    del _samples[:len(_samples) - BUFFER_MAX]
+
+
+def timed(name):
+  """Decorator recording the wall time of every call under *name*."""
+  def wrap(fn):
+    def timed_fn(*args, **kwargs):
+      start = time.time()
+      try:
+        return fn(*args, **kwargs)
+      finally:
+        record(name, (time.time() - start) * 1000)
+    timed_fn.__name__ = fn.__name__
+    timed_fn.__doc__ = fn.__doc__
+    return timed_fn
+  return wrap
+
+
+def flush(force=False):
+  """Send the buffered samples if a batch is full (or *force*)."""
+  if not _samples or (len(_samples) < BATCH_SIZE and not force):
+    return
+  batch = list(_samples)
+  del _samples[:]
+  try:
+    anvil.server.call_s('report_client_metrics', batch)
+  except Exception:
+    pass        # metrics are best-effort – never bother the reviewer
@@ -0,0 +1,72 @@
+# schema_store.py – schema bundles persisted in the browser's localStorage
+
+"""Keeps the last ConfigService.get_full_schema_bundle result per schema in
+localStorage, so a new browser session only has to ask the server whether
+its copy is still current (by etag) instead of downloading it again.
+
+Entries are keyed by schema name and remember the `config_version` they were
+built at; a bundle is replaced as soon as the server sends a newer one.
+Storage failures (private mode, quota, disabled storage) are ignored – the
+bundle is then simply fetched as before.
+"""
+
+import json
+import anvil.js
+
+_KEY_PREFIX = "review.schema_bundle."
+
+
+def _storage():
+  try:
+    return anvil.js.window.localStorage
+  except Exception:
+    return None
+
+
+def load(schema_name):
+  """The stored bundle for *schema_name*, or None."""
+  storage = _storage()
+  if storage is None:
+    return None
+  try:
+    raw = storage.getItem(_KEY_PREFIX + schema_name)
+    bundle = json.loads(raw) if raw else None
+  except Exception:
+    return None
+  if not isinstance(bundle, dict) or not bundle.get("etag"):
+    return None
+  return bundle
+
+
+def save(bundle):
+  """Persist a full bundle (as returned by the server)."""
+  storage = _storage()
+  if storage is None or not bundle.get("etag"):
+    return
+  try:
+    storage.setItem(_KEY_PREFIX + bundle["schema"], json.dumps(bundle))
+  except Exception:
+    pass        # quota exceeded etc. – the in-memory copy still works
+
+
+def resolve(response, stored):
+  """Turn a get_full_schema_bundle response into a usable bundle.
+
+    response: a full bundle, or the not-modified marker sent when the etag
+              of *stored* is still current
+    stored:   what load() returned (None if nothing was stored)
+
+    Returns None if the server said "not modified" for a bundle we no longer
+    hold (the caller should then fetch it without an etag).
+    """
+  if response and response.get("not_modified"):
+    if stored and stored.get("etag") == response.get("etag"):
+      if stored.get("config_version") != response.get("config_version"):
+        # version bumped without a content change – just re-stamp our copy
+        stored["config_version"] = response.get("config_version")
+        save(stored)
+      return stored
+    return None
+  if response:
+    save(response)
+  return response
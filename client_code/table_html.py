@@ -0,0 +1,171 @@
+# table_html.py – single-pass HTML builder for editable JSON tables
+
+"""Pure-Python (no anvil imports) builder for the editable tables shown by
+HtmlTablePanel, so it can run in the browser, on the server and in offline
+benchmarks alike.
+
+Every cell is stringified and escaped exactly once; column widths are worked
+out in the same pass.  Measuring (measure_table) and markup (render_table)
+are separate steps so a measured TableModel can be precomputed and stored.
+Static table styling lives in theme.css – each table only carries its own
+<colgroup> widths.
+"""
+
+import re
+
+# Cells longer than this (or multi-line) become <textarea>s
+LONG_CELL = 80
+
+# Tables with more rows than this are virtualized (empty <tbody>, painted by
+# the browser from `cells`)
+VIRTUAL_ROW_THRESHOLD = 200
+
+# Bump whenever the generated markup changes – keys server-side HTML caches
+RENDERER_VERSION = 1
+
+_NEEDS_ESCAPE = re.compile(r"[&<>\"']")
+
+
+def escape(text):
+  """HTML-escape *text* for element content and double/single-quoted attrs."""
+  return (text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+          .replace("\"", "&quot;").replace("'", "&#39;"))
+
+
+def flatten_dict(d, parent_key='', sep='_'):
+  items = []
+  for k, v in d.items():
+    new_key = f"{parent_key}{sep}{k}" if parent_key else k
+    if isinstance(v, dict):
+      items.extend(flatten_dict(v, new_key, sep=sep).items())
+    else:
+      items.append((new_key, v))
+  return dict(items)
+
+
+def header_label(key):
+  return key.replace('_', ' ').title()
+
+
+class TableModel:
+  """Measured, stringified table – everything build_table needs but markup.
+
+    columns: flattened column keys, in display order
+    widths:  px width per column (same order)
+    cells:   row-major cell strings (unescaped)
+    tall:    True if any cell renders as a <textarea>
+
+    Plain lists/strings only, so it can be computed on the server, stored
+    (see to_dict / from_dict) and rendered later in the browser.
+    """
+
+  def __init__(self, columns, widths, cells, tall):
+    self.columns = columns
+    self.widths = widths
+    self.cells = cells
+    self.tall = tall
+
+  def to_dict(self):
+    return {"columns": self.columns, "widths": self.widths,
+            "cells": self.cells, "tall": self.tall}
+
+  @classmethod
+  def from_dict(cls, d):
+    return cls(d["columns"], d["widths"], d["cells"], d["tall"])
+
+
+class TableFragment:
+  """Result of build_table().
+
+    html:    the table markup for HtmlTablePanel.html
+    columns: flattened column keys, in display order (cells carry
+             data-row / data-col indexes into rows / columns)
+    cells:   row-major cell strings (unescaped) – feeds the virtual table;
+             None for a server-rendered table that is not virtual
+    tall:    True if any cell renders as a <textarea>
+    rows:    number of rows
+    """
+
+  def __init__(self, html, columns, cells, tall, rows=None):
+    self.html = html
+    self.columns = columns
+    self.cells = cells
+    self.tall = tall
+    self.rows = len(cells) if rows is None else rows
+
+
+def measure_table(rows):
+  """Flatten, stringify and measure a list-of-dict *rows* in one pass.
+
+    Returns a TableModel, or None if the rows have no columns at all.
+    """
+  widths = {}                 # key -> px
+  texts = []                  # per row: {key: text}
+  tall = False
+  for r in rows:
+    row_text = {}
+    for k, v in flatten_dict(r).items():
+      t = v if type(v) is str else str(v)
+      n = len(t)
+      is_long = n > LONG_CELL or "\n" in t
+      row_text[k] = t
+      w = 280 if is_long else min(n * 8 + 20, 200)
+      cur = widths.get(k)
+      if cur is None:
+        widths[k] = max(len(k) * 10, 120, w)
+      elif w > cur:
+        widths[k] = w
+      if is_long:
+        tall = True
+    texts.append(row_text)
+
+  keys = sorted(widths)
+  if not keys:
+    return None
+  cells = [[row_text.get(k, "") for k in keys] for row_text in texts]
+  return TableModel(keys, [widths[k] for k in keys], cells, tall)
+
+
+def render_table(model, virtual=False):
+  """Markup for a measured TableModel (see build_table)."""
+  keys, widths = model.columns, model.widths
+  total = sum(widths) + 50
+  narrow = len(keys) <= 3
+  table_style = ("min-width:100%;table-layout:auto" if narrow
+                 else f"min-width:{total}px;table-layout:fixed")
+
+  # ─── skeleton ─────────────────────────────────────────────────────────────
+  html = [f"<div class=\"json-table-container\"><table class=\"json-table\" style=\"{table_style}\"><colgroup>"]
+  html.extend(f"<col style=\"width:{w}px\">" for w in widths)
+  html.append("</colgroup><thead><tr>")
+  html.extend(f"<th>{escape(header_label(k))}</th>" for k in keys)
+  html.append("</tr></thead><tbody>")
+
+  # ─── data rows (each cell escaped once) ───────────────────────────────────
+  if not virtual:
+    needs_escape = _NEEDS_ESCAPE.search
+    col_attrs = [f"\" data-col=\"{c}\"" for c in range(len(keys))]
+    for i, row in enumerate(model.cells):
+      html.append("<tr>")
+      row_attr = f"data-row=\"{i}"
+      for t, col_attr in zip(row, col_attrs):
+        esc = escape(t) if needs_escape(t) else t
+        if len(t) > LONG_CELL or "\n" in t:
+          html.append(f"<td><textarea {row_attr}{col_attr}>{esc}</textarea></td>")
+        else:
+          html.append(f"<td><input type=\"text\" value=\"{esc}\" {row_attr}{col_attr}/></td>")
+      html.append("</tr>")
+  html.append("</tbody></table></div>")
+
+  return TableFragment("".join(html), keys, model.cells, model.tall)
+
+
+def build_table(rows, virtual=False):
+  """Build the editable HTML table for a list-of-dict *rows*.
+
+    With virtual=True the <tbody> is left empty for the browser-side virtual
+    renderer (see mountVirtualTable), which paints rows from `cells`.
+    Returns None if the rows have no columns at all.
+    """
+  model = measure_table(rows)
+  return render_table(model, virtual) if model else None
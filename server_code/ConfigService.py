@@ -4,10 +4,26 @@
 # renderer can build grouped forms without talking to Data Tables directly.
 
 import anvil.server
+import anvil.tables as tables
 import anvil.tables.query as q
 from anvil.tables import app_tables
-from functools import lru_cache
 from datetime import datetime
+import threading
+
+from .VersionedCache import VersionedCache
+from .ContentHash import content_hash, not_modified
+from .Metrics import instrument
+
+
+# How long a process trusts its copy of a schema's `config_version` stamp
+# before re-reading it.  Config edits reach every process within this window.
+CACHE_TTL_S = 600
+
+# Load EVERY schema (preload_all_schemas, two queries) on a process's first
+# cached lookup instead of one schema at a time (three queries each).  Set
+# False if there are many schemas and processes are short-lived (no
+# Persistent Server).  Importing this module never touches the tables.
+PRELOAD_ON_FIRST_USE = True
 
 
 # ---------------------------------------------------------------------------
@@ -25,21 +41,112 @@ def _schema_row(schema_name):
   return row
 
 
+def _config_version(schema_name):
+  """Cheap read of the schema's `config_version` stamp (0 if never bumped)."""
+  rows = app_tables.schema.search(q.fetch_only("config_version"), name=schema_name)
+  for row in rows:
+    return row["config_version"] or 0
+  raise ValueError(f"Schema '{schema_name}' not found in the schema table.")
+
+
 # ---------------------------------------------------------------------------
-# Cached look-ups (config changes are rare – 10 min cache is fine)
+# Cached look-ups
+#   Values are kept until the schema's `config_version` stamp changes; each
+#   process re-reads the stamp at most once per CACHE_TTL_S.
 # ---------------------------------------------------------------------------
 
-@lru_cache(maxsize=32)
+_schema_cache = VersionedCache(_config_version, ttl=CACHE_TTL_S, name="schema_config")
+
+
+def _cached(schema_name, key, loader):
+  _warm_once()
+  return _schema_cache.get(schema_name, key, loader)
+
+
 def _cached_structure(schema_name):
   """Return the `structure` simpleObject for a schema (cached)."""
-  row = _schema_row(schema_name)
-  return row["structure"] or {}
+  return _cached(schema_name, "structure",
+                 lambda: _schema_row(schema_name)["structure"] or {})
 
 
-@lru_cache(maxsize=32)
 def _cached_field_configs(schema_name, include_excluded=False):
+  """Return a list of field-config dicts for this schema (cached).
+
+    One canonical list (excluded fields included) is loaded per schema; the
+    visible-only list is derived from it without touching the tables.
+    """
+  fields = _cached(schema_name, "fields",
+                   lambda: _load_field_configs(schema_name))
+  if include_excluded:
+    return fields
+  return _cached(schema_name, "visible_fields",
+                 lambda: [f for f in fields if not f["excluded"]])
+
+
+def _cached_bundle(schema_name, include_excluded=False):
+  """Structure + field configs + their content hash (hashed once per load)."""
+  def _load():
+    structure = _cached_structure(schema_name)
+    fields = _cached_field_configs(schema_name, include_excluded)
+    return {
+      "schema":         schema_name,
+      "config_version": _schema_cache.version(schema_name),
+      "etag":           content_hash({"structure": structure, "fields": fields}),
+      "structure":      structure,
+      "fields":         fields,
+    }
+  return _cached(schema_name, ("bundle", bool(include_excluded)), _load)
+
+
+def get_projection(schema_name):
+  """Paths the review UI renders / must never ship for this schema (cached).
+
+    {
+      "etag": "...",                          # changes with the field configs
+      "keep": ["document_details.royalty", ...],  # configured, not excluded
+      "drop": ["run_config", ...]             # configured as excluded
+    }
+
+    Used by ReviewService to project documents before they are sent out.
+    """
+  def _load():
+    fields = _cached_field_configs(schema_name, include_excluded=True)
+    spec = {
+      "keep": [f["path"] for f in fields if not f["excluded"]],
+      "drop": [f["path"] for f in fields if f["excluded"]],
+    }
+    spec["etag"] = content_hash(spec)
+    return spec
+  return _cached(schema_name, "projection", _load)
+
+
+# Config columns the field dicts are built from – fetched in the same query
+# as the rows, so reading them never triggers a lazy per-row fetch
+_FIELD_COLUMNS = ("path", "widget_type", "layout_group", "excluded",
+                  "label_override", "view_mode", "choices")
+
+
+def _field_config(c):
+  return {
+    "path":           c["path"],
+    "widget_type":    c["widget_type"] or "TextBox",
+    "layout_group":   c["layout_group"],
+    "excluded":       bool(c["excluded"]),
+    "label_override": c["label_override"],
+    "view_mode":      c["view_mode"],
+    "choices":        c["choices"]            # may be None
+  }
+
+
+def _sorted_fields(fields):
+  # Sort by path so results are deterministic (renderer can re-order anyway)
+  return sorted(fields, key=lambda d: d["path"])
+
+
+def _load_field_configs(schema_name):
   """
-  Return a list of field-config dicts for this schema.
+  Return the list of ALL field-config dicts for this schema (excluded ones
+  too) – one query for the config rows.
 
   Each dict includes:
       path, widget_type, layout_group, excluded,
@@ -47,23 +154,42 @@ def _cached_field_configs(schema_name, include_excluded=False):
   """
   row = _schema_row(schema_name)
   # `schema` column in config is a link_multiple – search with list
-  configs = app_tables.config.search(schema=[row])
-
-  results = []
-  for c in configs:
-    if not include_excluded and c["excluded"]:
-      continue
-    results.append({
-      "path":           c["path"],
-      "widget_type":    c["widget_type"] or "TextBox",
-      "layout_group":   c["layout_group"],
-      "excluded":       bool(c["excluded"]),
-      "label_override": c["label_override"],
-      "view_mode":      c["view_mode"],
-      "choices":        c["choices"]            # may be None
+  configs = app_tables.config.search(q.fetch_only(*_FIELD_COLUMNS), schema=[row])
+  return _sorted_fields(_field_config(c) for c in configs)
+
+
+def preload_all_schemas():
+  """Warm the cache with every schema's structure, fields and bundles.
+
+    Two queries in total – all `schema` rows, then all `config` rows with
+    their schema links – however many schemas there are.  Returns the
+    names of the schemas loaded.
+
+    Runs by default on the first cached lookup of every process (see
+    PRELOAD_ON_FIRST_USE); call it directly to re-warm after a config edit.
+    """
+  schemas = list(app_tables.schema.search(
+    q.fetch_only("name", "structure", "config_version")))
+  by_id = {r.get_id(): r["name"] for r in schemas}
+
+  fields = {name: [] for name in by_id.values()}
+  for c in app_tables.config.search(q.fetch_only("schema", *_FIELD_COLUMNS)):
+    cfg = _field_config(c)
+    for link in c["schema"] or []:
+      name = by_id.get(link.get_id())
+      if name is not None:
+        fields[name].append(cfg)
+
+  for r in schemas:
+    name = r["name"]
+    _schema_cache.prime(name, r["config_version"] or 0, {
+      "structure": r["structure"] or {},
+      "fields":    _sorted_fields(fields[name]),
     })
-  # Sort by path so results are deterministic (renderer can re-order anyway)
-  return sorted(results, key=lambda d: d["path"])
+    # bundles / projection are derived in memory from the primed entries
+    _cached_bundle(name)
+    get_projection(name)
+  return list(fields)
 
 
 # ---------------------------------------------------------------------------
@@ -71,6 +197,7 @@ def _cached_field_configs(schema_name, include_excluded=False):
 # ---------------------------------------------------------------------------
 
 @anvil.server.callable
+@instrument
 def get_schema_structure(schema_name: str):
   """
   Return ONLY the `structure` object for the requested schema.
@@ -91,6 +218,7 @@ def get_schema_structure(schema_name: str):
 
 
 @anvil.server.callable
+@instrument
 def get_field_configs(schema_name: str, *, include_excluded: bool = False):
   """
   Return a list of field configuration dicts for the schema.
@@ -105,32 +233,88 @@ def get_field_configs(schema_name: str, *, include_excluded: bool = False):
 
 
 @anvil.server.callable
-def get_full_schema_bundle(schema_name: str, *, include_excluded: bool = False):
+@instrument
+def get_full_schema_bundle(schema_name: str, *, include_excluded: bool = False,
+                           if_none_match: str = None):
   """
   Convenience wrapper: returns structure + field configs together so the
   client can make a single round-trip.
 
   {
     "schema": "base_lease",
-    "retrieved": "2025-05-22T15:45:12Z",
+    "config_version": 7,
+    "etag": "5d41402abc4b2a76b9719d911017c592",
     "structure": {...},
     "fields": [...]
   }
+
+  Pass the `etag` you already hold as *if_none_match*; if it is still current
+  only {"schema", "config_version", "etag", "not_modified": True} is returned.
   """
-  return {
-    "schema": schema_name,
-    "retrieved": _now_iso(),
-    "structure": _cached_structure(schema_name),
-    "fields": _cached_field_configs(schema_name, include_excluded)
-  }
+  bundle = _cached_bundle(schema_name, include_excluded)
+  if if_none_match and if_none_match == bundle["etag"]:
+    return not_modified(bundle["etag"], schema=schema_name,
+                        config_version=bundle["config_version"])
+  return dict(bundle)
+
+
+@anvil.server.callable
+@instrument
+def get_cache_stats():
+  """Hit / miss / staleness counters for this process's schema cache."""
+  return _schema_cache.stats()
 
 
 # ---------------------------------------------------------------------------
 # Admin helpers (optional – not callable from client)
 # ---------------------------------------------------------------------------
 
-def _clear_cache():
-  """Manually clear the lru_cache layers (use after editing tables)."""
-  _cached_structure.cache_clear()
-  _cached_field_configs.cache_clear()
+@tables.in_transaction
+def bump_config_version(schema_name=None):
+  """
+  Increment `config_version` for one schema (or all of them) so every server
+  process drops its cached copy within CACHE_TTL_S.  Call after editing the
+  `schema` or `config` tables.
+  """
+  rows = [_schema_row(schema_name)] if schema_name else app_tables.schema.search()
+  for row in rows:
+    row["config_version"] = (row["config_version"] or 0) + 1
+
+
+def drop_local_cache(schema_name=None):
+  """Forget this process's cached config now instead of after CACHE_TTL_S
+    (other processes follow once they re-read the bumped version stamp)."""
+  _schema_cache.clear(schema_name)
+
+
+def _clear_cache(schema_name=None):
+  """Invalidate cached config everywhere (use after editing tables)."""
+  bump_config_version(schema_name)
+  # this process need not wait for its TTL to expire
+  drop_local_cache(schema_name)
+
+
+# ---------------------------------------------------------------------------
+# Warm-up
+#   The first cached lookup of a process runs preload_all_schemas (if
+#   PRELOAD_ON_FIRST_USE), so no later lookup it serves pays for cold config
+#   queries – not at import, so callables that never read config pay nothing.
+# ---------------------------------------------------------------------------
+
+_warmed = False
+_warm_lock = threading.Lock()
+
 
+def _warm_once():
+  global _warmed
+  if _warmed or not PRELOAD_ON_FIRST_USE:
+    return
+  with _warm_lock:
+    if _warmed:
+      return
+    _warmed = True          # set first: preload_all_schemas looks up, too
+    try:
+      preload_all_schemas()
+    except Exception as e:
+      # never fail the lookup – the cache simply fills schema by schema
+      print(f"ConfigService: schema preload skipped ({type(e).__name__}: {e})")
@@ -0,0 +1,21 @@
+# ContentHash.py  (server-side)
+#
+# Content hashes used as ETag-style version tokens: the client echoes back the
+# token it already holds and the server replies with a tiny "not modified"
+# marker instead of re-sending an unchanged payload.
+
+import hashlib
+import json
+
+
+def content_hash(obj):
+  """Stable hex digest of a JSON-compatible object (dict key order ignored)."""
+  blob = json.dumps(obj, sort_keys=True, separators=(",", ":"), default=str)
+  return hashlib.sha256(blob.encode("utf-8")).hexdigest()[:32]
+
+
+def not_modified(etag, **extra):
+  """The small response sent when the client's token is still current."""
+  marker = {"not_modified": True, "etag": etag}
+  marker.update(extra)
+  return marker
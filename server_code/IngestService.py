@@ -0,0 +1,329 @@
+# IngestService.py  (server-side)
+#
+# Bulk-loads extraction results into the `documents` table.  A source is a
+# server directory or an uploaded .zip holding pairs of files named after
+# the document:
+#
+#     LEASE-0001.json   ← extraction result   (→ documents.result_json)
+#     LEASE-0001.pdf    ← source document     (→ documents.pdf_blob, optional)
+#     LEASE-0001.sha256 ← instead of the .pdf: digest of a PDF already in the
+#                         blob store (re-runs need not ship PDFs again)
+#
+# PDFs are content-addressed (see PdfStore): identical files are stored once.
+# Runs as a background task and writes INGEST_BATCH_SIZE documents per
+# transaction (one add_rows call for new docs, one batch_update for existing
+# ones, plus their review views).  Progress is kept in `ingest_jobs`, so a
+# failed or killed job resumes after its last committed batch when started
+# again with the same job_id (a job still running is never started twice).
+
+import anvil.media
+import anvil.server
+import anvil.tables as tables
+import anvil.tables.query as q
+from anvil.tables import app_tables
+from datetime import datetime
+import json
+import os
+import uuid
+import zipfile
+
+from .PdfStore import pdf_digest, get_blobs, store_pdfs
+from .ReviewViews import refresh_batch_views
+
+
+# Documents written per transaction / table round trip
+INGEST_BATCH_SIZE = 200
+INGEST_BATCH_MAX = 1000
+
+# A "running" job that has not committed a batch for this long is taken to
+# have been killed, and may be resumed
+INGEST_STALLED_AFTER_S = 1800
+
+
+# ---------------------------------------------------------------------------
+# Sources
+#   Both expose their member names plus a reader for one member, and
+#   only ever hold one batch of file contents in memory.  Use them as context
+#   managers (`with _source(job) as source:`).
+# ---------------------------------------------------------------------------
+
+class _DirectorySource:
+  def __init__(self, path):
+    if not os.path.isdir(path):
+      raise Exception(f"Ingest directory '{path}' not found.")
+    self.path = path
+    self.names = {e.name for e in os.scandir(path) if e.is_file()}
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exc):
+    return False
+
+  def read(self, name):
+    with open(os.path.join(self.path, name), "rb") as f:
+      return f.read()
+
+
+class _ZipSource:
+  """The archive is spooled to a temp file and read member by member – it is
+    never loaded into memory as a whole."""
+
+  def __init__(self, media):
+    self._media = media
+    self._tmp = self._zip = None
+
+  def __enter__(self):
+    self._tmp = anvil.media.TempFile(self._media)
+    try:
+      self._zip = zipfile.ZipFile(self._tmp.__enter__())
+    except Exception:
+      self._tmp.__exit__(None, None, None)
+      raise
+    # members may sit in a top-level folder – address them by base name
+    self._members = {os.path.basename(n): n for n in self._zip.namelist()
+                     if not n.endswith("/")}
+    self.names = set(self._members)
+    return self
+
+  def __exit__(self, *exc):
+    self._zip.close()
+    self._tmp.__exit__(*exc)
+    return False
+
+  def read(self, name):
+    return self._zip.read(self._members[name])
+
+
+def _results(source):
+  """Sorted names of the .json results (any case of the extension) – the
+    doc_id is the file stem."""
+  return sorted(n for n in source.names if n.lower().endswith(".json"))
+
+
+def _member(source, doc_id, exts):
+  for ext in exts:
+    if doc_id + ext in source.names:
+      return doc_id + ext
+  return None
+
+
+# ---------------------------------------------------------------------------
+# Batches
+# ---------------------------------------------------------------------------
+
+def _read_batch(source, names):
+  """[(doc_id, result_json, pdf_sha256)] for the parseable results among
+    *names*, the batch's new PDF contents {sha256: (bytes, name)}, and
+    failures."""
+  items, pdfs, failed = [], {}, []
+  for name in names:
+    doc_id = name[:-5]
+    try:
+      result_json = json.loads(source.read(name).decode("utf-8"))
+      digest = None
+      pdf_name = _member(source, doc_id, (".pdf", ".PDF"))
+      if pdf_name:
+        data = source.read(pdf_name)
+        digest = pdf_digest(data)
+        pdfs.setdefault(digest, (data, pdf_name))
+      else:
+        sidecar = _member(source, doc_id, (".sha256",))
+        if sidecar:
+          digest = source.read(sidecar).decode("ascii").split()[0].lower()
+    except Exception as e:
+      failed.append({"doc_id": doc_id, "error": f"{type(e).__name__}: {e}"})
+      continue
+    items.append((doc_id, result_json, digest))
+  return items, pdfs, failed
+
+
+@tables.in_transaction
+def _write_batch(job, items, pdfs, failed, position, schema_names=()):
+  """Upsert one batch and advance the job cursor – all or nothing.
+
+    New doc_ids go in with ONE add_rows call; existing ones are updated
+    under batch_update and get their `version` bumped, so cached copies
+    and etags of re-ingested documents go stale.  PDFs already in the blob
+    store are linked, not stored again.  The review views of the batch are
+    built in the same transaction: for *schema_names*, and for every other
+    schema a re-ingested document already had a view for.
+    """
+  blobs = store_pdfs(pdfs)
+  referenced = [digest for _, _, digest in items if digest and digest not in blobs]
+  blobs.update(get_blobs(referenced))          # .sha256 sidecars
+  failed = failed + [
+    {"doc_id": doc_id, "error": f"PDF {digest} not in the blob store"}
+    for doc_id, _, digest in items if digest and digest not in blobs
+  ]
+
+  existing = {
+    r["doc_id"]: r for r in app_tables.documents.search(
+      q.fetch_only("doc_id", "version"),
+      doc_id=q.any_of(*[doc_id for doc_id, _, _ in items])
+    )
+  } if items else {}
+
+  new_rows = []
+  with tables.batch_update:
+    for doc_id, result_json, digest in items:
+      blob = blobs.get(digest)
+      row = existing.get(doc_id)
+      if row is None:
+        new_rows.append({"doc_id": doc_id, "result_json": result_json, "pdf_blob": blob,
+                         "flags": {}, "version": 0})
+        continue
+      values = {"result_json": result_json, "version": (row["version"] or 0) + 1}
+      if blob is not None:
+        values.update(pdf_blob=blob, pdf=None)
+      row.update(**values)
+  added = app_tables.documents.add_rows(new_rows) if new_rows else []
+  refresh_batch_views(list(existing.values()) + list(added or []), schema_names)
+
+  job.update(
+    position=position,
+    inserted=(job["inserted"] or 0) + len(new_rows),
+    updated=(job["updated"] or 0) + len(items) - len(new_rows),
+    failed=(job["failed"] or []) + failed,
+    updated_at=datetime.utcnow(),
+  )
+
+
+def _report(job):
+  """Mirror the job's counters into the background task's state."""
+  state = anvil.server.task_state
+  state["job_id"] = job["job_id"]
+  state["status"] = job["status"]
+  state["total"] = job["total"]
+  state["processed"] = job["position"]
+  state["inserted"] = job["inserted"]
+  state["updated"] = job["updated"]
+  state["failed"] = len(job["failed"] or [])
+
+
+# ---------------------------------------------------------------------------
+# Job records
+# ---------------------------------------------------------------------------
+
+def _stalled(job):
+  updated = job["updated_at"]
+  return updated is None or (
+    (datetime.utcnow() - updated).total_seconds() > INGEST_STALLED_AFTER_S)
+
+
+def _open_job(job_id, source_dir, archive):
+  """Return the job row – a new job, or a pending / failed one to resume.
+
+    A job still running is refused: a second task would work through the
+    same batches.
+    """
+  job = app_tables.ingest_jobs.get(job_id=job_id) if job_id else None
+  if job is None:
+    job = app_tables.ingest_jobs.add_row(
+      job_id=job_id or uuid.uuid4().hex, status="pending",
+      source_dir=source_dir, archive=archive,
+      position=0, total=None, inserted=0, updated=0, failed=[],
+      started=datetime.utcnow(), updated_at=datetime.utcnow(),
+    )
+  elif job["status"] == "done":
+    raise Exception(f"Ingest job '{job_id}' already finished.")
+  elif job["status"] == "running" and not _stalled(job):
+    raise Exception(f"Ingest job '{job_id}' is still running.")
+  if not job["source_dir"] and job["archive"] is None:
+    raise Exception("Nothing to ingest: pass a directory path or a .zip Media.")
+  return job
+
+
+def _view_schemas():
+  """Schemas whose review views ingest builds up front (all of them)."""
+  return [r["name"] for r in app_tables.schema.search(q.fetch_only("name"))]
+
+
+def _source(job):
+  """The job's source – a resumed job re-reads what it was started with."""
+  if job["source_dir"]:
+    return _DirectorySource(job["source_dir"])
+  return _ZipSource(job["archive"])
+
+
+@tables.in_transaction
+def _claim_job(job_id):
+  """Mark the job running – None if another task is already working on it."""
+  job = app_tables.ingest_jobs.get(job_id=job_id)
+  if job["status"] == "running" and not _stalled(job):
+    return None
+  job.update(status="running", error=None, updated_at=datetime.utcnow())
+  return job
+
+
+@anvil.server.background_task
+def ingest_documents_task(job_id, batch_size=INGEST_BATCH_SIZE):
+  """Work through one ingest job, batch by batch (see start_ingest)."""
+  job = _claim_job(job_id)
+  if job is None:
+    return
+  try:
+    with _source(job) as source:
+      names = _results(source)
+      job.update(total=len(names))
+      _report(job)
+
+      schema_names = _view_schemas()
+      position = job["position"] or 0          # resume after the last batch
+      while position < len(names):
+        chunk = names[position:position + batch_size]
+        items, pdfs, failed = _read_batch(source, chunk)
+        position += len(chunk)
+        _write_batch(job, items, pdfs, failed, position, schema_names)
+        _report(job)
+  except Exception as e:
+    job.update(status="failed", error=f"{type(e).__name__}: {e}",
+               updated_at=datetime.utcnow())
+    _report(job)
+    raise
+
+  job.update(status="done", updated_at=datetime.utcnow())
+  _report(job)
+
+
+# ---------------------------------------------------------------------------
+# Public API (server-side only – call from a server function or the REPL)
+# ---------------------------------------------------------------------------
+
+def start_ingest(source=None, *, job_id=None, batch_size=INGEST_BATCH_SIZE):
+  """Launch (or resume) a bulk ingestion; returns the background Task.
+
+    source:     server directory path (str) or a .zip Media; may be omitted
+                when resuming – the job remembers what it was started with
+                (a Media is stored once, in `ingest_jobs.archive`, because
+                the task runs in another process; it is read from there
+                via a temp file, never held in memory)
+    job_id:     id of the job to resume; a new job gets a random id
+    batch_size: documents per transaction (capped at INGEST_BATCH_MAX)
+
+    Poll the task's state for {"job_id", "status", "total", "processed",
+    "inserted", "updated", "failed"}; the same counters stay in `ingest_jobs`.
+    """
+  batch_size = max(1, min(int(batch_size or INGEST_BATCH_SIZE), INGEST_BATCH_MAX))
+  source_dir = source if isinstance(source, str) else None
+  archive = source if source is not None and source_dir is None else None
+  job = _open_job(job_id, source_dir, archive)
+  return anvil.server.launch_background_task("ingest_documents_task",
+                                             job["job_id"], batch_size)
+
+
+def get_ingest_status(job_id):
+  """Counters of one ingest job (also readable after the task has ended)."""
+  job = app_tables.ingest_jobs.get(job_id=job_id)
+  if not job:
+    raise Exception(f"Ingest job '{job_id}' not found.")
+  return {
+    "job_id":    job["job_id"],
+    "status":    job["status"],
+    "total":     job["total"],
+    "processed": job["position"],
+    "inserted":  job["inserted"],
+    "updated":   job["updated"],
+    "failed":    job["failed"] or [],
+    "error":     job["error"],
+  }
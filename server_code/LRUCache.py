@@ -0,0 +1,78 @@
+# LRUCache.py  (server-side)
+#
+# Bounded in-process cache with least-recently-used eviction, for values that
+# are expensive to build but keyed by their own content (so they never go
+# stale – they are only pushed out, or dropped explicitly).
+
+import threading
+from collections import OrderedDict
+
+from .Metrics import note_cache
+
+
+class LRUCache:
+  """
+  Keep at most *max_entries* values; the least recently used one goes first.
+
+      cache = LRUCache(256, name="table_fragments")
+      html = cache.get(key, lambda: build(...))
+
+  Keys are tuples whose first element is a *group* (e.g. a doc_id) so every
+  entry of a group can be dropped at once with invalidate(group).
+  """
+
+  def __init__(self, max_entries=256, name="lru"):
+    self.name = name
+    self.max_entries = max_entries
+    self._entries = OrderedDict()   # key -> value, oldest first
+    self._guard = threading.Lock()
+    self._stats = {
+      "hits":      0,   # served from memory
+      "misses":    0,   # loader ran
+      "evictions": 0,   # pushed out by newer entries
+    }
+
+  def get(self, key, loader):
+    """Return the cached value for *key*, calling loader() on a miss."""
+    with self._guard:
+      hit = key in self._entries
+      if hit:
+        self._entries.move_to_end(key)
+        self._stats["hits"] += 1
+        value = self._entries[key]
+      else:
+        self._stats["misses"] += 1
+    note_cache(hit)
+    if hit:
+      return value
+
+    # build outside the lock – a duplicate build is cheaper than blocking
+    value = loader()
+    with self._guard:
+      self._entries[key] = value
+      self._entries.move_to_end(key)
+      while len(self._entries) > self.max_entries:
+        self._entries.popitem(last=False)
+        self._stats["evictions"] += 1
+    return value
+
+  def invalidate(self, group):
+    """Drop every entry whose key starts with *group*."""
+    with self._guard:
+      for k in [k for k in self._entries if k[0] == group]:
+        del self._entries[k]
+
+  def clear(self):
+    with self._guard:
+      self._entries.clear()
+
+  def stats(self):
+    """Return a snapshot of the hit/miss/eviction counters."""
+    with self._guard:
+      stats = dict(self._stats)
+      stats["entries"] = len(self._entries)
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_ratio"] = round(stats["hits"] / lookups, 4) if lookups else None
+    stats["name"] = self.name
+    stats["max_entries"] = self.max_entries
+    return stats
@@ -0,0 +1,337 @@
+# Metrics.py  (server-side)
+#
+# Lightweight instrumentation for server callables.  @instrument records, per
+# call, the wall time, the cache hits / misses seen while it ran, named
+# sub-timings (span) and – for every SIZE_EVERY_N-th call – the serialized
+# response size.  Samples go into an in-memory ring buffer that is flushed,
+# at most once per FLUSH_INTERVAL_S, as aggregated histograms into the
+# `metrics` table.  Browser timings arrive through report_client_metrics.
+#
+# That ring only works with Persistent Server (set PERSISTENT_SERVER = True):
+# samples then accumulate and are written every FLUSH_EVERY_N samples /
+# FLUSH_INTERVAL_S, and when the process exits.  Without it every call runs
+# in a fresh process whose ring dies with it, so by default only a
+# SAMPLE_RATE share of calls is kept, each as ONE compact `metric_samples`
+# row, and the scheduled aggregate_metric_samples task folds those rows into
+# the `metrics` histograms.
+
+import anvil.server
+import anvil.tables as tables
+from anvil.tables import app_tables
+import atexit
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+import functools
+import json
+import random
+import threading
+import time
+
+
+PERSISTENT_SERVER = False   # True if server processes outlive a call
+SAMPLE_RATE = 0.1           # not persistent: share of calls whose sample is kept
+RING_SIZE = 4096            # samples kept between flushes (oldest dropped)
+FLUSH_INTERVAL_S = 60       # persistent: flush at least this often…
+FLUSH_EVERY_N = 500         # …or as soon as this many samples are buffered
+SIZE_EVERY_N = 10           # measure the response size of every N-th call
+CLIENT_BATCH_MAX = 200      # samples accepted per report_client_metrics call
+SAMPLE_ROWS_PER_RUN = 2000  # metric_samples rows folded per aggregate run
+
+# Upper bucket bounds; the last bucket collects everything above
+LATENCY_BUCKETS_MS = [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000]
+SIZE_BUCKETS_BYTES = [1_000, 10_000, 50_000, 100_000, 500_000, 1_000_000, 5_000_000]
+
+
+_ring = deque(maxlen=RING_SIZE)
+_guard = threading.Lock()
+_local = threading.local()        # .stack: samples of the calls in progress
+_calls = {}                       # callable name -> call count (size sampling)
+_last_flush = time.monotonic()
+
+
+# ---------------------------------------------------------------------------
+# Recording
+# ---------------------------------------------------------------------------
+
+def _stack():
+  stack = getattr(_local, "stack", None)
+  if stack is None:
+    stack = _local.stack = []
+  return stack
+
+
+def note_cache(hit):
+  """Count a cache lookup against the instrumented call in progress (if any)."""
+  stack = _stack()
+  if stack:
+    stack[-1]["hits" if hit else "misses"] += 1
+
+
+@contextmanager
+def span(name):
+  """Time a step of the current call: `with span("pdf_url"): ...`."""
+  start = time.perf_counter()
+  try:
+    yield
+  finally:
+    stack = _stack()
+    if stack:
+      spans = stack[-1]["spans"]
+      spans[name] = spans.get(name, 0.0) + (time.perf_counter() - start) * 1000
+
+
+def _response_size(result):
+  try:
+    return len(json.dumps(result, separators=(",", ":"), default=str))
+  except Exception:
+    return None
+
+
+def instrument(fn):
+  """Record latency / cache / size samples for every call of *fn*.
+
+    Put it directly under @anvil.server.callable (it keeps fn's name).
+    """
+  name = fn.__name__
+
+  @functools.wraps(fn)
+  def wrapper(*args, **kwargs):
+    if _stack():
+      # called from another instrumented callable (e.g. bootstrap_review):
+      # a step of that call, not a client-facing call of its own
+      with span(name):
+        return fn(*args, **kwargs)
+    sample = {"name": name, "source": "server", "hits": 0, "misses": 0,
+              "spans": {}, "bytes": None, "error": False}
+    _stack().append(sample)
+    start = time.perf_counter()
+    try:
+      result = fn(*args, **kwargs)
+    except Exception:
+      sample["error"] = True
+      _finish(sample, start)
+      raise
+    _finish(sample, start, result)
+    return result
+
+  return wrapper
+
+
+_NO_RESULT = object()
+
+
+def _finish(sample, start, result=_NO_RESULT):
+  sample["ms"] = (time.perf_counter() - start) * 1000
+  _stack().pop()
+  if not PERSISTENT_SERVER and random.random() >= SAMPLE_RATE:
+    return
+  if result is not _NO_RESULT and _measure_size(sample["name"]):
+    sample["bytes"] = _response_size(result)
+  _record([sample])
+
+
+def _measure_size(name):
+  """Every SIZE_EVERY_N-th call per process – or, when each call has a fresh
+    process, a random 1 in SIZE_EVERY_N of the kept samples."""
+  if not PERSISTENT_SERVER:
+    return random.random() < 1 / SIZE_EVERY_N
+  with _guard:
+    n = _calls[name] = _calls.get(name, 0) + 1
+  return (n - 1) % SIZE_EVERY_N == 0
+
+
+def _record(samples):
+  """Buffer *samples* in the ring, or store them as one row (see top)."""
+  ts = time.time()
+  for s in samples:
+    s["ts"] = ts
+  if PERSISTENT_SERVER:
+    with _guard:
+      _ring.extend(samples)
+    _maybe_flush()
+  else:
+    _store_quietly(samples)
+
+
+def _compact(sample):
+  # zero counters / empty spans are the defaults aggregate() assumes
+  return {k: v for k, v in sample.items() if v not in (None, False, 0, {})
+          or k == "ms"}
+
+
+# ---------------------------------------------------------------------------
+# Aggregation + flush
+# ---------------------------------------------------------------------------
+
+def _bucket(value, bounds):
+  for i, bound in enumerate(bounds):
+    if value <= bound:
+      return i
+  return len(bounds)
+
+
+class _Histogram:
+  def __init__(self, bounds):
+    self.bounds = bounds
+    self.buckets = [0] * (len(bounds) + 1)
+    self.count = 0
+    self.total = 0.0
+    self.max = 0.0
+
+  def add(self, value):
+    self.buckets[_bucket(value, self.bounds)] += 1
+    self.count += 1
+    self.total += value
+    self.max = max(self.max, value)
+
+
+def aggregate(samples):
+  """{(source, name, metric): {"hist", "hits", "misses", "errors"}}.
+
+    metric is "latency_ms", "size_bytes" or "span:<step>" (ms).
+    """
+  out = {}
+
+  def entry(sample, metric, bounds):
+    key = (sample["source"], sample["name"], metric)
+    if key not in out:
+      out[key] = {"hist": _Histogram(bounds), "hits": 0, "misses": 0, "errors": 0}
+    return out[key]
+
+  for s in samples:
+    e = entry(s, "latency_ms", LATENCY_BUCKETS_MS)
+    e["hist"].add(s["ms"])
+    e["hits"] += s.get("hits", 0)
+    e["misses"] += s.get("misses", 0)
+    e["errors"] += 1 if s.get("error") else 0
+    if s.get("bytes") is not None:
+      entry(s, "size_bytes", SIZE_BUCKETS_BYTES)["hist"].add(s["bytes"])
+    for step, ms in (s.get("spans") or {}).items():
+      entry(s, f"span:{step}", LATENCY_BUCKETS_MS)["hist"].add(ms)
+  return out
+
+
+def _drain():
+  with _guard:
+    samples = list(_ring)
+    _ring.clear()
+  return samples
+
+
+def flush_metrics():
+  """Write the buffered samples as one histogram row per (source, name,
+    metric) – a single add_rows call.  Returns the number of rows written."""
+  global _last_flush
+  _last_flush = time.monotonic()
+  return _write_histograms(_drain())
+
+
+def _write_histograms(samples):
+  if not samples:
+    return 0
+  window_start = datetime.utcfromtimestamp(min(s["ts"] for s in samples))
+  window_end = datetime.utcfromtimestamp(max(s["ts"] for s in samples))
+  rows = []
+  for (source, name, metric), e in aggregate(samples).items():
+    h = e["hist"]
+    rows.append({
+      "source":       source,
+      "name":         name,
+      "metric":       metric,
+      "window_start": window_start,
+      "window_end":   window_end,
+      "count":        h.count,
+      "sum":          round(h.total, 3),
+      "max":          round(h.max, 3),
+      "buckets":      {"bounds": h.bounds, "counts": h.buckets},
+      "cache_hits":   e["hits"],
+      "cache_misses": e["misses"],
+      "errors":       e["errors"],
+    })
+  app_tables.metrics.add_rows(rows)
+  return len(rows)
+
+
+def _flush_quietly():
+  try:
+    flush_metrics()
+  except Exception as e:
+    # metrics must never break the call they measure
+    print(f"Metrics: flush failed ({type(e).__name__}: {e})")
+
+
+def _maybe_flush():
+  """Write the buffer once it is big or old enough (persistent processes)."""
+  with _guard:
+    buffered = len(_ring)
+  if buffered >= FLUSH_EVERY_N or time.monotonic() - _last_flush >= FLUSH_INTERVAL_S:
+    _flush_quietly()
+
+
+# a persistent process that shuts down still writes what it buffered
+atexit.register(_flush_quietly)
+
+
+def _store_quietly(samples):
+  try:
+    app_tables.metric_samples.add_row(
+      ts=datetime.utcfromtimestamp(samples[0]["ts"]),
+      samples=[_compact(s) for s in samples])
+  except Exception as e:
+    print(f"Metrics: sample not stored ({type(e).__name__}: {e})")
+
+
+@anvil.server.background_task
+def aggregate_metric_samples():
+  """Scheduled (anvil.yaml): fold the oldest SAMPLE_ROWS_PER_RUN
+    `metric_samples` rows into `metrics` histogram rows and delete them.
+    Returns the number of histogram rows written."""
+  return _fold_samples()
+
+
+@tables.in_transaction
+def _fold_samples():
+  rows = []
+  for row in app_tables.metric_samples.search(tables.order_by("ts")):
+    rows.append(row)
+    if len(rows) >= SAMPLE_ROWS_PER_RUN:
+      break
+  written = _write_histograms([s for r in rows for s in (r["samples"] or [])])
+  with tables.batch_delete:
+    for row in rows:
+      row.delete()
+  return written
+
+
+# ---------------------------------------------------------------------------
+# Browser timings
+# ---------------------------------------------------------------------------
+
+@anvil.server.callable
+def report_client_metrics(samples):
+  """Accept a batch of browser timings: [{"name": "render_json", "ms": 412.5}, ...]."""
+  kept = []
+  for s in (samples or [])[:CLIENT_BATCH_MAX]:
+    try:
+      ms = float(s["ms"])
+    except (KeyError, TypeError, ValueError):
+      continue
+    kept.append({"name": str(s.get("name"))[:100], "source": "client", "ms": ms,
+                 "hits": 0, "misses": 0, "spans": {}, "bytes": None, "error": False})
+  if kept:
+    _record(kept)
+  return {"status": "ok"}
+
+
+def snapshot():
+  """Aggregates of the samples still in the ring (not yet flushed; always
+    empty without Persistent Server)."""
+  with _guard:
+    samples = list(_ring)
+  return [
+    {"source": source, "name": name, "metric": metric, "count": e["hist"].count,
+     "mean": round(e["hist"].total / e["hist"].count, 3) if e["hist"].count else None,
+     "max": round(e["hist"].max, 3), "cache_hits": e["hits"], "cache_misses": e["misses"]}
+    for (source, name, metric), e in sorted(aggregate(samples).items())
+  ]
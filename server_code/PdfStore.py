@@ -0,0 +1,116 @@
+# PdfStore.py  (server-side)
+#
+# Content-addressed PDF storage.  Every distinct PDF is stored ONCE in the
+# `pdf_blobs` table under its SHA-256; documents link to the blob
+# (`documents.pdf_blob`) instead of carrying their own media copy.  Re-running
+# an extraction over the same source files therefore adds no PDF data at all,
+# and uploaders that already know a digest can skip the upload (see
+# missing_pdf_digests – server code and server Uplink only).
+
+import anvil
+import anvil.server
+import anvil.tables as tables
+import anvil.tables.query as q
+from anvil.tables import app_tables
+from datetime import datetime
+import hashlib
+from itertools import islice
+
+
+# Digests one missing_pdf_digests call may ask about
+DIGESTS_MAX = 1000
+
+# anvil.server.context.client.type values that may not ask the store
+_UNTRUSTED_CLIENTS = ("browser", "client_uplink")
+
+def pdf_digest(data):
+  """Hex SHA-256 of the PDF bytes – the blob key."""
+  return hashlib.sha256(data).hexdigest()
+
+
+def get_blobs(digests):
+  """{sha256: pdf_blobs row} for the digests already stored (one query)."""
+  digests = sorted({d for d in digests if d})
+  if not digests:
+    return {}
+  rows = app_tables.pdf_blobs.search(q.fetch_only("sha256"), sha256=q.any_of(*digests))
+  return {r["sha256"]: r for r in rows}
+
+
+def store_pdfs(pdfs):
+  """Store PDF bytes that are not stored yet; returns {sha256: blob row}.
+
+    pdfs: {sha256: (bytes, file_name)} – digests from pdf_digest().
+    Known digests cost nothing beyond the lookup; new ones go in with one
+    add_rows call.
+    """
+  blobs = get_blobs(pdfs)
+  new = [
+    {"sha256": digest, "size": len(data), "created": datetime.utcnow(),
+     "pdf": anvil.BlobMedia("application/pdf", data, name=name)}
+    for digest, (data, name) in pdfs.items() if digest not in blobs
+  ]
+  if new:
+    app_tables.pdf_blobs.add_rows(new)
+    blobs.update(get_blobs(b["sha256"] for b in new))
+  return blobs
+
+
+def document_pdf(row):
+  """The PDF Media of a `documents` row – its blob, else the legacy column."""
+  blob = row["pdf_blob"]
+  if blob is not None:
+    return blob["pdf"]
+  return row["pdf"]
+
+
+@anvil.server.callable
+def missing_pdf_digests(digests):
+  """Which of *digests* (at most DIGESTS_MAX) the store does not have yet.
+
+    Uploaders hash locally, ask here, and send only the PDFs listed.  Only
+    server code and server Uplink may ask – browsers must not learn which
+    PDFs are stored.
+    """
+  if anvil.server.context.client.type in _UNTRUSTED_CLIENTS:
+    raise anvil.server.PermissionDenied("missing_pdf_digests is not callable from clients.")
+  digests = list(digests or [])
+  if len(digests) > DIGESTS_MAX:
+    raise Exception(f"At most {DIGESTS_MAX} digests per call (got {len(digests)}).")
+  known = get_blobs(digests)
+  return [d for d in digests if d not in known]
+
+
+# ---------------------------------------------------------------------------
+# Admin helpers (optional – not callable from client)
+# ---------------------------------------------------------------------------
+
+def migrate_document_pdfs(batch_size=100):
+  """Move `documents.pdf` media into the blob store, batch by batch.
+
+    Safe to re-run: documents that already link a blob are skipped.  Returns
+    the number of documents migrated.
+    """
+  migrated = 0
+  while True:
+    batch = list(islice(app_tables.documents.search(
+      q.fetch_only("doc_id", "pdf"), pdf_blob=None, pdf=q.not_(None)
+    ), batch_size))
+    if not batch:
+      return migrated
+    _migrate_batch(batch)
+    migrated += len(batch)
+
+
+@tables.in_transaction
+def _migrate_batch(rows):
+  pdfs, digests = {}, []
+  for r in rows:
+    data = r["pdf"].get_bytes()
+    digest = pdf_digest(data)
+    pdfs.setdefault(digest, (data, r["pdf"].name))
+    digests.append(digest)
+  blobs = store_pdfs(pdfs)
+  with tables.batch_update:
+    for r, digest in zip(rows, digests):
+      r.update(pdf_blob=blobs[digest], pdf=None)
@@ -0,0 +1,85 @@
+# Projection.py  (server-side)
+#
+# Trims a stored extraction result down to what the review UI renders for a
+# schema.  Shared by ReviewService (projected fetches) and ReviewViews.
+
+
+def payload_item(result_json):
+  """The extraction payload the client renders: result_json["output"][0]."""
+  output = (result_json or {}).get("output")
+  if isinstance(output, list) and output and isinstance(output[0], dict):
+    return output[0]
+  return {}
+
+
+def working_copy(result_json, corrected_json):
+  """The reviewer's saved copy if there is one, else the extraction payload."""
+  if isinstance(corrected_json, dict) and corrected_json:
+    return corrected_json
+  return payload_item(result_json)
+
+
+def project_payload(item, spec, prune=False):
+  """Copy of the payload *item* trimmed to what the review UI needs.
+
+    spec:  ConfigService.get_projection(schema) – "drop" paths are removed.
+    prune: also drop everything the schema renderer would not display, i.e.
+           keep only configured ("keep") paths and tables (lists of dicts,
+           at any depth), plus the dicts leading to them.
+
+    Dotted paths are relative to the item, like the config table's `path`.
+    """
+  if not isinstance(item, dict):
+    return {}
+  keep = _path_tree(spec["keep"]) if prune else None
+  drop = _path_tree(spec["drop"])
+  return _project(item, keep, drop)
+
+
+def _path_tree(paths):
+  """["a.b", "a.c", "d"] -> {"a": {"b": {}, "c": {}}, "d": {}} ({} = leaf)."""
+  tree = {}
+  for path in paths:
+    node = tree
+    for part in path.split("."):
+      node = node.setdefault(part, {})
+  return tree
+
+
+def _is_table(value):
+  return isinstance(value, list) and bool(value) and isinstance(value[0], dict)
+
+
+def _project(node, keep, drop):
+  out = {}
+  for k, v in node.items():
+    sub_drop = drop.get(k) if drop else None
+    if sub_drop == {}:
+      continue                              # excluded path (whole subtree)
+    sub_keep = keep.get(k) if keep is not None else None
+    if keep is not None and sub_keep == {}:
+      sub_keep = None                       # configured leaf: keep all of it
+    elif keep is not None and sub_keep is None:
+      # unconfigured: only tables (and dicts holding tables) survive pruning
+      if _is_table(v):
+        out[k] = _project_rows(v, sub_drop)
+      elif isinstance(v, dict):
+        sub = _project(v, {}, sub_drop)
+        if sub:
+          out[k] = sub
+      continue
+
+    if isinstance(v, dict):
+      out[k] = _project(v, sub_keep, sub_drop)
+    elif _is_table(v):
+      out[k] = _project_rows(v, sub_drop)
+    else:
+      out[k] = v
+  return out
+
+
+def _project_rows(rows, drop):
+  """Apply excluded column paths (e.g. "tracts.raw_text") to every row."""
+  if not drop:
+    return rows
+  return [_project(r, None, drop) if isinstance(r, dict) else r for r in rows]
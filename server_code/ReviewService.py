@@ -1,48 +1,411 @@
 import anvil.server
 import anvil.tables as tables
+import anvil.tables.query as q
 from anvil.tables import app_tables
 import json
+import copy
+
+from .ConfigService import get_full_schema_bundle, get_projection
+from .ContentHash import content_hash, not_modified
+from .Projection import payload_item, project_payload, working_copy
+from .ReviewViews import get_review_views, refresh_review_views
+from .TableFragments import render_fragments, invalidate_fragments
+from .PdfStore import document_pdf
+from .Metrics import instrument, span
+from . import table_html
+
+
+# Default / maximum number of doc_ids returned per `list_documents` page
+DOC_PAGE_SIZE = 50
+DOC_PAGE_SIZE_MAX = 500
 
 
 @anvil.server.callable
+@instrument
 def get_document_dropdown_items():
-  """Return a list of (label, value) tuples for the dropdown."""
-  docs = app_tables.documents.search()
+  """Return a list of (label, value) tuples for the dropdown.
+
+    Loads EVERY doc_id – prefer the paginated `list_documents` for UI use.
+    """
+  docs = app_tables.documents.search(q.fetch_only("doc_id"))
   return [(d["doc_id"], d["doc_id"]) for d in docs]
 
 
 @anvil.server.callable
+@instrument
+def list_documents(prefix="", cursor=None, page_size=DOC_PAGE_SIZE):
+  """Return one page of doc_ids, ordered by doc_id, for the typeahead picker.
+
+    prefix:    only doc_ids starting with this string ("" = all)
+    cursor:    the `next_cursor` of the previous page (None = first page)
+    page_size: number of ids per page (capped at DOC_PAGE_SIZE_MAX)
+
+    {
+      "items":       ["DOC-0001", "DOC-0002", ...],
+      "next_cursor": "DOC-0050"      # None when there are no more pages
+    }
+
+    Only the doc_id column is fetched – never result_json / pdf.
+    """
+  page_size = max(1, min(int(page_size or DOC_PAGE_SIZE), DOC_PAGE_SIZE_MAX))
+  prefix = prefix or ""
+
+  # keyset pagination: everything strictly after the cursor, in doc_id order.
+  # The prefix is an exact range – every doc_id >= prefix and below
+  # prefix + "\uffff" starts with it (no wildcards, index-friendly).
+  conditions = []
+  if prefix:
+    conditions += [q.greater_than_or_equal_to(prefix), q.less_than(prefix + "\uffff")]
+  if cursor:
+    conditions.append(q.greater_than(cursor))
+
+  criteria = {}
+  if conditions:
+    criteria["doc_id"] = q.all_of(*conditions) if len(conditions) > 1 else conditions[0]
+
+  rows = app_tables.documents.search(
+    q.fetch_only("doc_id"),
+    tables.order_by("doc_id"),
+    **criteria
+  )
+
+  items = []
+  for r in rows:
+    items.append(r["doc_id"])
+    if len(items) > page_size:
+      break
+
+  # we read one extra id to know whether another page exists
+  has_more = len(items) > page_size
+  items = items[:page_size]
+  return {
+    "items":       items,
+    "next_cursor": items[-1] if has_more and items else None
+  }
+
+
+# Upper bound on ids accepted by one `get_documents` call (prefetch batches)
+DOC_BATCH_MAX = 20
+
+
+def _document_payload(row, if_none_match=None, projection=None, view_mode=None):
+  """Build the client-facing payload dict for one `documents` row.
+
+    The `etag` covers doc_id + row id + version + flags (not the PDF URL) – every
+    write path (save, patch, ingest) bumps `version`, so the large JSON
+    columns never need hashing.  If it equals *if_none_match* a small
+    not-modified marker is returned instead, without reading them at all.
+
+    projection: None for the raw columns, or (get_projection spec, prune)
+                to send only the projected working copy as "payload"
+                (see project_payload) – result_json / corrected_json are
+                then None.
+    view_mode:  with *projection*, "view" / "html" if the caller attaches the
+                stored review view (see _attach_views) instead of sending
+                "payload" at all – the JSON columns are not read here.
+    """
+  flags = row["flags"] or {}                # flags captured during extraction/QA
+  version = row["version"] or 0             # bumped on every write
+  # the row id keeps a re-created document (version 0 again) from matching
+  state = {"doc_id": row["doc_id"], "row": row.get_id(), "flags": flags,
+           "version": version}
+  if projection:
+    # a projected copy must never satisfy a full copy's etag (or vice versa)
+    spec, prune = projection
+    state["projection"] = [spec["etag"], bool(prune), view_mode]
+    if view_mode == "html":
+      state["renderer"] = table_html.RENDERER_VERSION
+  with span("etag"):
+    etag = content_hash(state)
+  if if_none_match and if_none_match == etag:
+    return not_modified(etag, doc_id=row["doc_id"])
+
+  # PDF media URL (inline = False) – from the blob store, else the legacy column
+  with span("pdf_url"):
+    pdf_media = document_pdf(row)
+    pdf_url = pdf_media.get_url(False) if pdf_media else None
+  doc = {
+    "doc_id":         row["doc_id"],
+    "etag":           etag,
+    "version":        version,
+    "pdf_url":        pdf_url,
+    "result_json":    None,
+    "corrected_json": None,
+    "flags":          flags,
+  }
+  if projection:
+    doc["payload"] = None
+    if not view_mode:
+      item = working_copy(row["result_json"], row["corrected_json"])
+      doc["payload"] = project_payload(item, spec, prune)
+  else:
+    doc["result_json"] = row["result_json"] or {}     # parsed extraction result
+    doc["corrected_json"] = row["corrected_json"]     # reviewer working copy (or None)
+  return doc
+
+
+def _view_mode(project, view, fragments):
+  if not (project and view):
+    return None
+  return "html" if fragments else "view"
+
+
+def _attach_views(docs, rows, schema_name, view_mode):
+  """Add the stored review view to every (modified) doc in *docs*; in "html"
+    mode its tables also carry their rendered markup (see TableFragments)."""
+  fresh = [r for r in rows if not docs[r["doc_id"]].get("not_modified")]
+  with span("review_views"):
+    views = get_review_views(fresh, schema_name)
+  for doc_id, view in views.items():
+    if view_mode == "html":
+      with span("table_html"):
+        view = dict(view, doc_id=doc_id, tables=render_fragments(doc_id, view))
+    docs[doc_id]["view"] = view
+  return docs
+
+
+@anvil.server.callable
+@instrument
 def get_document(doc_id):
   """Return (pdf_inline_url, result_json, flags) for the requested document.
 
     pdf_inline_url: Inline URL to the PDF media (or None)
     result_json:    Parsed JSON dict from the result_json column (or {})
     flags:          Flags dict from the flags column (or {})
+
+    Callers that revalidate a cached copy use `get_documents`, which returns
+    each document's etag and accepts it back as *known_etags*.
     """
-  row = app_tables.documents.get(doc_id=doc_id)
+  with span("table_read"):
+    row = app_tables.documents.get(doc_id=doc_id)
   if not row:
     raise Exception(f"Document with id '{doc_id}' not found.")
 
-    # PDF media URL (inline = False)
-  pdf_media = row["pdf"]
-  pdf_url = pdf_media.get_url(False) if pdf_media else None
+  doc = _document_payload(row)
+  return doc["pdf_url"], doc["result_json"], doc["flags"]
+
+
+@anvil.server.callable
+@instrument
+def get_documents(doc_ids, *, known_etags=None, project=None, prune=False, view=False,
+                  fragments=False):
+  """Batch fetch for the client prefetcher – one table query for many docs.
+
+    Returns {doc_id: {"doc_id", "etag", "version", "pdf_url", "result_json",
+                      "corrected_json", "flags"}}.
+    Unknown ids are simply missing from the result.
 
-  # Parsed extraction result
-  result_json = row["result_json"] or {}
+    known_etags: {doc_id: etag} the client already holds; those docs come
+                 back as {"doc_id", "etag", "not_modified": True} if unchanged.
+    project:     schema name – send the projected working copy as "payload"
+                 (output item, excluded paths removed) instead of the raw
+                 result_json / corrected_json
+    prune:       with *project*, also leave out subtrees the schema renderer
+                 never shows (unconfigured scalars; tables are kept)
+    view:        with *project*, send the materialized review view ("view":
+                 resolved scalars + measured tables) instead of "payload"
+    fragments:   with *view*, every view table is sent as its server-rendered
+                 "html" plus a row count instead of its cells (cached – see
+                 TableFragments.render_fragments)
+    """
+  doc_ids = [d for d in (doc_ids or []) if d][:DOC_BATCH_MAX]
+  if not doc_ids:
+    return {}
+  known_etags = known_etags or {}
+  projection = (get_projection(project), prune) if project else None
+
+  view_mode = _view_mode(project, view, fragments)
+  # with stored views the JSON columns are only read (lazily) for the rare
+  # document whose view has to be rebuilt
+  columns = ("doc_id", "pdf", "flags", "version")
+  if not view_mode:
+    columns += ("result_json", "corrected_json")
+  with span("table_read"):
+    rows = list(app_tables.documents.search(
+      q.fetch_only(*columns, pdf_blob=q.fetch_only("pdf")),
+      doc_id=q.any_of(*doc_ids)
+    ))
+  docs = {r["doc_id"]: _document_payload(r, known_etags.get(r["doc_id"]), projection,
+                                         view_mode)
+          for r in rows}
+  return _attach_views(docs, rows, project, view_mode) if view_mode else docs
 
-  # Any flags captured during extraction/QA
-  flags = row["flags"] or {}
 
-  return pdf_url, result_json, flags
+@anvil.server.callable
+@instrument
+def bootstrap_review(doc_id=None, schema_name="base_lease", page_size=DOC_PAGE_SIZE,
+                     *, schema_etag=None, project=False, prune=False, view=False,
+                     fragments=False):
+  """Everything ReviewForm needs to show its first screen, in ONE round-trip.
+
+    {
+      "documents":     {"items": [...], "next_cursor": ...},   # list_documents page
+      "document":      {...} | None,      # get_documents payload (None if unknown)
+      "schema_bundle": {...}              # get_full_schema_bundle(schema_name)
+    }
+
+    schema_etag: bundle etag the client already holds (→ not-modified marker)
+    project:     send the document projected to *schema_name* (see get_documents)
+    prune:       with *project*, also drop subtrees the renderer never shows
+    view:        with *project*, send the stored review view instead of "payload"
+    fragments:   with *view*, include the tables' server-rendered HTML
+    """
+  projection = (get_projection(schema_name), prune) if project else None
+  view_mode = _view_mode(project, view, fragments)
+  # a stored view replaces the JSON columns (read lazily only to rebuild it)
+  fetch = ([q.fetch_only("doc_id", "pdf", "flags", "version", pdf_blob=q.fetch_only("pdf"))]
+           if view_mode else [])
+  with span("table_read"):
+    row = app_tables.documents.get(*fetch, doc_id=doc_id) if doc_id else None
+  document = None
+  if row:
+    document = _document_payload(row, projection=projection, view_mode=view_mode)
+    if view_mode:
+      _attach_views({row["doc_id"]: document}, [row], schema_name, view_mode)
+
+  return {
+    "documents":     list_documents(page_size=page_size),
+    "document":      document,
+    "schema_bundle": get_full_schema_bundle(schema_name, if_none_match=schema_etag),
+  }
 
 
 @anvil.server.callable
+@instrument
+@tables.in_transaction
 def save_document_update(doc_id, corrected_json):
-  """Persist reviewer edits back to the `corrected_json` column."""
+  """Persist reviewer edits back to the `corrected_json` column.
+
+    Full overwrite (last writer wins) – prefer `save_document_patch`.
+    """
   row = app_tables.documents.get(doc_id=doc_id)
   if not row:
     raise Exception(f"Document with id '{doc_id}' not found.")
 
-    # Store the corrected JSON exactly as provided
-  row["corrected_json"] = corrected_json
-  return {"status": "saved"}
+  # Store the corrected JSON exactly as provided
+  version = (row["version"] or 0) + 1
+  row.update(corrected_json=corrected_json, version=version)
+  refresh_review_views(row)
+  invalidate_fragments(doc_id)
+  return {"status": "saved", "version": version}
+
+
+@anvil.server.callable
+@instrument
+@tables.in_transaction
+def save_document_patch(doc_id, ops, base_version):
+  """Apply a field-level patch to the stored working copy of a document.
+
+    ops:          [{"path": ["document_details", "royalty"], "old": "1/8", "value": "3/16"},
+                   {"path": ["tracts", 3, "description"], "old": "...", "value": "..."}, ...]
+                  `old` is the value the client loaded, `value` the edited one.
+    base_version: the `version` the client loaded the document at.
+
+    The patch is applied to `corrected_json`, or to result_json["output"][0]
+    on the first save.  If the document moved on since *base_version*, ops are
+    still merged as long as none of their paths changed in the meantime;
+    otherwise nothing is written and the conflicting paths are returned.
+
+    {"status": "saved" | "merged", "version": 8}
+    {"status": "conflict", "version": 8, "conflicts": [["royalty"], ...]}
+    """
+  row = app_tables.documents.get(doc_id=doc_id)
+  if not row:
+    raise Exception(f"Document with id '{doc_id}' not found.")
+
+  version = row["version"] or 0
+  doc = copy.deepcopy(row["corrected_json"] or payload_item(row["result_json"]))
+
+  status = "saved"
+  if base_version != version:
+    # someone saved since we loaded – merge unless we touch the same fields
+    conflicts = []
+    for op in ops:
+      current = _as_text(_get_path(doc, op["path"]))
+      if current not in (_as_text(op.get("old")), _as_text(op["value"])):
+        conflicts.append(op["path"])
+    if conflicts:
+      return {"status": "conflict", "version": version, "conflicts": conflicts}
+    status = "merged"
+
+  for op in ops:
+    _set_path(doc, op["path"], op["value"])
+
+  row.update(corrected_json=doc, version=version + 1)
+  refresh_review_views(row)
+  invalidate_fragments(doc_id)
+  return {"status": status, "version": version + 1}
+
+
+# ---------------------------------------------------------------------------
+# Patch helpers
+# ---------------------------------------------------------------------------
+
+def _as_text(value):
+  """Widgets hold text – compare stored values the way they are rendered."""
+  return "" if value is None else str(value)
+
+
+def _flat_key_path(row, key, sep="_"):
+  """Map a flattened table column (e.g. "location_section") back to its
+    nested key path in *row*, mirroring the client's flatten_dict.
+    """
+  if key in row:
+    return [key]
+  for k, v in row.items():
+    if isinstance(v, dict) and key.startswith(f"{k}{sep}"):
+      sub = _flat_key_path(v, key[len(k) + len(sep):], sep)
+      if sub:
+        return [k] + sub
+  return None
+
+
+def _expand_path(doc, path):
+  """Resolve flattened table-column segments so *path* walks real keys."""
+  cur, out = doc, []
+  for part in path:
+    if isinstance(cur, list) and isinstance(part, int):
+      out.append(part)
+      cur = cur[part] if 0 <= part < len(cur) else None
+    elif isinstance(cur, dict):
+      keys = _flat_key_path(cur, part) or [part]
+      out.extend(keys)
+      for k in keys:
+        cur = cur.get(k) if isinstance(cur, dict) else None
+    else:
+      out.append(part)
+      cur = None
+  return out
+
+
+def _get_path(doc, path):
+  cur = doc
+  for part in _expand_path(doc, path):
+    if isinstance(cur, dict):
+      cur = cur.get(part)
+    elif isinstance(cur, list) and isinstance(part, int) and 0 <= part < len(cur):
+      cur = cur[part]
+    else:
+      return None
+  return cur
+
+
+def _set_path(doc, path, value):
+  """Set *value* at *path*, creating missing dicts; out-of-range rows are skipped."""
+  parts = _expand_path(doc, path)
+  cur = doc
+  for part, nxt in zip(parts[:-1], parts[1:]):
+    if isinstance(cur, list):
+      if not (isinstance(part, int) and 0 <= part < len(cur)):
+        return
+      cur = cur[part]
+    else:
+      if not isinstance(cur.get(part), (dict, list)):
+        cur[part] = [] if isinstance(nxt, int) else {}
+      cur = cur[part]
+  last = parts[-1]
+  if isinstance(cur, list):
+    if isinstance(last, int) and 0 <= last < len(cur):
+      cur[last] = value
+  else:
+    cur[last] = value
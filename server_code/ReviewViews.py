@@ -0,0 +1,186 @@
+# ReviewViews.py  (server-side)
+#
+# Materialized "review views": per document and schema, everything the
+# schema renderer would otherwise work out in the browser on every open –
+# the configured scalar values as text, and every table with its flattened
+# columns, cell text and column widths (a table_html.TableModel).
+#
+# Views live in the `review_views` table.  They are rebuilt when the document
+# is saved or ingested (refresh_review_views / refresh_batch_views), and
+# lazily on read when the document's `version` or the schema's projection
+# (configured / excluded paths) no longer matches.
+
+import anvil.tables as tables
+import anvil.tables.query as q
+from anvil.tables import app_tables
+
+from .ConfigService import get_projection
+from .ContentHash import content_hash
+from .Projection import working_copy, project_payload
+from . import table_html
+
+
+# Bump when the shape of a stored view changes – older views get rebuilt
+VIEW_FORMAT = 2
+
+
+# ---------------------------------------------------------------------------
+# Building
+# ---------------------------------------------------------------------------
+
+def _dig(data, parts):
+  cur = data
+  for p in parts:
+    if not isinstance(cur, dict):
+      return None
+    cur = cur.get(p)
+  return cur
+
+
+def _collect_tables(value, parent_key="", out=None):
+  """[(path, rows)] for every list-of-dicts below dicts, in payload order
+    (the table half of the client's collect_fields_by_type)."""
+  if out is None:
+    out = []
+  if isinstance(value, dict):
+    for k, v in value.items():
+      key = f"{parent_key}.{k}" if parent_key else k
+      if isinstance(v, list) and v and isinstance(v[0], dict):
+        out.append((key, v))
+      elif isinstance(v, dict):
+        _collect_tables(v, key, out)
+  return out
+
+
+def build_review_view(item, spec):
+  """Compute the view of one payload *item* for a get_projection *spec*.
+
+    {
+      "format":  2,
+      "scalars": {"document_details.royalty": "1/8", ...},   # text, "" = None
+      "tables":  [{"path": "tracts", "columns": [...], "widths": [...],
+                   "cells": [[...], ...], "tall": False}, ...],
+      "tables_hash": "..."     # content hash of "tables" (keys HTML caches)
+    }
+    """
+  item = project_payload(item, spec)           # excluded paths never ship
+  scalars = {}
+  for path in spec["keep"]:
+    val = _dig(item, path.split("."))
+    scalars[path] = "" if val is None else str(val)
+
+  tables = []
+  for path, rows in _collect_tables(item):
+    model = table_html.measure_table(rows)
+    if model is not None:
+      tables.append(dict(model.to_dict(), path=path))
+
+  return {"format": VIEW_FORMAT, "scalars": scalars, "tables": tables,
+          "tables_hash": content_hash(tables)}
+
+
+# ---------------------------------------------------------------------------
+# Storage
+# ---------------------------------------------------------------------------
+
+def _is_current(view_row, doc_row, spec):
+  return (view_row["source_version"] == (doc_row["version"] or 0)
+          and view_row["projection"] == spec["etag"]
+          and (view_row["view"] or {}).get("format") == VIEW_FORMAT)
+
+
+def _view_values(doc_row, spec):
+  """Column values of the stored view of *doc_row* for a projection *spec*."""
+  view = build_review_view(
+    working_copy(doc_row["result_json"], doc_row["corrected_json"]), spec
+  )
+  return dict(source_version=doc_row["version"] or 0, projection=spec["etag"], view=view)
+
+
+@tables.in_transaction
+def _add_view(doc_id, schema_name, values):
+  # concurrent first reads of one document may race to create its view
+  row = app_tables.review_views.get(doc_id=doc_id, schema=schema_name)
+  if row is None:
+    app_tables.review_views.add_row(doc_id=doc_id, schema=schema_name, **values)
+  else:
+    row.update(**values)
+
+
+def _rebuild(doc_row, schema_name, spec, view_row=None):
+  """(Re)compute and store the view of *doc_row*; returns the view dict."""
+  values = _view_values(doc_row, spec)
+  if view_row is None:
+    _add_view(doc_row["doc_id"], schema_name, values)
+  else:
+    view_row.update(**values)
+  return values["view"]
+
+
+def refresh_review_views(doc_row, schema_names=None):
+  """Rebuild the stored views of one document – call after it was written.
+
+    schema_names: schemas to (re)build for; None = every schema that already
+                  has a view of this document (others are built on first read).
+    """
+  existing = {r["schema"]: r for r in app_tables.review_views.search(doc_id=doc_row["doc_id"])}
+  for name in (schema_names if schema_names is not None else list(existing)):
+    _rebuild(doc_row, name, get_projection(name), existing.get(name))
+
+
+def refresh_batch_views(doc_rows, schema_names=()):
+  """refresh_review_views for many documents: one query for their stored
+    views, one add_rows call for the new ones.
+
+    Every document gets its view rebuilt for each schema it already has
+    one for, plus *schema_names*.  Call inside the writing transaction.
+    """
+  doc_rows = list(doc_rows)
+  if not doc_rows:
+    return 0
+  existing = {}
+  for r in app_tables.review_views.search(
+      q.fetch_only("doc_id", "schema"),
+      doc_id=q.any_of(*[d["doc_id"] for d in doc_rows])):
+    existing.setdefault(r["doc_id"], {})[r["schema"]] = r
+
+  new_rows, built = [], 0
+  for doc_row in doc_rows:
+    stored = existing.get(doc_row["doc_id"], {})
+    for name in sorted(set(stored) | set(schema_names)):
+      values = _view_values(doc_row, get_projection(name))
+      if name in stored:
+        stored[name].update(**values)
+      else:
+        new_rows.append(dict(values, doc_id=doc_row["doc_id"], schema=name))
+      built += 1
+  if new_rows:
+    app_tables.review_views.add_rows(new_rows)
+  return built
+
+
+def get_review_views(doc_rows, schema_name):
+  """{doc_id: view} for *doc_rows*, rebuilding only missing or stale views.
+
+    One query reads all stored views; fresh ones are served as stored.
+    """
+  doc_rows = list(doc_rows)
+  if not doc_rows:
+    return {}
+  spec = get_projection(schema_name)
+  stored = {
+    r["doc_id"]: r for r in app_tables.review_views.search(
+      q.fetch_only("doc_id", "source_version", "projection", "view"),
+      doc_id=q.any_of(*[d["doc_id"] for d in doc_rows]),
+      schema=schema_name,
+    )
+  }
+
+  views = {}
+  for doc_row in doc_rows:
+    view_row = stored.get(doc_row["doc_id"])
+    if view_row is not None and _is_current(view_row, doc_row, spec):
+      views[doc_row["doc_id"]] = view_row["view"]
+    else:
+      views[doc_row["doc_id"]] = _rebuild(doc_row, schema_name, spec, view_row)
+  return views
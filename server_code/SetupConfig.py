@@ -1,74 +1,191 @@
 # ----------------------------------------------------------------------
+# seed_schema_config(spec)
+#   Make app_tables.schema / app_tables.config match a declarative spec
+#   for ANY schema: one query, an in-memory diff, one transaction.
+#   Safe to re-run (unchanged rows are not touched).
+#
 # seed_base_lease_config()
-#   Populate app_tables.config for the "base_lease" schema
-#   Safe to re-run (upserts).  Server-side only—no Uplink needed.
+#   The "base_lease" spec, applied with seed_schema_config().
+#   Server-side only—no Uplink needed.
 # ----------------------------------------------------------------------
 
-def seed_base_lease_config():
-  from anvil.tables import app_tables
-
-  # 1️⃣  locate the schema row ------------------------------------------------
-  schema_row = app_tables.schema.get(name="base_lease")
-  if not schema_row:
-    raise RuntimeError("⚠️  'base_lease' schema row not found. "
-                       "Create it (with structure JSON) first.")
-
-  # 2️⃣  field definitions ----------------------------------------------------
-  #   (path, widget_type, layout_group, excluded)
-  fields = [
-    # --- Document Info ---
-    ("state",                              "TextBox",  "Document Info",   False),
-    ("county",                             "TextBox",  "Document Info",   False),
-    ("document_number",                    "TextBox",  "Document Info",   False),
-    ("volume",                             "TextBox",  "Document Info",   False),
-    ("page",                               "TextBox",  "Document Info",   False),
-    ("document_type",                      "TextBox",  "Document Info",   False),
-    ("instrument_date",                    "TextBox",  "Document Info",   False),
-    ("gross_acres",                        "TextBox",  "Document Info",   False),
-
-    # --- Legal Description ---
-    ("legal_description",                  "TextArea", "Legal Description", False),
-
-    # --- Lease Info ---
-    ("document_details.primary_term.unit",             "TextBox", "Lease Info", False),
-    ("document_details.primary_term.duration",         "TextBox", "Lease Info", False),
-    ("document_details.extension_term.unit",           "TextBox", "Lease Info", False),
-    ("document_details.extension_term.duration",       "TextBox", "Lease Info", False),
-    ("document_details.addendum",                      "TextBox", "Lease Info", False),
-    ("document_details.royalty",                       "TextBox", "Lease Info", False),
-
-    # --- Analysis ---
-    ("document_details.open_interest_score",           "TextBox",  "Analysis", False),
-    ("document_details.open_interest_reasoning",       "TextArea", "Analysis", False),
-    ("document_details.lease_complexity_reasoning",    "TextArea", "Analysis", False),
-    ("document_details.lease_complexity_score",        "TextBox",  "Analysis", False),
-    ("document_details.analysis",                      "TextArea", "Analysis", False),
-
-    # --- Explicitly exclude run_config ---
-    ("run_config",                         "TextBox",  None,       True),
-  ]
-
-  # 3️⃣  upsert rows ----------------------------------------------------------
-  for path, widget_type, layout_group, excluded in fields:
-
-    # link_multiple columns expect a list of rows
-    criteria = {"schema": [schema_row], "path": path}
-
-    row = app_tables.config.get(**criteria)
-
-    if row:
-      row.update(
-        widget_type   = widget_type,
-        layout_group  = layout_group,
-        excluded      = excluded
-      )
+import anvil.tables as tables
+import anvil.tables.query as q
+from anvil.tables import app_tables
+
+from .ConfigService import drop_local_cache
+
+
+# Config columns a spec may set, with the value a NEW row gets when a field
+# omits one (existing rows keep their value for omitted columns)
+FIELD_DEFAULTS = {
+  "widget_type":    "TextBox",
+  "layout_group":   None,
+  "excluded":       False,
+  "label_override": None,
+  "view_mode":      None,
+  "choices":        None,
+}
+
+
+def _normalize_field(field):
+  """Spec field → (path, {column: value} for the columns it sets).
+
+    Accepts {"path": ..., <FIELD_DEFAULTS keys>} or the compact tuple
+    (path, widget_type, layout_group, excluded).
+    """
+  if not isinstance(field, dict):
+    path, widget_type, layout_group, excluded = field
+    field = {"path": path, "widget_type": widget_type,
+             "layout_group": layout_group, "excluded": excluded}
+  unknown = set(field) - set(FIELD_DEFAULTS) - {"path"}
+  if unknown:
+    raise ValueError(f"Unknown config column(s) for '{field.get('path')}': {sorted(unknown)}")
+  values = {k: v for k, v in field.items() if k != "path"}
+  if "excluded" in values:
+    values["excluded"] = bool(values["excluded"])
+  return field["path"], values
+
+
+def seed_schema_config(spec, *, delete_missing=True):
+  """Apply a declarative schema spec in ONE transaction.
+
+    spec = {
+      "name":      "base_lease",
+      "structure": {"layout": [...]},    # optional – None keeps the stored one
+      "fields":    [{"path": "royalty", "widget_type": "TextBox", ...},
+                    ("county", "TextBox", "Document Info", False), ...]
+    }
+
+    All config rows of the schema are read with one query and diffed in
+    memory: only new paths are inserted (one add_rows call), only rows whose
+    values differ are updated, and – with *delete_missing* – paths absent
+    from the spec are removed (rows shared with another schema just lose
+    the link).  The schema's `config_version` – and that of every schema
+    sharing an unlinked row – is bumped in the same transaction, so every
+    process drops its cached config.
+
+    Returns {"schema", "inserted", "updated", "deleted", "unlinked",
+             "bumped" (other schemas whose version was bumped), "config_version"}.
+    """
+  name = spec["name"]
+  fields = dict(_normalize_field(f) for f in spec.get("fields", []))
+  result = _apply_spec(name, spec.get("structure"), fields, delete_missing)
+  for schema_name in [name] + result["bumped"]:
+    drop_local_cache(schema_name)     # this process need not wait for its TTL
+  return result
+
+
+@tables.in_transaction
+def _apply_spec(name, structure, fields, delete_missing):
+  # 1️⃣  the schema row (created if the spec brings a structure) -------------
+  schema_row = app_tables.schema.get(name=name)
+  if schema_row is None:
+    if structure is None:
+      raise RuntimeError(f"⚠️  '{name}' schema row not found. "
+                         "Create it (with structure JSON) first.")
+    schema_row = app_tables.schema.add_row(name=name, structure=structure,
+                                           config_version=0)
+  elif structure is not None and schema_row["structure"] != structure:
+    schema_row["structure"] = structure
+
+  # 2️⃣  every existing config row of the schema – one query ----------------
+  existing, duplicates = {}, []
+  for row in app_tables.config.search(
+      q.fetch_only("schema", "path", *FIELD_DEFAULTS), schema=[schema_row]):
+    if row["path"] in existing:
+      duplicates.append(row)
     else:
-      app_tables.config.add_row(
-        schema        = [schema_row],      # ← list !
-        path          = path,
-        widget_type   = widget_type,
-        layout_group  = layout_group,
-        excluded      = excluded
-      )
-
-  return "✅ base_lease config seeded (rows inserted/updated successfully)."
\ No newline at end of file
+      existing[row["path"]] = row
+
+  # 3️⃣  diff in memory ------------------------------------------------------
+  inserts = [dict(FIELD_DEFAULTS, **values, schema=[schema_row], path=path)
+             for path, values in fields.items() if path not in existing]
+  updates = []
+  for path, values in fields.items():
+    row = existing.get(path)
+    if row is None:
+      continue
+    changed = {k: v for k, v in values.items() if row[k] != v}
+    if changed:
+      updates.append((row, changed))
+  removals = duplicates + ([row for path, row in existing.items() if path not in fields]
+                           if delete_missing else [])
+  # decided once, before anything is written: a row shared with other
+  # schemas only loses its link to this one, the rest are deleted
+  unlinks = [r for r in removals if len(r["schema"] or []) > 1]
+  deletes = [r for r in removals if len(r["schema"] or []) <= 1]
+  # other schemas sharing a changed or unlinked row – their cached config
+  # must not outlive this transaction either
+  others = {s.get_id(): s
+            for r in unlinks + [row for row, _ in updates] if len(r["schema"] or []) > 1
+            for s in r["schema"] if s != schema_row}
+
+  # 4️⃣  apply ---------------------------------------------------------------
+  if inserts:
+    app_tables.config.add_rows(inserts)
+  with tables.batch_update:
+    for row, changed in updates:
+      row.update(**changed)
+    for row in unlinks:
+      row["schema"] = [s for s in row["schema"] if s != schema_row]
+    for other in others.values():
+      other["config_version"] = (other["config_version"] or 0) + 1
+  with tables.batch_delete:
+    for row in deletes:
+      row.delete()
+
+  version = (schema_row["config_version"] or 0) + 1
+  schema_row["config_version"] = version
+  return {"schema": name, "inserted": len(inserts), "updated": len(updates),
+          "deleted": len(deletes), "unlinked": len(unlinks),
+          "bumped": sorted(o["name"] for o in others.values()),
+          "config_version": version}
+
+
+# ----------------------------------------------------------------------
+# base_lease
+# ----------------------------------------------------------------------
+
+#   (path, widget_type, layout_group, excluded)
+BASE_LEASE_FIELDS = [
+  # --- Document Info ---
+  ("state",                              "TextBox",  "Document Info",   False),
+  ("county",                             "TextBox",  "Document Info",   False),
+  ("document_number",                    "TextBox",  "Document Info",   False),
+  ("volume",                             "TextBox",  "Document Info",   False),
+  ("page",                               "TextBox",  "Document Info",   False),
+  ("document_type",                      "TextBox",  "Document Info",   False),
+  ("instrument_date",                    "TextBox",  "Document Info",   False),
+  ("gross_acres",                        "TextBox",  "Document Info",   False),
+
+  # --- Legal Description ---
+  ("legal_description",                  "TextArea", "Legal Description", False),
+
+  # --- Lease Info ---
+  ("document_details.primary_term.unit",             "TextBox", "Lease Info", False),
+  ("document_details.primary_term.duration",         "TextBox", "Lease Info", False),
+  ("document_details.extension_term.unit",           "TextBox", "Lease Info", False),
+  ("document_details.extension_term.duration",       "TextBox", "Lease Info", False),
+  ("document_details.addendum",                      "TextBox", "Lease Info", False),
+  ("document_details.royalty",                       "TextBox", "Lease Info", False),
+
+  # --- Analysis ---
+  ("document_details.open_interest_score",           "TextBox",  "Analysis", False),
+  ("document_details.open_interest_reasoning",       "TextArea", "Analysis", False),
+  ("document_details.lease_complexity_reasoning",    "TextArea", "Analysis", False),
+  ("document_details.lease_complexity_score",        "TextBox",  "Analysis", False),
+  ("document_details.analysis",                      "TextArea", "Analysis", False),
+
+  # --- Explicitly exclude run_config ---
+  ("run_config",                         "TextBox",  None,       True),
+]
+
+
+def seed_base_lease_config():
+  # the schema row (with its structure JSON) must already exist; rows not in
+  # BASE_LEASE_FIELDS are left alone, as this seeder always did
+  result = seed_schema_config({"name": "base_lease", "fields": BASE_LEASE_FIELDS},
+                              delete_missing=False)
+  return (f"✅ base_lease config seeded ({result['inserted']} inserted, "
+          f"{result['updated']} updated).")
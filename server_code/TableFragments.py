@@ -0,0 +1,94 @@
+# TableFragments.py  (server-side)
+#
+# Renders a document's tables to the HTML HtmlTablePanel shows, so the
+# browser (Skulpt) never runs table_html.render_table itself.  Fragments are
+# cached per process by (doc_id, content hash of the tables, renderer
+# version) – an unchanged document costs one dict lookup.
+
+import anvil.server
+from anvil.tables import app_tables
+
+from .ContentHash import content_hash
+from .LRUCache import LRUCache
+from .Metrics import instrument
+from .ReviewViews import get_review_views
+from . import table_html
+
+
+# Number of rendered documents (all of their tables) kept per process
+FRAGMENT_CACHE_SIZE = 128
+
+_fragment_cache = LRUCache(FRAGMENT_CACHE_SIZE, name="table_fragments")
+
+
+def _render(table):
+  """One review-view table as markup ("html"), "virtual" flag and row count.
+
+    The cells are already in the markup, so they are only kept for virtual
+    tables (painted by the browser); the widths are in its <colgroup>.
+    """
+  model = table_html.TableModel.from_dict(table)
+  virtual = len(model.cells) > table_html.VIRTUAL_ROW_THRESHOLD
+  frag = {k: v for k, v in table.items() if k not in ("cells", "widths")}
+  frag.update(html=table_html.render_table(model, virtual).html, virtual=virtual,
+              rows=len(model.cells))
+  if virtual:
+    frag["cells"] = model.cells
+  return frag
+
+
+def render_fragments(doc_id, view):
+  """The view's "tables" as rendered fragments (cached)."""
+  tables = view.get("tables") or []
+  digest = view.get("tables_hash") or content_hash(tables)
+  key = (doc_id, digest, table_html.RENDERER_VERSION)
+  return _fragment_cache.get(key, lambda: [_render(t) for t in tables])
+
+
+def invalidate_fragments(doc_id):
+  """Drop this process's fragments of *doc_id* (call after a save)."""
+  _fragment_cache.invalidate(doc_id)
+
+
+@anvil.server.callable
+@instrument
+def get_table_fragments(doc_id, schema_name="base_lease"):
+  """Rendered tables of one document, ready for HtmlTablePanel.
+
+    [
+      {"path": "tracts", "html": "<div class=\"json-table-container\">…",
+       "virtual": False, "rows": 12, "columns": [...], "tall": False},
+      ...
+    ]
+
+    Virtual tables (more than VIRTUAL_ROW_THRESHOLD rows) come with an empty
+    <tbody> and their "cells" ([[...], ...]); the browser paints them from those.
+    """
+  row = app_tables.documents.get(doc_id=doc_id)
+  if not row:
+    raise Exception(f"Document with id '{doc_id}' not found.")
+  view = get_review_views([row], schema_name)[doc_id]
+  return render_fragments(doc_id, view)
+
+
+@anvil.server.callable
+@instrument
+def get_table_cells(doc_id, schema_name="base_lease"):
+  """{path: cells} of one document's view tables.
+
+    Fragments of tables that are not virtual carry no "cells"; the browser
+    asks for them here only when it must extract a table the reviewer never
+    opened (json_renderer._table_fallback).
+    """
+  row = app_tables.documents.get(doc_id=doc_id)
+  if not row:
+    raise Exception(f"Document with id '{doc_id}' not found.")
+  view = get_review_views([row], schema_name)[doc_id]
+  return {t["path"]: t["cells"] for t in view.get("tables") or []}
+
+
+@anvil.server.callable
+@instrument
+def get_fragment_cache_stats():
+  """Hit / miss / eviction counters for this process's fragment cache."""
+  return _fragment_cache.stats()
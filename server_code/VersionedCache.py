@@ -0,0 +1,131 @@
+# VersionedCache.py  (server-side)
+#
+# Small in-process cache whose entries are tied to a cheap "version stamp"
+# read from Data Tables.  Every server process re-reads the stamp at most once
+# per TTL, so bumping the stamp in the table invalidates the cached values in
+# ALL processes – not just the one that edited the config.
+
+import threading
+import time
+
+from .Metrics import note_cache
+
+
+class VersionedCache:
+  """
+  Cache values per (scope, key), valid for as long as the scope's version
+  stamp is unchanged.
+
+      cache = VersionedCache(version_fn=_config_version, ttl=600)
+      cache.get("base_lease", "structure", lambda: _load_structure(...))
+
+  version_fn(scope) must be cheap – it is called at most once per scope per
+  `ttl` seconds.  Concurrent misses for the same entry are collapsed: one
+  caller runs the loader while the others wait for its result.
+  """
+
+  def __init__(self, version_fn, ttl=600, name="cache"):
+    self.name = name
+    self.ttl = ttl
+    self._version_fn = version_fn
+    self._entries = {}      # (scope, key) -> (version, value)
+    self._versions = {}     # scope -> (version, checked_at)
+    self._locks = {}        # (scope, key) / scope -> threading.Lock
+    self._guard = threading.Lock()
+    self._stats = {
+      "hits":           0,  # served from memory
+      "misses":         0,  # nothing cached yet – loader ran
+      "stale":          0,  # cached value outdated by a version bump – loader ran
+      "version_checks": 0,  # version stamp reads (one per scope per TTL)
+    }
+
+  # -------------------------------------------------------------------------
+  # Internals
+  # -------------------------------------------------------------------------
+
+  def _lock_for(self, token):
+    with self._guard:
+      lock = self._locks.get(token)
+      if lock is None:
+        lock = self._locks[token] = threading.Lock()
+      return lock
+
+  def _count(self, stat):
+    with self._guard:
+      self._stats[stat] += 1
+    if stat != "version_checks":
+      note_cache(stat == "hits")
+
+  def _current_version(self, scope):
+    """Return the scope's version stamp, re-reading it once the TTL expires."""
+    cached = self._versions.get(scope)
+    if cached and time.monotonic() - cached[1] < self.ttl:
+      return cached[0]
+
+    with self._lock_for(scope):
+      # another thread may have refreshed it while we waited
+      cached = self._versions.get(scope)
+      if cached and time.monotonic() - cached[1] < self.ttl:
+        return cached[0]
+      version = self._version_fn(scope)
+      self._versions[scope] = (version, time.monotonic())
+      self._count("version_checks")
+      return version
+
+  # -------------------------------------------------------------------------
+  # Public API
+  # -------------------------------------------------------------------------
+
+  def get(self, scope, key, loader):
+    """Return the cached value for (scope, key), calling loader() on a miss."""
+    version = self._current_version(scope)
+    entry = self._entries.get((scope, key))
+    if entry and entry[0] == version:
+      self._count("hits")
+      return entry[1]
+
+    with self._lock_for((scope, key)):
+      # collapse concurrent misses: re-check once we hold the entry lock
+      entry = self._entries.get((scope, key))
+      if entry and entry[0] == version:
+        self._count("hits")
+        return entry[1]
+
+      self._count("stale" if entry else "misses")
+      value = loader()
+      self._entries[(scope, key)] = (version, value)
+      return value
+
+  def version(self, scope):
+    """The scope's version stamp as this cache currently trusts it."""
+    return self._current_version(scope)
+
+  def prime(self, scope, version, values):
+    """Store {key: value} for *scope* as loaded at *version* (e.g. from a
+      bulk preload), and trust that version stamp for the next TTL."""
+    with self._guard:
+      self._versions[scope] = (version, time.monotonic())
+      for key, value in values.items():
+        self._entries[(scope, key)] = (version, value)
+
+  def clear(self, scope=None):
+    """Drop cached values (and version stamps) for *scope*, or everything."""
+    with self._guard:
+      if scope is None:
+        self._entries.clear()
+        self._versions.clear()
+      else:
+        self._versions.pop(scope, None)
+        for k in [k for k in self._entries if k[0] == scope]:
+          del self._entries[k]
+
+  def stats(self):
+    """Return a snapshot of the hit/miss/staleness counters."""
+    with self._guard:
+      stats = dict(self._stats)
+      stats["entries"] = len(self._entries)
+    lookups = stats["hits"] + stats["misses"] + stats["stale"]
+    stats["hit_ratio"] = round(stats["hits"] / lookups, 4) if lookups else None
+    stats["name"] = self.name
+    stats["ttl"] = self.ttl
+    return stats